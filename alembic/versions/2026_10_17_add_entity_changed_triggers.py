@@ -0,0 +1,49 @@
+"""add entity changed triggers
+
+Revision ID: 5e8a1c7f3b20
+Revises: 9d3f6a2c8e51
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5e8a1c7f3b20"
+down_revision: Union[str, Sequence[str], None] = "9d3f6a2c8e51"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ["animes", "anime_infos", "id_mappings", "songs", "sources", "timings", "levels"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE FUNCTION notify_entity_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('entity_changed', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # statement level, the API cache only needs to know which tables changed
+    for table in TABLES:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_entity_changed
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_entity_changed()
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER {table}_entity_changed ON {table}")
+    op.execute("DROP FUNCTION notify_entity_changed()")
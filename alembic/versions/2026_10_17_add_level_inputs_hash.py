@@ -0,0 +1,39 @@
+"""add level inputs hash
+
+Revision ID: 8f1c4a6d2b93
+Revises: 3b7d2e9f4a16
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8f1c4a6d2b93"
+down_revision: Union[str, Sequence[str], None] = "3b7d2e9f4a16"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("levels", sa.Column("inputs_hash", sa.String(), nullable=True))
+    op.create_index(
+        "ix_levels_song_id_added_by_scored",
+        "levels",
+        ["song_id", "added_by"],
+        unique=True,
+        postgresql_where=sa.text("inputs_hash IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_levels_song_id_added_by_scored", table_name="levels", postgresql_where=sa.text("inputs_hash IS NOT NULL")
+    )
+    op.drop_column("levels", "inputs_hash")
@@ -0,0 +1,47 @@
+"""add list pagination indexes
+
+Revision ID: 9d3f6a2c8e51
+Revises: 7c2d9e4b1a6f
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d3f6a2c8e51"
+down_revision: Union[str, Sequence[str], None] = "7c2d9e4b1a6f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index("ix_animes_title_ro_id", "animes", ["title_ro", "id"], unique=False)
+    op.create_index("ix_animes_created_at_id", "animes", ["created_at", "id"], unique=False)
+    op.create_index("ix_animes_updated_at_id", "animes", ["updated_at", "id"], unique=False)
+    op.create_index(
+        "ix_animes_title_ro_trgm",
+        "animes",
+        ["title_ro"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"title_ro": "gin_trgm_ops"},
+    )
+    op.create_index(op.f("ix_sources_song_id"), "sources", ["song_id"], unique=False)
+    op.create_index(op.f("ix_timings_source_id"), "timings", ["source_id"], unique=False)
+    op.create_index(op.f("ix_levels_song_id"), "levels", ["song_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_levels_song_id"), table_name="levels")
+    op.drop_index(op.f("ix_timings_source_id"), table_name="timings")
+    op.drop_index(op.f("ix_sources_song_id"), table_name="sources")
+    op.drop_index("ix_animes_title_ro_trgm", table_name="animes", postgresql_using="gin")
+    op.drop_index("ix_animes_updated_at_id", table_name="animes")
+    op.drop_index("ix_animes_created_at_id", table_name="animes")
+    op.drop_index("ix_animes_title_ro_id", table_name="animes")
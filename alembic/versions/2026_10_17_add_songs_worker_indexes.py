@@ -0,0 +1,39 @@
+"""add songs worker indexes
+
+Revision ID: 4b8e1f2a9c3d
+Revises: e662cadf374c
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4b8e1f2a9c3d"
+down_revision: Union[str, Sequence[str], None] = "e662cadf374c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_id_mappings_anime_id_platform",
+        "id_mappings",
+        ["anime_id", "platform"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_worker_results_worker_name_anime_id_status",
+        "worker_results",
+        ["worker_name", "anime_id", "status"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_worker_results_worker_name_anime_id_status", table_name="worker_results")
+    op.drop_index("ix_id_mappings_anime_id_platform", table_name="id_mappings")
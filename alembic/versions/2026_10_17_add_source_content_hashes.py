@@ -0,0 +1,37 @@
+"""add source content hashes
+
+Revision ID: 3b7d2e9f4a16
+Revises: 5e8a1c7f3b20
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3b7d2e9f4a16"
+down_revision: Union[str, Sequence[str], None] = "5e8a1c7f3b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("sources", sa.Column("content_size", sa.BigInteger(), nullable=True))
+    op.add_column("sources", sa.Column("partial_hash", sa.String(), nullable=True))
+    op.add_column("sources", sa.Column("content_hash", sa.String(), nullable=True))
+    op.create_index(op.f("ix_sources_content_hash"), "sources", ["content_hash"], unique=False)
+    op.create_index("ix_sources_content_size_partial_hash", "sources", ["content_size", "partial_hash"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_sources_content_size_partial_hash", table_name="sources")
+    op.drop_index(op.f("ix_sources_content_hash"), table_name="sources")
+    op.drop_column("sources", "content_hash")
+    op.drop_column("sources", "partial_hash")
+    op.drop_column("sources", "content_size")
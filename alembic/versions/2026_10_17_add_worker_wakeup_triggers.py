@@ -0,0 +1,50 @@
+"""add worker wakeup triggers
+
+Revision ID: 7c2d9e4b1a6f
+Revises: 322e9d17d4c7
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c2d9e4b1a6f"
+down_revision: Union[str, Sequence[str], None] = "322e9d17d4c7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ["animes", "id_mappings", "task_queue"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # notifications with equal payload are folded within a transaction, so bulk inserts send one per table
+    op.execute(
+        """
+        CREATE FUNCTION notify_worker_wakeup() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('worker_wakeup', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # row level, statement triggers would also fire for inserts of zero rows
+    for table in TABLES:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_worker_wakeup
+            AFTER INSERT ON {table}
+            FOR EACH ROW EXECUTE FUNCTION notify_worker_wakeup()
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER {table}_worker_wakeup ON {table}")
+    op.execute("DROP FUNCTION notify_worker_wakeup()")
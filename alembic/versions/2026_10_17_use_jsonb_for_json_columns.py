@@ -0,0 +1,64 @@
+"""use jsonb for json columns
+
+Revision ID: 6a9e3c5f7d28
+Revises: 8f1c4a6d2b93
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6a9e3c5f7d28"
+down_revision: Union[str, Sequence[str], None] = "8f1c4a6d2b93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [("anime_infos", "data"), ("sources", "location"), ("task_queue", "data")]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=postgresql.JSONB(),
+            existing_type=sa.JSON(),
+            postgresql_using=f"{column}::jsonb",
+        )
+    op.create_index(
+        "ix_anime_infos_data",
+        "anime_infos",
+        ["data"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"data": "jsonb_path_ops"},
+    )
+    op.create_index(
+        "ix_sources_location",
+        "sources",
+        ["location"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"location": "jsonb_path_ops"},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_sources_location", table_name="sources", postgresql_using="gin")
+    op.drop_index("ix_anime_infos_data", table_name="anime_infos", postgresql_using="gin")
+    for table, column in COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.JSON(),
+            existing_type=postgresql.JSONB(),
+            postgresql_using=f"{column}::json",
+        )
@@ -0,0 +1,134 @@
+import subprocess
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+SAMPLE_RATE = 22050
+FRAME_SIZE = 2048
+HOP_SIZE = 512
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+def decode_audio(
+    path: str, sample_rate: int = SAMPLE_RATE, ffmpeg: str = "ffmpeg", max_duration: Optional[float] = None
+) -> np.ndarray:
+    """Decode audio track of path to mono float32 samples, streamed from ffmpeg through a pipe"""
+    cmd = [ffmpeg, "-nostdin", "-v", "error", "-i", path, "-vn", "-ac", "1", "-ar", str(sample_rate)]
+    if max_duration is not None:
+        cmd += ["-t", str(max_duration)]
+    cmd += ["-f", "f32le", "pipe:1"]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, check=False)
+    except FileNotFoundError as e:
+        raise AudioDecodeError(f"ffmpeg not found: {ffmpeg}") from e
+    if proc.returncode != 0:
+        raise AudioDecodeError(proc.stderr.decode(errors="replace").strip() or f"ffmpeg exited with {proc.returncode}")
+    return np.frombuffer(proc.stdout, dtype=np.float32)
+
+
+@dataclass
+class AudioFeatures:
+    rms: np.ndarray
+    flux: np.ndarray
+    frame_rate: float
+
+    @property
+    def duration(self) -> float:
+        return len(self.rms) / self.frame_rate
+
+    def frame(self, time: float) -> int:
+        return round(time * self.frame_rate)
+
+    def time(self, frame: int | np.ndarray) -> float | np.ndarray:
+        return frame / self.frame_rate
+
+
+def frame_signal(signal: np.ndarray, frame_size: int = FRAME_SIZE, hop_size: int = HOP_SIZE) -> np.ndarray:
+    """Overlapping frames as a strided view, signal shorter than a frame is zero padded"""
+    if len(signal) < frame_size:
+        signal = np.pad(signal, (0, frame_size - len(signal)))
+    return sliding_window_view(signal, frame_size)[::hop_size]
+
+
+def compute_features(signal: np.ndarray, sample_rate: int = SAMPLE_RATE) -> AudioFeatures:
+    """Per frame RMS energy and spectral flux of the log magnitude spectrum"""
+    frames = frame_signal(signal)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    spectrum = np.log1p(np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE).astype(np.float32), axis=1)))
+    flux = np.empty(len(frames), dtype=np.float32)
+    flux[0] = 0
+    flux[1:] = np.maximum(np.diff(spectrum, axis=0), 0).sum(axis=1)
+    return AudioFeatures(rms=rms, flux=flux, frame_rate=sample_rate / HOP_SIZE)
+
+
+def moving_average(x: np.ndarray, width: int) -> np.ndarray:
+    """Centered moving average of the same length, edges averaged over the available part"""
+    width = max(int(width), 1)
+    kernel = np.ones(width, dtype=np.float64)
+    return np.convolve(x, kernel, mode="same") / np.convolve(np.ones_like(x, dtype=np.float64), kernel, mode="same")
+
+
+def window_means(x: np.ndarray, width: int) -> np.ndarray:
+    """Mean of x[i:i + width] for every i with a full window"""
+    cumsum = np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+    return (cumsum[width:] - cumsum[:-width]) / width
+
+
+def pick_peaks(x: np.ndarray, min_distance: int, threshold: float) -> np.ndarray:
+    """Indices of values above threshold that are the maximum within min_distance on both sides"""
+    min_distance = max(int(min_distance), 1)
+    padded = np.pad(x, min_distance, mode="constant", constant_values=-np.inf)
+    local_max = sliding_window_view(padded, 2 * min_distance + 1).max(axis=1)
+    peaks = np.flatnonzero((x >= local_max) & (x > threshold))
+    if len(peaks) < 2:
+        return peaks
+    # plateaus give runs of equal maxima, keep the first of each
+    return peaks[np.concatenate(([True], np.diff(peaks) > min_distance))]
+
+
+def onset_frames(features: AudioFeatures, min_interval: float = 0.1) -> np.ndarray:
+    """Spectral flux peaks above its local mean"""
+    novelty = features.flux - moving_average(features.flux, features.frame(0.5))
+    threshold = float(np.std(novelty)) * 0.5
+    return pick_peaks(novelty, features.frame(min_interval), threshold)
+
+
+def boundary_frames(features: AudioFeatures, context: float = 2.0, min_interval: float = 4.0) -> np.ndarray:
+    """Frames where loudness before and after differs most, boundaries of song sections"""
+    width = max(features.frame(context), 1)
+    loudness = np.log(features.rms + 1e-6)
+    means = window_means(loudness, width)
+    # novelty[i] compares frames [i - width, i) with [i, i + width)
+    novelty = np.zeros(len(loudness))
+    novelty[width : len(means)] = np.abs(means[width:] - means[: len(means) - width])
+    threshold = float(np.mean(novelty) + np.std(novelty))
+    return pick_peaks(novelty, features.frame(min_interval), threshold)
+
+
+def mel_filterbank(sample_rate: int = SAMPLE_RATE, n_fft: int = FRAME_SIZE, n_mels: int = 64) -> np.ndarray:
+    """Triangular filters of shape (n_mels, n_fft // 2 + 1) evenly spaced on the mel scale"""
+
+    def to_mel(hz: np.ndarray) -> np.ndarray:
+        return 2595 * np.log10(1 + hz / 700)
+
+    def to_hz(mel: np.ndarray) -> np.ndarray:
+        return 700 * (10 ** (mel / 2595) - 1)
+
+    bin_freqs = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    edges = to_hz(np.linspace(0, to_mel(np.array(sample_rate / 2)), n_mels + 2))
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bin_freqs - lower) / (center - lower)
+    falling = (upper - bin_freqs) / (upper - center)
+    return np.maximum(0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def mel_spectrogram(signal: np.ndarray, sample_rate: int = SAMPLE_RATE, n_mels: int = 64) -> np.ndarray:
+    """Log power mel spectrogram of shape (frames, n_mels)"""
+    frames = frame_signal(signal)
+    power = np.square(np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE).astype(np.float32), axis=1)))
+    return np.log1p(power @ mel_filterbank(sample_rate, FRAME_SIZE, n_mels).T).astype(np.float32)
@@ -0,0 +1,74 @@
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from .audio import SAMPLE_RATE
+from .fingerprint import FREQ_BITS, MAX_DT, FingerprintIndex, fingerprint
+
+
+def synthetic_track(rng: np.random.Generator, duration: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Random notes of three decaying partials, distinct enough per track to tell tracks apart"""
+    notes = []
+    length = 0
+    while length < duration * sample_rate:
+        t = np.arange(int(sample_rate * rng.uniform(0.2, 0.5))) / sample_rate
+        partials = rng.uniform(100, 4000, 3)
+        notes.append((np.sin(2 * np.pi * partials[:, None] * t).sum(axis=0) * np.exp(-3 * t)).astype(np.float32))
+        length += len(t)
+    return np.concatenate(notes)[: int(duration * sample_rate)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure fingerprint index accuracy and lookup speed")
+    parser.add_argument("--tracks", type=int, default=50, help="synthetic tracks fingerprinted from audio")
+    parser.add_argument("--filler", type=int, default=20_000, help="sources with random fingerprints")
+    parser.add_argument("--filler-hashes", type=int, default=1500, help="hashes per filler source")
+    parser.add_argument("--duration", type=float, default=90, help="seconds per track")
+    parser.add_argument("--excerpt", type=float, default=15, help="seconds per query")
+    parser.add_argument("--snr", type=float, default=10, help="signal to noise ratio of queries in dB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    with tempfile.TemporaryDirectory() as root:
+        index = FingerprintIndex(root)
+        wall = time.perf_counter()
+        for source_id in range(args.tracks + 1, args.tracks + args.filler + 1):
+            # random hashes with valid frame distances, like fingerprints of unrelated songs
+            frames = np.sort(rng.integers(0, int(args.duration * SAMPLE_RATE / 512), args.filler_hashes))
+            hashes = rng.integers(0, 1 << (2 * FREQ_BITS), args.filler_hashes, dtype=np.uint32) << 6
+            index.add(source_id, hashes | rng.integers(1, MAX_DT + 1, args.filler_hashes, dtype=np.uint32), frames)
+            if source_id % 5000 == 0:
+                index.flush()
+        filler_time = time.perf_counter() - wall
+
+        tracks = [synthetic_track(rng, args.duration) for _ in range(args.tracks)]
+        wall = time.perf_counter()
+        for source_id, track in enumerate(tracks, start=1):
+            index.add(source_id, *fingerprint(track))
+        fingerprint_time = time.perf_counter() - wall
+        index.flush()
+        postings = index.posting_count
+
+        correct = 0
+        query_time = 0.0
+        for source_id, track in enumerate(tracks, start=1):
+            start = rng.uniform(0, args.duration - args.excerpt)
+            excerpt = track[int(start * SAMPLE_RATE) : int((start + args.excerpt) * SAMPLE_RATE)] * 0.5
+            noise = rng.normal(0, np.std(excerpt) / 10 ** (args.snr / 20), len(excerpt)).astype(np.float32)
+            hashes, frames = fingerprint(excerpt + noise)
+            wall = time.perf_counter()
+            matches = index.query(hashes, frames, limit=1)
+            query_time += time.perf_counter() - wall
+            if matches and matches[0].source_id == source_id and abs(matches[0].offset - start) < 0.1:
+                correct += 1
+
+    print(f"{args.tracks + args.filler} sources, {postings} postings in {len(index.shards)} shards")
+    print(f"filler indexed in {filler_time:.1f}s, {fingerprint_time / args.tracks * 1000:.0f}ms per track fingerprint")
+    print(f"{correct}/{args.tracks} excerpts matched, {query_time / args.tracks * 1000:.1f}ms per lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import time
+from typing import Iterator
+
+import numpy as np
+
+from .video import BATCH_SIZE, FPS, FRAME_HEIGHT, FRAME_WIDTH, scene_change_scores, scene_changes, stream_frames
+
+
+def synthetic_batches(frames: int, scene_length: int, seed: int = 0) -> Iterator[np.ndarray]:
+    """Noisy static scenes of scene_length frames, so every scene start is a cut"""
+    rng = np.random.default_rng(seed)
+    buffer = np.empty((BATCH_SIZE, FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+    scene = rng.integers(0, 256, (FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+    for start in range(0, frames, BATCH_SIZE):
+        n = min(BATCH_SIZE, frames - start)
+        for i in range(n):
+            if (start + i) % scene_length == 0:
+                scene = rng.integers(0, 256, (FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+            buffer[i] = scene
+        noise = rng.integers(-4, 5, buffer[:n].shape, dtype=np.int16)
+        buffer[:n] = np.clip(buffer[:n] + noise, 0, 255)
+        yield buffer[:n]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure scene change detection throughput on CPU")
+    parser.add_argument("--path", default=None, help="video to decode and score, synthetic frames by default")
+    parser.add_argument("--frames", type=int, default=100_000, help="number of synthetic frames")
+    parser.add_argument("--scene-length", type=int, default=50, help="frames per synthetic scene")
+    parser.add_argument("--fps", type=float, default=FPS, help="frames sampled per second of video")
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    args = parser.parse_args()
+
+    if args.path is not None:
+        batches = stream_frames(args.path, fps=args.fps, ffmpeg=args.ffmpeg)
+    else:
+        # generate up front, only scoring is measured
+        batches = [batch.copy() for batch in synthetic_batches(args.frames, args.scene_length)]
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    scores = scene_change_scores(batches)
+    cuts = scene_changes(scores, args.fps)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    print(f"{len(scores)} frames, {len(cuts)} scene changes")
+    print(f"{len(scores) / wall:.0f} frames/s wall, {len(scores) / max(cpu, 1e-9):.0f} frames/s cpu")
+    if args.path is None:
+        expected = len(range(args.scene_length, args.frames, args.scene_length))
+        print(f"expected {expected} scene changes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import hashlib
+import math
+from dataclasses import dataclass, field, fields
+from datetime import date
+from typing import Any, Optional, Protocol
+
+import numpy as np
+
+# keys of AnimeInfo.data holding list member counts and start years, by source
+MEMBERS_KEYS = ("members", "num_list_users", "list_members")
+YEAR_KEYS = ("year", "start_year", "release_year")
+DATE_KEYS = ("start_date", "aired_from")
+
+
+def info_number(data: dict[str, Any], keys: tuple[str, ...]) -> Optional[float]:
+    for key in keys:
+        value = data.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str) and value.isdigit():
+            return float(value)
+    return None
+
+
+def info_year(data: dict[str, Any]) -> Optional[float]:
+    year = info_number(data, YEAR_KEYS)
+    if year is not None:
+        return year
+    for key in DATE_KEYS:
+        value = data.get(key)
+        if isinstance(value, str) and value[:4].isdigit():
+            return float(value[:4])
+    return None
+
+
+@dataclass
+class SongInputs:
+    """Inputs of a batch of songs as columns, missing values are nan"""
+
+    song_ids: np.ndarray
+    members: np.ndarray
+    year: np.ndarray
+    is_ending: np.ndarray
+    number: np.ndarray
+    # mean loudness in dB of the guess part of the latest timing
+    loudness: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.song_ids)
+
+    def rows(self) -> list[tuple[float, ...]]:
+        columns = [getattr(self, column.name) for column in fields(self) if column.name != "song_ids"]
+        return list(zip(*(column.tolist() for column in columns), strict=True))
+
+
+class DifficultyStrategy(Protocol):
+    name: str
+    version: int
+
+    def score(self, inputs: SongInputs) -> np.ndarray:
+        """Difficulty of every song in 0..100"""
+        ...
+
+
+def added_by(strategy: DifficultyStrategy) -> str:
+    return f"{strategy.name}_v{strategy.version}"
+
+
+def inputs_hashes(strategy: DifficultyStrategy, inputs: SongInputs) -> list[str]:
+    """Hash of the inputs of every song, a level is rescored only when its hash changes
+
+    The strategy repr is part of the hash, so changed parameters rescore every song too
+    """
+    prefix = repr(strategy).encode()
+    hashes = []
+    for row in inputs.rows():
+        # nan never equals itself, hash it as a fixed marker
+        values = ",".join("nan" if isinstance(value, float) and math.isnan(value) else repr(value) for value in row)
+        hashes.append(hashlib.blake2b(prefix + values.encode(), digest_size=12).hexdigest())
+    return hashes
+
+
+@dataclass
+class RandomStrategy:
+    """Uniform difficulty, stable per song, as a baseline for the others"""
+
+    name: str = "random"
+    version: int = 1
+
+    def score(self, inputs: SongInputs) -> np.ndarray:
+        # splitmix style integer hash of the id, so a song keeps its level between runs
+        x = inputs.song_ids.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+        return (x % np.uint64(101)).astype(np.int64)
+
+
+@dataclass
+class PopularityStrategy:
+    """Weighted mean of components in 0..1, each growing with difficulty
+
+    Less popular and older animes, endings and later songs of an anime are harder to guess, and so
+    are quieter guess parts. Weights of missing components are dropped from the mean
+    """
+
+    name: str = "popularity"
+    version: int = 1
+    # log10 of member counts considered obscure and famous
+    members_range: tuple[float, float] = (3.0, 6.0)
+    max_age: float = 30.0
+    reference_year: int = field(default_factory=lambda: date.today().year)
+    max_number: int = 6
+    # dB of quiet and loud guess parts
+    loudness_range: tuple[float, float] = (-40.0, -10.0)
+    weights: tuple[float, float, float, float, float] = (0.5, 0.15, 0.15, 0.1, 0.1)
+
+    def components(self, inputs: SongInputs) -> np.ndarray:
+        low, high = self.members_range
+        with np.errstate(divide="ignore", invalid="ignore"):
+            obscurity = 1 - np.clip((np.log10(inputs.members) - low) / (high - low), 0, 1)
+        age = np.clip((self.reference_year - inputs.year) / self.max_age, 0, 1)
+        ending = inputs.is_ending.astype(np.float64)
+        later = np.clip((inputs.number - 1) / (self.max_number - 1), 0, 1)
+        quiet_low, quiet_high = self.loudness_range
+        quietness = 1 - np.clip((inputs.loudness - quiet_low) / (quiet_high - quiet_low), 0, 1)
+        return np.stack([obscurity, age, ending, later, quietness], axis=1)
+
+    def score(self, inputs: SongInputs) -> np.ndarray:
+        components = self.components(inputs)
+        weights = np.broadcast_to(np.array(self.weights), components.shape)
+        present = ~np.isnan(components)
+        total = np.where(present, weights, 0).sum(axis=1)
+        weighted = np.where(present, components * weights, 0).sum(axis=1)
+        # songs with no known component get the middle difficulty
+        mean = np.divide(weighted, total, out=np.full(len(inputs), 0.5), where=total > 0)
+        return np.rint(mean * 100).astype(np.int64)
+
+
+STRATEGIES: dict[str, DifficultyStrategy] = {
+    strategy.name: strategy for strategy in (RandomStrategy(), PopularityStrategy())
+}
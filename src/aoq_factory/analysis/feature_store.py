@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from aoq_factory.config import get_settings
+
+from .audio import HOP_SIZE, SAMPLE_RATE, compute_features, decode_audio, mel_spectrogram
+
+logger = logging.getLogger(__name__)
+
+# bump when features change, entries of other versions are recomputed
+VERSION = 1
+ARRAYS = ("pcm", "mel", "loudness")
+
+
+@dataclass
+class AudioFeatureSet:
+    """Features of one file, arrays are memory-mapped read-only"""
+
+    file_hash: str
+    sample_rate: int
+    duration: float
+    pcm: np.ndarray
+    mel: np.ndarray
+    loudness: np.ndarray
+
+    @property
+    def frame_rate(self) -> float:
+        return self.sample_rate / HOP_SIZE
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=20)).hexdigest()
+
+
+def _directory_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class FeatureStore:
+    """Content-addressed cache of decoded audio features under root, bounded by max_bytes
+
+    Entries live in root/<hash[:2]>/<hash>/ as .npy files plus meta.json. The content hash of a
+    path is remembered together with its size and mtime, so the file is only rehashed after it
+    changes. Least recently used entries are evicted when a new entry pushes the store over max_bytes,
+    entries larger than max_bytes on their own are returned without being stored.
+    """
+
+    def __init__(self, root: str, max_bytes: int, ffmpeg: str = "ffmpeg") -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ffmpeg = ffmpeg
+
+    @classmethod
+    def from_settings(cls) -> "FeatureStore":
+        settings = get_settings()
+        return cls(
+            os.path.join(settings.resources_dir, "features"), settings.feature_store_max_bytes, settings.ffmpeg_path
+        )
+
+    def _entry_dir(self, hash_: str) -> str:
+        return os.path.join(self.root, hash_[:2], hash_)
+
+    def _path_record(self, path: str) -> str:
+        key = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.root, "paths", f"{key}.json")
+
+    def _recorded_hash(self, path: str, stat: os.stat_result) -> Optional[str]:
+        try:
+            with open(self._path_record(path)) as f:
+                record = json.load(f)
+            if record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+                return record["hash"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def hash_of(self, path: str) -> str:
+        """Content hash of path, recomputed only when its size or mtime changed"""
+        stat = os.stat(path)
+        hash_ = self._recorded_hash(path, stat)
+        if hash_ is not None:
+            return hash_
+        hash_ = file_hash(path)
+        record_path = self._path_record(path)
+        os.makedirs(os.path.dirname(record_path), exist_ok=True)
+        self._write_json(record_path, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": hash_})
+        return hash_
+
+    def _write_json(self, path: str, data: dict) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _load(self, hash_: str) -> Optional[AudioFeatureSet]:
+        entry = self._entry_dir(hash_)
+        try:
+            with open(os.path.join(entry, "meta.json")) as f:
+                meta = json.load(f)
+            if meta["version"] != VERSION:
+                return None
+            arrays = {name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        except (OSError, ValueError, KeyError):
+            return None
+        # mtime of the entry directory marks its last use for eviction
+        os.utime(entry)
+        return AudioFeatureSet(hash_, meta["sample_rate"], meta["duration"], **arrays)
+
+    def _store(self, hash_: str, path: str) -> Optional[AudioFeatureSet]:
+        """Decode and store features of path, returns them unstored when they alone don't fit max_bytes"""
+        pcm = decode_audio(path, SAMPLE_RATE, self.ffmpeg)
+        features = compute_features(pcm, SAMPLE_RATE)
+        loudness = (20 * np.log10(features.rms + 1e-6)).astype(np.float32)
+        mel = mel_spectrogram(pcm, SAMPLE_RATE)
+
+        arrays = {"pcm": pcm, "mel": mel, "loudness": loudness}
+        if sum(array.nbytes for array in arrays.values()) > self.max_bytes:
+            logger.warning(f"features of {path} are larger than the whole store, not storing them")
+            for array in arrays.values():
+                array.setflags(write=False)
+            return AudioFeatureSet(hash_, SAMPLE_RATE, len(pcm) / SAMPLE_RATE, **arrays)
+
+        entry = self._entry_dir(hash_)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(entry), suffix=".tmp")
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), array)
+            meta = {"version": VERSION, "sample_rate": SAMPLE_RATE, "duration": len(pcm) / SAMPLE_RATE}
+            self._write_json(os.path.join(tmp, "meta.json"), meta)
+            if os.path.exists(entry):
+                # stale version, or written meanwhile by another process
+                shutil.rmtree(entry, ignore_errors=True)
+            os.rename(tmp, entry)
+        except OSError as e:
+            logger.warning(f"can't store features of {path}: {e}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=entry)
+        return None
+
+    def get(self, path: str) -> AudioFeatureSet:
+        """Features of path, decoded and stored on the first request for its content"""
+        hash_ = self.hash_of(path)
+        features = self._load(hash_)
+        if features is None:
+            features = self._store(hash_, path) or self._load(hash_)
+            if features is None:
+                raise OSError(f"can't load stored features of {path}")
+        return features
+
+    def peek(self, path: str) -> Optional[AudioFeatureSet]:
+        """Features of path if already stored, never hashes the file or decodes it"""
+        try:
+            hash_ = self._recorded_hash(path, os.stat(path))
+        except OSError:
+            return None
+        return None if hash_ is None else self._load(hash_)
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Remove least recently used entries other than keep until the store fits max_bytes, returns number removed"""
+        entries = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name == "paths":
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_dir() and not entry.name.endswith(".tmp"):
+                    entries.append((entry.stat().st_mtime, _directory_size(entry.path), entry.path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"evicted {removed} feature entries")
+        return removed
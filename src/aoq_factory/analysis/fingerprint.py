@@ -0,0 +1,289 @@
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .audio import FRAME_SIZE, HOP_SIZE, SAMPLE_RATE, decode_audio, frame_signal
+from .feature_store import FeatureStore
+
+logger = logging.getLogger(__name__)
+
+# spectrogram bins kept for peaks, up to about 5.5kHz at 22050Hz
+FREQ_BINS = 512
+PEAK_TIME_RADIUS = 10
+PEAK_FREQ_RADIUS = 16
+PEAKS_PER_SECOND = 12
+FAN_OUT = 6
+MAX_DT = 63
+FREQ_BITS = 9
+DT_BITS = 6
+
+
+def _max_filter(x: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    pad = [(0, 0)] * x.ndim
+    pad[axis] = (radius, radius)
+    padded = np.pad(x, pad, mode="constant", constant_values=-np.inf)
+    return sliding_window_view(padded, 2 * radius + 1, axis=axis).max(axis=-1)
+
+
+def spectral_peaks(
+    signal: np.ndarray, sample_rate: int = SAMPLE_RATE, peaks_per_second: float = PEAKS_PER_SECOND
+) -> tuple[np.ndarray, np.ndarray]:
+    """Frames and bins of the strongest local maxima of the log spectrogram, sorted by frame"""
+    frames = frame_signal(signal)
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE).astype(np.float32), axis=1))[:, 1 : FREQ_BINS + 1]
+    spectrum = np.log1p(spectrum)
+    # separable rectangle maximum, then peaks are points equal to the maximum around them
+    local_max = _max_filter(_max_filter(spectrum, PEAK_TIME_RADIUS, 0), PEAK_FREQ_RADIUS, 1)
+    times, bins = np.nonzero((spectrum >= local_max) & (spectrum > spectrum.mean()))
+    budget = max(int(len(frames) * HOP_SIZE / sample_rate * peaks_per_second), 1)
+    if len(times) > budget:
+        keep = np.argpartition(spectrum[times, bins], -budget)[-budget:]
+        times, bins = times[keep], bins[keep]
+    order = np.lexsort((bins, times))
+    return times[order].astype(np.int32), bins[order].astype(np.int32)
+
+
+def landmarks(times: np.ndarray, bins: np.ndarray, fan_out: int = FAN_OUT) -> tuple[np.ndarray, np.ndarray]:
+    """Hashes of pairs of every peak with the next fan_out peaks, and frames of their anchors
+
+    A hash packs anchor bin, target bin and frame distance, so it survives gain changes and shifts in time
+    """
+    hashes, anchors = [], []
+    for k in range(1, fan_out + 1):
+        dt = times[k:] - times[:-k]
+        valid = (dt > 0) & (dt <= MAX_DT)
+        f1, f2 = bins[:-k][valid].astype(np.uint32), bins[k:][valid].astype(np.uint32)
+        hashes.append((f1 << (FREQ_BITS + DT_BITS)) | (f2 << DT_BITS) | dt[valid].astype(np.uint32))
+        anchors.append(times[:-k][valid])
+    if not hashes:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(hashes), np.concatenate(anchors).astype(np.int32)
+
+
+def fingerprint(signal: np.ndarray, sample_rate: int = SAMPLE_RATE) -> tuple[np.ndarray, np.ndarray]:
+    return landmarks(*spectral_peaks(signal, sample_rate))
+
+
+@dataclass
+class FingerprintMatch:
+    source_id: int
+    # hashes agreeing on one time offset, and their share of the query hashes
+    score: int
+    ratio: float
+    # seconds to add to a query time to get the time in the matched source
+    offset: float
+
+
+def _ranges(left: np.ndarray, right: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Flat indices of [left, right) ranges and the range of every index"""
+    lengths = right - left
+    owner = np.repeat(np.arange(len(left)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    return np.repeat(left, lengths) + (np.arange(lengths.sum()) - np.repeat(starts, lengths)), owner
+
+
+class FingerprintIndex:
+    """Inverted index from landmark hashes to (source, frame) postings under root
+
+    Postings are stored in immutable shards sorted by hash and memory-mapped, so a lookup is a binary
+    search per shard. New fingerprints are buffered and written as a shard by flush, shards are merged
+    once there are more than max_shards. Removed sources are masked until the next merge
+    """
+
+    def __init__(self, root: str, max_shards: int = 8, max_postings: int = 2000) -> None:
+        self.root = root
+        self.max_shards = max_shards
+        # hashes more common than this carry little information and are skipped by lookups
+        self.max_postings = max_postings
+        os.makedirs(root, exist_ok=True)
+        manifest = self._read_manifest()
+        self.shards: list[str] = manifest["shards"]
+        self.sources: set[int] = set(manifest["sources"])
+        # postings of a removed source are dead in shards numbered below its value
+        self.removed: dict[int, int] = {int(source_id): shard for source_id, shard in manifest["removed"].items()}
+        self._next_shard: int = manifest["next_shard"]
+        self._loaded: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._buffer: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, "manifest.json")
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"shards": [], "sources": [], "removed": {}, "next_shard": 0}
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "shards": self.shards,
+            "sources": sorted(self.sources),
+            "removed": self.removed,
+            "next_shard": self._next_shard,
+        }
+        tmp = f"{self._manifest_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path)
+
+    def _shard(self, name: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        shard = self._loaded.get(name)
+        if shard is None:
+            shard = tuple(
+                np.load(os.path.join(self.root, f"{name}.{part}.npy"), mmap_mode="r")
+                for part in ("hashes", "sources", "frames")
+            )
+            self._loaded[name] = shard
+        return shard
+
+    def _dead(self, name: str, sources: np.ndarray) -> Optional[np.ndarray]:
+        """Mask of postings of removed sources in shard name, None when it has none"""
+        number = int(name.removeprefix("shard"))
+        dead = [source_id for source_id, cutoff in self.removed.items() if number < cutoff]
+        if not dead:
+            return None
+        return np.isin(sources, np.array(dead, dtype=np.int32))
+
+    def _write_shard(self, hashes: np.ndarray, sources: np.ndarray, frames: np.ndarray) -> str:
+        order = np.argsort(hashes, kind="stable")
+        name = f"shard{self._next_shard:06d}"
+        self._next_shard += 1
+        for part, array in (("hashes", hashes), ("sources", sources), ("frames", frames)):
+            np.save(os.path.join(self.root, f"{name}.{part}.npy"), array[order])
+        return name
+
+    @property
+    def posting_count(self) -> int:
+        """Postings written to shards, removed ones included until the next merge"""
+        return sum(len(self._shard(name)[0]) for name in self.shards)
+
+    def __contains__(self, source_id: int) -> bool:
+        return source_id in self.sources
+
+    def add(self, source_id: int, hashes: np.ndarray, frames: np.ndarray) -> None:
+        """Buffer fingerprint of source_id, replacing its previous one"""
+        if source_id in self.sources:
+            self.remove([source_id])
+        self._buffer[source_id] = (hashes.astype(np.uint32), frames.astype(np.int32))
+        self.sources.add(source_id)
+
+    def remove(self, source_ids: Iterable[int]) -> None:
+        for source_id in set(source_ids) & self.sources:
+            self.removed[source_id] = self._next_shard
+            self.sources.discard(source_id)
+            self._buffer.pop(source_id, None)
+
+    def flush(self) -> None:
+        """Write buffered fingerprints as a new shard, merging shards when there are too many"""
+        if self._buffer:
+            hashes = np.concatenate([hashes for hashes, _ in self._buffer.values()])
+            frames = np.concatenate([frames for _, frames in self._buffer.values()])
+            sources = np.repeat(
+                np.fromiter(self._buffer, dtype=np.int32, count=len(self._buffer)),
+                [len(hashes) for hashes, _ in self._buffer.values()],
+            )
+            self.shards.append(self._write_shard(hashes, sources, frames))
+            self._buffer = {}
+        if len(self.shards) > self.max_shards:
+            self.compact()
+        else:
+            self._write_manifest()
+
+    def compact(self) -> None:
+        """Merge all shards into one, dropping postings of removed sources"""
+        parts: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for name in self.shards:
+            shard_hashes, shard_sources, shard_frames = self._shard(name)
+            dead = self._dead(name, shard_sources)
+            if dead is not None:
+                shard_hashes, shard_sources, shard_frames = (
+                    array[~dead] for array in (shard_hashes, shard_sources, shard_frames)
+                )
+            parts.append((shard_hashes, shard_sources, shard_frames))
+        hashes, sources, frames = (np.concatenate(arrays) for arrays in zip(*parts, strict=True))
+        old = self.shards
+        self.shards = [self._write_shard(hashes, sources, frames)]
+        self.removed = {}
+        self._write_manifest()
+        self._loaded = {}
+        for name in old:
+            for part in ("hashes", "sources", "frames"):
+                os.remove(os.path.join(self.root, f"{name}.{part}.npy"))
+        logger.info(f"merged {len(old)} fingerprint shards, {len(hashes)} postings")
+
+    def _postings(self, hashes: np.ndarray, frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Sources and frame offsets of postings sharing a hash with the query"""
+        found_sources, found_offsets = [], []
+        for name in self.shards:
+            shard_hashes, shard_sources, shard_frames = self._shard(name)
+            left = np.searchsorted(shard_hashes, hashes, side="left")
+            right = np.searchsorted(shard_hashes, hashes, side="right")
+            common = right - left <= self.max_postings
+            indices, owner = _ranges(left[common], right[common])
+            sources = shard_sources[indices]
+            offsets = shard_frames[indices] - frames[common][owner]
+            dead = self._dead(name, sources)
+            if dead is not None:
+                sources, offsets = sources[~dead], offsets[~dead]
+            found_sources.append(sources)
+            found_offsets.append(offsets)
+        if not found_sources:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return np.concatenate(found_sources), np.concatenate(found_offsets)
+
+    def query(
+        self,
+        hashes: np.ndarray,
+        frames: np.ndarray,
+        limit: int = 5,
+        min_score: int = 10,
+        exclude: Optional[int] = None,
+        frame_rate: float = SAMPLE_RATE / HOP_SIZE,
+    ) -> list[FingerprintMatch]:
+        """Sources with the most hashes agreeing on a single time offset with the query"""
+        sources, offsets = self._postings(hashes, frames)
+        if exclude is not None:
+            keep = sources != exclude
+            sources, offsets = sources[keep], offsets[keep]
+        if len(sources) == 0:
+            return []
+        # offsets are binned by 2 frames to tolerate frame jitter
+        keys = (sources.astype(np.int64) << 32) | ((offsets // 2).astype(np.int64) & 0xFFFFFFFF)
+        unique, counts = np.unique(keys, return_counts=True)
+        order = np.lexsort((-counts, unique >> 32))
+        unique, counts = unique[order], counts[order]
+        # best offset of every source, the first after sorting by source and descending count
+        first = np.concatenate(([True], (unique[1:] >> 32) != (unique[:-1] >> 32)))
+        best_keys, best_counts = unique[first], counts[first]
+        top = np.argsort(-best_counts, kind="stable")[:limit]
+        matches = []
+        for key, count in zip(best_keys[top], best_counts[top], strict=True):
+            if count < min_score:
+                break
+            offset_bin = int(key & 0xFFFFFFFF)
+            if offset_bin >= 1 << 31:
+                offset_bin -= 1 << 32
+            matches.append(
+                FingerprintMatch(
+                    source_id=int(key >> 32),
+                    score=int(count),
+                    ratio=float(count) / max(len(hashes), 1),
+                    offset=offset_bin * 2 / frame_rate,
+                )
+            )
+        return matches
+
+
+def fingerprint_file(
+    path: str, ffmpeg: str = "ffmpeg", store: Optional[FeatureStore] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fingerprint of the audio of path, runs in a worker process"""
+    signal = store.get(path).pcm if store is not None else decode_audio(path, SAMPLE_RATE, ffmpeg)
+    return fingerprint(signal)
@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import enum
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Optional
+
+from sqlalchemy import select
+
+from aoq_factory.config import get_settings
+from aoq_factory.database.connection import Engine, get_read_engine
+from aoq_factory.database.models import Category, Song, Source, SourceStatus
+
+from .audio import AudioDecodeError
+from .feature_store import FeatureStore
+from .fingerprint import FingerprintIndex, fingerprint_file
+
+logger = logging.getLogger(__name__)
+
+
+class IssueKind(enum.Enum):
+    # same audio as another source of the same song, but not the same file
+    DUPLICATE = "duplicate"
+    # same audio as a source of another song of the same anime, like a wrong OP number
+    SONG_MISMATCH = "song_mismatch"
+    # same audio as a source of another anime
+    ANIME_MISMATCH = "anime_mismatch"
+
+
+@dataclass
+class SourceRow:
+    source_id: int
+    song_id: int
+    anime_id: int
+    category: Category
+    number: int
+    local_path: str
+    content_hash: Optional[str]
+
+
+@dataclass
+class SourceIssue:
+    kind: IssueKind
+    source_id: int
+    other_source_id: int
+    score: int
+    ratio: float
+    offset: float
+
+
+async def load_sources(engine: Engine) -> list[SourceRow]:
+    stmt = (
+        select(
+            Source.id,
+            Source.song_id,
+            Song.anime_id,
+            Song.category,
+            Song.number,
+            Source.local_path,
+            Source.content_hash,
+        )
+        .join(Song, Song.id == Source.song_id)
+        .where(Source.status == SourceStatus.DOWNLOADED, Source.local_path.is_not(None))
+        .order_by(Source.id)
+    )
+    async with engine.async_session() as session:
+        return [SourceRow(*row) for row in (await session.execute(stmt)).tuples()]
+
+
+def classify(row: SourceRow, other: SourceRow) -> Optional[IssueKind]:
+    if row.content_hash is not None and row.content_hash == other.content_hash:
+        # deduplicated copies of one file are expected
+        return None
+    if row.song_id == other.song_id:
+        return IssueKind.DUPLICATE
+    if row.anime_id == other.anime_id:
+        return IssueKind.SONG_MISMATCH
+    return IssueKind.ANIME_MISMATCH
+
+
+def match_sources(
+    index: FingerprintIndex,
+    rows: list[SourceRow],
+    executor: ProcessPoolExecutor,
+    ffmpeg: str = "ffmpeg",
+    store: Optional[FeatureStore] = None,
+    min_ratio: float = 0.05,
+    min_score: int = 20,
+) -> list[SourceIssue]:
+    """Index sources missing from index, then report every pair of a new source with similar audio
+
+    Pairs between sources indexed by earlier runs were reported by those runs already
+    """
+    by_id = {row.source_id: row for row in rows}
+    index.remove(source_id for source_id in list(index.sources) if source_id not in by_id)
+    new_rows = [row for row in rows if row.source_id not in index]
+    logger.info(f"fingerprinting {len(new_rows)} of {len(rows)} downloaded sources")
+
+    fingerprints = {}
+    analyze = partial(fingerprint_file, ffmpeg=ffmpeg, store=store)
+    futures = {row.source_id: executor.submit(analyze, row.local_path) for row in new_rows}
+    for source_id, future in futures.items():
+        try:
+            fingerprints[source_id] = future.result()
+        except (AudioDecodeError, OSError) as e:
+            logger.warning(f"can't fingerprint source {source_id}: {e}")
+            continue
+        index.add(source_id, *fingerprints[source_id])
+    index.flush()
+
+    issues = []
+    reported: set[tuple[int, int]] = set()
+    for source_id, (hashes, frames) in fingerprints.items():
+        row = by_id[source_id]
+        for match in index.query(hashes, frames, min_score=min_score, exclude=source_id):
+            other = by_id.get(match.source_id)
+            pair = (min(source_id, match.source_id), max(source_id, match.source_id))
+            if other is None or match.ratio < min_ratio or pair in reported:
+                continue
+            kind = classify(row, other)
+            if kind is None:
+                continue
+            reported.add(pair)
+            issues.append(SourceIssue(kind, source_id, other.source_id, match.score, match.ratio, match.offset))
+    return issues
+
+
+async def run(root: str, concurrency: Optional[int], use_store: bool) -> list[SourceIssue]:
+    settings = get_settings()
+    engine = get_read_engine()
+    try:
+        rows = await load_sources(engine)
+    finally:
+        await engine.engine.dispose()
+    index = FingerprintIndex(root)
+    store = FeatureStore.from_settings() if use_store else None
+    with ProcessPoolExecutor(max_workers=concurrency) as executor:
+        return await asyncio.to_thread(match_sources, index, rows, executor, settings.ffmpeg_path, store)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fingerprint downloaded sources and report mismatched songs")
+    parser.add_argument("--index", default=None, help="index directory, fingerprints in resources_dir by default")
+    parser.add_argument("--concurrency", type=int, default=None, help="fingerprinting processes")
+    parser.add_argument("--no-store", action="store_true", help="decode files instead of using the feature store")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    root = args.index or os.path.join(get_settings().resources_dir, "fingerprints")
+    for issue in asyncio.run(run(root, args.concurrency, not args.no_store)):
+        print(
+            f"{issue.kind.value}: source {issue.source_id} matches source {issue.other_source_id}"
+            f" (score {issue.score}, {issue.ratio:.0%} of hashes, offset {issue.offset:+.1f}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
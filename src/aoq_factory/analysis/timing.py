@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+from .audio import (
+    SAMPLE_RATE,
+    AudioFeatures,
+    boundary_frames,
+    compute_features,
+    decode_audio,
+    onset_frames,
+    window_means,
+)
+from .feature_store import FeatureStore
+from .video import detect_scene_changes
+
+ENERGY_ONSET = "energy_onset"
+ENERGY_ONSET_SCENE = "energy_onset_scene"
+
+# seconds of song played before the reveal
+GUESS_DURATION = 15.0
+
+
+@dataclass
+class TimingResult:
+    guess_start: float
+    reveal_start: float
+
+
+def _snap(time: float, *candidates: tuple[np.ndarray, float]) -> float:
+    """Nearest time of the first candidates having one within its tolerance, time itself if none"""
+    for times, tolerance in candidates:
+        if len(times) == 0:
+            continue
+        nearest = float(times[np.argmin(np.abs(times - time))])
+        if abs(nearest - time) <= tolerance:
+            return nearest
+    return time
+
+
+def find_chorus(features: AudioFeatures, length: float, min_start: float) -> float:
+    """Start of the loudest window of `length` seconds beginning after min_start"""
+    width = min(features.frame(length), len(features.rms))
+    energy = window_means(features.rms, width)
+    first = min(features.frame(min_start), len(energy) - 1)
+    return float(features.time(first + int(np.argmax(energy[first:]))))
+
+
+def analyze_timing(
+    signal: np.ndarray,
+    sample_rate: int = SAMPLE_RATE,
+    guess_duration: float = GUESS_DURATION,
+    chorus_length: float = 20.0,
+    min_start: float = 5.0,
+) -> TimingResult:
+    """Start the guess at the chorus and reveal after guess_duration, both snapped to section boundaries or onsets
+
+    The chorus is taken to be the loudest chorus_length window after the intro
+    """
+    features = compute_features(signal, sample_rate)
+    if features.duration < guess_duration:
+        raise ValueError(f"audio is too short ({features.duration:.1f}s) for a {guess_duration}s guess")
+    boundaries = features.time(boundary_frames(features))
+    onsets = features.time(onset_frames(features))
+
+    chorus = find_chorus(features, chorus_length, min(min_start, features.duration - guess_duration))
+    guess_start = min(_snap(chorus, (boundaries, 3.0), (onsets, 0.5)), features.duration - guess_duration)
+
+    target = guess_start + guess_duration
+    # reveal must leave the whole guess, only later boundaries and onsets qualify
+    reveal_start = _snap(target, (boundaries[boundaries >= target], 2.0), (onsets[onsets >= target], 0.5))
+    return TimingResult(guess_start=round(guess_start, 3), reveal_start=round(reveal_start, 3))
+
+
+def refine_reveal(
+    timing: TimingResult, cuts: np.ndarray, guess_duration: float = GUESS_DURATION, tolerance: float = 2.0
+) -> TimingResult:
+    """Move reveal_start to the nearest scene change within tolerance, keeping the whole guess_duration"""
+    cuts = cuts[cuts >= timing.guess_start + guess_duration]
+    reveal_start = _snap(timing.reveal_start, (cuts, tolerance))
+    return TimingResult(guess_start=timing.guess_start, reveal_start=round(reveal_start, 3))
+
+
+def analyze_file(
+    path: str, ffmpeg: str = "ffmpeg", store: Optional[FeatureStore] = None, **kwargs: float
+) -> TimingResult:
+    """Decode and analyze a downloaded source, runs in a worker process
+
+    With a store, samples are read from its cache and only decoded the first time the file is seen
+    """
+    if store is not None:
+        signal = store.get(path).pcm
+    else:
+        signal = decode_audio(path, SAMPLE_RATE, ffmpeg)
+    return analyze_timing(signal, SAMPLE_RATE, **kwargs)
+
+
+def analyze_file_with_scenes(
+    path: str, ffmpeg: str = "ffmpeg", store: Optional[FeatureStore] = None, **kwargs: float
+) -> TimingResult:
+    """Audio timing with reveal_start moved to a visual cut when there is one close to it"""
+    timing = analyze_file(path, ffmpeg, store, **kwargs)
+    cuts = detect_scene_changes(path, ffmpeg=ffmpeg)
+    return refine_reveal(timing, cuts, kwargs.get("guess_duration", GUESS_DURATION))
+
+
+STRATEGIES: dict[str, Callable[..., TimingResult]] = {
+    ENERGY_ONSET: analyze_file,
+    ENERGY_ONSET_SCENE: analyze_file_with_scenes,
+}
@@ -0,0 +1,120 @@
+import subprocess
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from .audio import pick_peaks
+
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 36
+FPS = 10.0
+BATCH_SIZE = 512
+HISTOGRAM_BINS = 16
+
+
+class VideoDecodeError(Exception):
+    pass
+
+
+def stream_frames(
+    path: str,
+    width: int = FRAME_WIDTH,
+    height: int = FRAME_HEIGHT,
+    fps: float = FPS,
+    batch_size: int = BATCH_SIZE,
+    ffmpeg: str = "ffmpeg",
+) -> Iterator[np.ndarray]:
+    """Downscaled grayscale frames of path in batches of shape (n, height, width)
+
+    Frames are read straight from the ffmpeg pipe into one preallocated buffer that is reused for
+    every batch, so a yielded batch is only valid until the next one is requested
+    """
+    cmd = [
+        ffmpeg,
+        "-nostdin",
+        "-v",
+        "error",
+        "-i",
+        path,
+        "-an",
+        "-vf",
+        f"fps={fps},scale={width}:{height}",
+        "-pix_fmt",
+        "gray",
+        "-f",
+        "rawvideo",
+        "pipe:1",
+    ]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError as e:
+        raise VideoDecodeError(f"ffmpeg not found: {ffmpeg}") from e
+
+    buffer = np.empty((batch_size, height, width), dtype=np.uint8)
+    view = memoryview(buffer).cast("B")
+    frame_bytes = width * height
+    try:
+        while True:
+            filled = 0
+            while filled < len(view):
+                read = proc.stdout.readinto(view[filled:])
+                if not read:
+                    break
+                filled += read
+            frames = filled // frame_bytes
+            if frames:
+                yield buffer[:frames]
+            if filled < len(view):
+                break
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise VideoDecodeError(stderr.decode(errors="replace").strip() or f"ffmpeg exited with {returncode}")
+
+
+def _histograms(frames: np.ndarray, bins: int) -> np.ndarray:
+    """Normalized intensity histograms of every frame with a single bincount"""
+    n = len(frames)
+    indices = frames.reshape(n, -1) // (256 // bins) + (np.arange(n) * bins)[:, None]
+    counts = np.bincount(indices.ravel(), minlength=n * bins).reshape(n, bins)
+    return counts / frames[0].size
+
+
+def scene_change_scores(batches: Iterable[np.ndarray], bins: int = HISTOGRAM_BINS) -> np.ndarray:
+    """Score of the change between every frame and the previous one, 0 for the first frame
+
+    Mean of the normalized absolute pixel difference and half the L1 histogram distance, both in [0, 1]
+    """
+    scores: list[np.ndarray] = []
+    previous: Optional[np.ndarray] = None
+    previous_histogram: np.ndarray = np.zeros(bins)
+    for batch in batches:
+        histograms = _histograms(batch, bins)
+        # int16 copy, the batch buffer is reused by stream_frames
+        frames = batch.astype(np.int16)
+        if previous is None:
+            previous, previous_histogram = frames[0], histograms[0]
+        frames_before = np.concatenate((previous[None], frames[:-1]))
+        histograms_before = np.concatenate((previous_histogram[None], histograms[:-1]))
+        pixel_diff = np.abs(frames - frames_before).mean(axis=(1, 2)) / 255
+        histogram_diff = np.abs(histograms - histograms_before).sum(axis=1) / 2
+        scores.append((pixel_diff + histogram_diff) / 2)
+        previous, previous_histogram = frames[-1], histograms[-1]
+    return np.concatenate(scores) if scores else np.zeros(0)
+
+
+def scene_changes(
+    scores: np.ndarray, fps: float = FPS, min_interval: float = 1.0, min_score: float = 0.15
+) -> np.ndarray:
+    """Times of cuts, score peaks standing out of the rest of the video"""
+    if len(scores) == 0:
+        return np.zeros(0)
+    threshold = max(min_score, float(np.mean(scores) + 2 * np.std(scores)))
+    return pick_peaks(scores, round(min_interval * fps), threshold) / fps
+
+
+def detect_scene_changes(path: str, fps: float = FPS, ffmpeg: str = "ffmpeg") -> np.ndarray:
+    return scene_changes(scene_change_scores(stream_frames(path, fps=fps, ffmpeg=ffmpeg)), fps)
@@ -1,3 +1,4 @@
-from .page import Page
+from .page import Page, parse_songs
+from .tools import get_page
 
-__all__ = [Page]
+__all__ = [Page, get_page, parse_songs]
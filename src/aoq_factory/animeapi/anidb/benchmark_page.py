@@ -0,0 +1,101 @@
+import argparse
+import time
+from typing import Callable
+
+from pyquery import PyQuery as pq
+
+from aoq_factory.database.models import Category, Song
+
+from .page import parse_songs
+
+ROW = (
+    '<tr class="{parity}">{reltype}'
+    '<td class="name song"><a href="/song/{song_id}">Song {song_id}</a></td>'
+    '<td class="type">performed by</td>'
+    '<td class="name creator"><a href="/creator/{creator_id}">Artist {creator_id}</a></td>'
+    "</tr>"
+)
+
+
+def legacy_songs(html: str, anidb_id: int) -> list[Song]:
+    """Song list parser before the single pass rewrite, rescans previous rows for every song"""
+    songs = []
+    counters = {}
+    anidb_ids = set()
+    for song in pq(html)("table#songlist > tbody td.name.song"):
+        song = pq(song)
+        anidb_id = int(song("a").eq(0).attr("href").split("/")[-1])
+        if anidb_id in anidb_ids:
+            continue
+        category = (
+            song.parent().prev_all().children().extend(song.prev_all()).filter(".reltype").eq(-1).text().strip().lower()
+        )
+        if category == "opening":
+            category = Category.OP
+        elif category == "ending":
+            category = Category.ED
+        else:
+            break
+        number = counters[category] = counters.get(category, 0) + 1
+        name = song.text().strip()
+        name = name if name != "" else None
+        try:
+            artist = song.next_all("td.name.creator").text().strip()
+        except Exception:
+            artist = None
+        anidb_ids.add(anidb_id)
+        songs.append(Song(category=category, number=number, song_name=name, song_artist=artist))
+    return songs
+
+
+def synthetic_page(songs: int) -> str:
+    """Anime page with songs split between an opening and an ending section"""
+    rows = []
+    for index in range(songs):
+        section = "Opening" if index < songs // 2 else "Ending"
+        first = index in (0, songs // 2)
+        reltype = f'<td class="reltype" rowspan="{songs}">{section}</td>' if first else ""
+        parity = "g_odd" if index % 2 else "even"
+        rows.append(ROW.format(parity=parity, reltype=reltype, song_id=1000 + index, creator_id=index % 50))
+    return f'<html><body><table id="songlist"><tbody>{"".join(rows)}</tbody></table></body></html>'
+
+
+def measure(parse: Callable[[str, int], list[Song]], htmls: list[str], repeat: int) -> float:
+    """Best time in seconds to parse all htmls once"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html in htmls:
+            parse(html, 0)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the AniDB song list parser with the legacy one")
+    parser.add_argument("paths", nargs="*", help="saved anime pages, synthetic pages by default")
+    parser.add_argument("--songs", type=int, nargs="+", default=[10, 50, 200], help="songs per synthetic page")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.paths:
+        pages = {}
+        for path in args.paths:
+            with open(path, encoding="utf-8") as f:
+                pages[path] = [f.read()]
+    else:
+        pages = {f"{songs} songs": [synthetic_page(songs)] for songs in args.songs}
+
+    for name, htmls in pages.items():
+        legacy = [[(s.category, s.number, s.song_name, s.song_artist) for s in legacy_songs(h, 0)] for h in htmls]
+        current = [[(s.category, s.number, s.song_name, s.song_artist) for s in parse_songs(h, 0)] for h in htmls]
+        legacy_time = measure(legacy_songs, htmls, args.repeat)
+        current_time = measure(parse_songs, htmls, args.repeat)
+        print(
+            f"{name}: legacy {legacy_time * 1000:.1f}ms, single pass {current_time * 1000:.1f}ms"
+            f" ({legacy_time / current_time:.0f}x), {'same' if legacy == current else 'DIFFERENT'} songs"
+        )
+
+
+if __name__ == "__main__":
+    main()
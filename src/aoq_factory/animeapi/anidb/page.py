@@ -1,10 +1,12 @@
-from typing import Self
+from typing import Optional, Self
 
+from lxml.html import HtmlElement
 from pyquery import PyQuery as pq
+from pyquery.text import extract_text
 
 from aoq_factory.database.models import Category, Song
 
-from .tools import get_page
+from .tools import get_page, get_pages
 
 
 class Page:
@@ -16,47 +18,67 @@ class Page:
     async def from_id(cls, anidb_id: int) -> Self:
         return cls(await get_page(anidb_id), anidb_id)
 
+    @classmethod
+    async def from_ids(cls, anidb_ids: list[int]) -> list[Optional[Self]]:
+        htmls = await get_pages(anidb_ids)
+        return [
+            cls(html, anidb_id) if html is not None else None for html, anidb_id in zip(htmls, anidb_ids, strict=True)
+        ]
+
     @property
     def songs(self) -> list[Song]:
         songs = []
         counters = {}
         anidb_ids = set()
-        for song in self.page("table#songlist > tbody td.name.song"):
-            song = pq(song)
-            anidb_id = int(song("a").eq(0).attr("href").split("/")[-1])
-            if anidb_id in anidb_ids:
-                continue
-            category = (
-                song.parent()
-                .prev_all()
-                .children()
-                .extend(song.prev_all())
-                .filter(".reltype")
-                .eq(-1)
-                .text()
-                .strip()
-                .lower()
-            )
-            if category == "opening":
-                category = Category.OP
-            elif category == "ending":
-                category = Category.ED
-            else:
-                break
-            number = counters[category] = counters.get(category, 0) + 1
-            name = song.text().strip()
-            name = name if name != "" else None
-            try:
-                artist = song.next_all("td.name.creator").text().strip()
-            except Exception:
-                artist = None
-            anidb_ids.add(anidb_id)
-            songs.append(
-                Song(
-                    category=category,
-                    number=number,
-                    song_name=name,
-                    song_artist=artist,
-                )
-            )
+        for tbody in self.page("table#songlist > tbody"):
+            # text of the last .reltype cell seen so far, reltype cells span all rows of their section
+            reltype = ""
+            for row in tbody:
+                if not isinstance(row.tag, str):
+                    continue
+                for cell in row:
+                    if not isinstance(cell.tag, str):
+                        continue
+                    classes = _classes(cell)
+                    if "reltype" in classes:
+                        reltype = extract_text(cell)
+                    if cell.tag != "td" or "name" not in classes or "song" not in classes:
+                        continue
+
+                    anidb_id = int(cell.find(".//a").get("href").split("/")[-1])
+                    if anidb_id in anidb_ids:
+                        continue
+                    category = reltype.strip().lower()
+                    if category == "opening":
+                        category = Category.OP
+                    elif category == "ending":
+                        category = Category.ED
+                    else:
+                        return songs
+                    number = counters[category] = counters.get(category, 0) + 1
+                    name = extract_text(cell).strip()
+                    name = name if name != "" else None
+                    artist = " ".join(
+                        extract_text(sibling)
+                        for sibling in cell.itersiblings()
+                        if sibling.tag == "td" and {"name", "creator"} <= _classes(sibling)
+                    ).strip()
+                    anidb_ids.add(anidb_id)
+                    songs.append(
+                        Song(
+                            category=category,
+                            number=number,
+                            song_name=name,
+                            song_artist=artist,
+                        )
+                    )
         return songs
+
+
+def _classes(element: HtmlElement) -> set[str]:
+    return set(element.get("class", "").split())
+
+
+def parse_songs(html: str, anidb_id: int) -> list[Song]:
+    """Module level entry point, so parsing can run in a process pool"""
+    return Page(html, anidb_id).songs
@@ -0,0 +1,37 @@
+import argparse
+import asyncio
+import logging
+
+from ..codecs import ZSTD_DICT
+from ..zlib_memoize import PageCache
+from .tools import cache_filename
+
+logger = logging.getLogger(__name__)
+
+
+async def train(filename: str, samples: int, dict_size: int, recompress: bool) -> None:
+    cache = PageCache(filename, codec=ZSTD_DICT)
+    try:
+        dictionary_id = await cache.train_dictionary(samples=samples, dict_size=dict_size)
+        logger.info(f"trained dictionary {dictionary_id} on up to {samples} pages")
+        if recompress:
+            count = await cache.recompress()
+            logger.info(f"recompressed {count} pages with {cache.write_codec.name}")
+    finally:
+        await cache.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary on the anidb page cache")
+    parser.add_argument("--filename", default=None, help="cache file, anidb.sqlite3 in resources_dir by default")
+    parser.add_argument("--samples", type=int, default=2000, help="number of pages to train on")
+    parser.add_argument("--dict-size", type=int, default=112640, help="dictionary size in bytes")
+    parser.add_argument("--recompress", action="store_true", help="rewrite all pages with the new dictionary")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(train(args.filename or cache_filename(), args.samples, args.dict_size, args.recompress))
+
+
+if __name__ == "__main__":
+    main()
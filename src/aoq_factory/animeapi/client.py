@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+from aoq_factory.config import get_settings
+
+
+class HTTPClient:
+    """Shared aiohttp sessions on top of a single pooled keep-alive connector"""
+
+    def __init__(self) -> None:
+        self._connector: Optional[TCPConnector] = None
+        self._sessions: dict[str, ClientSession] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _create_connector(self) -> TCPConnector:
+        settings = get_settings()
+        return TCPConnector(
+            limit=settings.http_limit,
+            limit_per_host=settings.http_limit_per_host,
+            keepalive_timeout=settings.http_keepalive_timeout,
+            ttl_dns_cache=settings.http_dns_cache_ttl,
+        )
+
+    def session(self, name: str = "default", **session_kwargs: Any) -> ClientSession:
+        """Get session by name, creating it with session_kwargs on first use"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # sessions can't outlive the event loop they were created in
+            self._connector = None
+            self._sessions = {}
+            self._loop = loop
+
+        if self._connector is None or self._connector.closed:
+            self._connector = self._create_connector()
+            self._sessions = {}
+
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            settings = get_settings()
+            session_kwargs.setdefault(
+                "timeout", ClientTimeout(total=settings.http_timeout, connect=settings.http_connect_timeout)
+            )
+            session = ClientSession(connector=self._connector, connector_owner=False, **session_kwargs)
+            self._sessions[name] = session
+        return session
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            await session.close()
+        if self._connector is not None:
+            await self._connector.close()
+        self._connector = None
+        self._sessions = {}
+        self._loop = None
+
+
+client = HTTPClient()
@@ -0,0 +1,67 @@
+import zlib
+from typing import Protocol
+
+ZLIB = "zlib"
+ZSTD = "zstd"
+ZSTD_DICT = "zstd-dict"
+
+
+class Codec(Protocol):
+    name: str
+
+    def compress(self, data: bytes) -> bytes: ...
+
+    def decompress(self, data: bytes) -> bytes: ...
+
+
+class ZlibCodec:
+    name: str = ZLIB
+
+    def __init__(self, level: int = -1) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCodec:
+    name: str = ZSTD
+
+    def __init__(self, level: int = 3) -> None:
+        import zstandard
+
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.decompressor.decompress(data)
+
+
+class ZstdDictCodec:
+    """Zstandard with a trained dictionary, tagged by dictionary id so old rows stay readable after retraining"""
+
+    def __init__(self, dictionary_id: int, dictionary: bytes, level: int = 3) -> None:
+        import zstandard
+
+        self.name = f"{ZSTD_DICT}:{dictionary_id}"
+        dict_data = zstandard.ZstdCompressionDict(dictionary)
+        self.compressor = zstandard.ZstdCompressor(level=level, dict_data=dict_data)
+        self.decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.decompressor.decompress(data)
+
+
+def train_dictionary(samples: list[bytes], dict_size: int = 112640) -> bytes:
+    import zstandard
+
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
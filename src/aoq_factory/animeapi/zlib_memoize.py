@@ -1,18 +1,16 @@
-import zlib
-from datetime import datetime
+import asyncio
+from datetime import UTC, datetime
 from functools import wraps
-from typing import Awaitable, Callable, Optional
-
-from sqlalchemy import LargeBinary, func, null, select
-from sqlalchemy.ext.asyncio import (
-    AsyncAttrs,
-    AsyncEngine,
-    AsyncSession,
-    async_sessionmaker,
-    create_async_engine,
-)
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from cachetools import LRUCache, TTLCache
+from sqlalchemy import Connection, Index, LargeBinary, bindparam, delete, event, func, inspect, select, text, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncEngine, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from .codecs import ZLIB, ZSTD, ZSTD_DICT, Codec, ZlibCodec, ZstdCodec, ZstdDictCodec, train_dictionary
+
 
 class Base(AsyncAttrs, DeclarativeBase):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -23,38 +21,351 @@ class Base(AsyncAttrs, DeclarativeBase):
 class Item(Base):
     __tablename__ = "page"
 
-    key: Mapped[str] = mapped_column(nullable=False)
+    key: Mapped[str] = mapped_column(nullable=False, unique=True, index=True)
     value: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    # NULL for rows written before codecs were tagged, which are all zlib
+    codec: Mapped[Optional[str]] = mapped_column(nullable=True)
+    # last read or write, least recently used rows are evicted first
+    used_at: Mapped[datetime] = mapped_column(default=lambda: _now())
+
+    __table_args__ = (
+        Index("ix_page_created_at", "created_at"),
+        Index("ix_page_used_at_id", "used_at", "id"),
+    )
+
+
+class Dictionary(Base):
+    __tablename__ = "dictionary"
+
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+_missing = object()
+
+
+def _now() -> datetime:
+    # naive UTC with microseconds, CURRENT_TIMESTAMP of sqlite has whole seconds only
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
 
 
-def zlib_memoize(filename: str, key_creator: Callable[..., str], encoding: str = "utf-8") -> Callable:
-    """Cache with unbounded storage and zlib compression"""
+class PageCache:
+    """Two-tier cache: in-memory LRU in front of compressed pages in SQLite"""
+
+    def __init__(
+        self,
+        filename: str,
+        encoding: str = "utf-8",
+        memory_maxsize: int = 128,
+        ttl: Optional[float] = None,
+        max_items: Optional[int] = None,
+        codec: str = ZLIB,
+        evict_every: int = 64,
+    ) -> None:
+        if codec not in (ZLIB, ZSTD, ZSTD_DICT):
+            raise ValueError(f"unknown codec {codec}")
+        self.filename = filename
+        self.encoding = encoding
+        self.ttl = ttl
+        self.max_items = max_items
+        self.codec = codec
+        self.memory: LRUCache = (
+            TTLCache(maxsize=memory_maxsize, ttl=ttl) if ttl is not None else LRUCache(maxsize=memory_maxsize)
+        )
+        self.codecs: dict[str, Codec] = {ZLIB: ZlibCodec()}
+        self.write_codec: Codec = self.codecs[ZLIB]
+        self._engine: Optional[AsyncEngine] = None
+        self._init_lock = asyncio.Lock()
+        # eviction runs every evict_every writes, starting with the first one
+        self.evict_every = evict_every
+        self._writes = evict_every - 1
+        # reads since the last eviction, written to used_at before evicting
+        self._used: dict[str, datetime] = {}
+
+    async def engine(self) -> AsyncEngine:
+        if self._engine is not None:
+            return self._engine
+        async with self._init_lock:
+            if self._engine is None:
+                engine = create_async_engine(f"sqlite+aiosqlite:///{self.filename}")
+                event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+                async with engine.begin() as conn:
+                    await conn.run_sync(self._create_schema)
+                    await conn.run_sync(self._load_dictionaries)
+                self._engine = engine
+        return self._engine
+
+    @staticmethod
+    def _create_schema(conn: Connection) -> None:
+        Base.metadata.create_all(conn)
+        columns = {column["name"] for column in inspect(conn).get_columns(Item.__tablename__)}
+        if "codec" not in columns:
+            conn.execute(text(f"ALTER TABLE {Item.__tablename__} ADD COLUMN codec VARCHAR"))
+        if "used_at" not in columns:
+            conn.execute(text(f"ALTER TABLE {Item.__tablename__} ADD COLUMN used_at DATETIME"))
+            conn.execute(update(Item).values(used_at=Item.created_at))
+        # files created before the unique index existed may hold duplicate keys
+        duplicates = select(func.max(Item.id)).group_by(Item.key)
+        conn.execute(delete(Item).where(Item.id.not_in(duplicates)))
+        for index in Item.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+    def _load_dictionaries(self, conn: Connection) -> None:
+        latest: Optional[Codec] = None
+        for dictionary_id, data in conn.execute(select(Dictionary.id, Dictionary.data).order_by(Dictionary.id)):
+            latest = self.codecs.get(f"{ZSTD_DICT}:{dictionary_id}") or ZstdDictCodec(dictionary_id, data)
+            self.codecs[latest.name] = latest
+
+        if self.codec == ZSTD_DICT and latest is not None:
+            self.write_codec = latest
+        elif self.codec in (ZSTD, ZSTD_DICT):
+            self.write_codec = self.codecs.setdefault(ZSTD, ZstdCodec())
+
+    async def _get_codec(self, name: Optional[str]) -> Codec:
+        name = name or ZLIB
+        if name not in self.codecs:
+            if name == ZSTD:
+                self.codecs[name] = ZstdCodec()
+            else:
+                # dictionary trained by another process after this one loaded
+                async with (await self.engine()).connect() as conn:
+                    await conn.run_sync(self._load_dictionaries)
+        return self.codecs[name]
+
+    def _is_fresh_clause(self) -> Any:
+        return Item.created_at >= func.datetime("now", f"-{self.ttl} seconds")
+
+    def _compress(self, value: Optional[str]) -> Optional[bytes]:
+        return self.write_codec.compress(value.encode(encoding=self.encoding)) if value is not None else None
+
+    async def _decompress(self, value: Optional[bytes], codec: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        return (await self._get_codec(codec)).decompress(value).decode(encoding=self.encoding)
+
+    async def get(self, key: str) -> Any:
+        """Return cached value or `_missing`"""
+        value = self.memory.get(key, _missing)
+        if value is not _missing:
+            self._touch(key)
+            return value
+
+        stmt = select(Item.value, Item.codec).where(Item.key == key)
+        if self.ttl is not None:
+            stmt = stmt.where(self._is_fresh_clause())
+        async with (await self.engine()).connect() as conn:
+            row = (await conn.execute(stmt)).first()
+        if row is None:
+            return _missing
+
+        value = await self._decompress(row.value, row.codec)
+        self.memory[key] = value
+        self._touch(key)
+        return value
+
+    async def get_many(self, keys: Iterable[str]) -> dict[str, Optional[str]]:
+        """Return cached values for the keys that are present, with a single query for the SQLite tier"""
+        found = {}
+        remaining = []
+        for key in keys:
+            value = self.memory.get(key, _missing)
+            if value is not _missing:
+                found[key] = value
+                self._touch(key)
+            else:
+                remaining.append(key)
+        if not remaining:
+            return found
+
+        stmt = select(Item.key, Item.value, Item.codec).where(Item.key.in_(remaining))
+        if self.ttl is not None:
+            stmt = stmt.where(self._is_fresh_clause())
+        async with (await self.engine()).connect() as conn:
+            rows = (await conn.execute(stmt)).all()
+        for row in rows:
+            value = await self._decompress(row.value, row.codec)
+            self.memory[row.key] = value
+            found[row.key] = value
+            self._touch(row.key)
+        return found
+
+    def _touch(self, key: str) -> None:
+        if self.max_items is not None:
+            self._used[key] = _now()
+
+    async def set(self, key: str, value: Optional[str]) -> None:
+        await self.set_many({key: value})
+
+    async def set_many(self, items: dict[str, Optional[str]]) -> None:
+        """Store all items in a single transaction"""
+        if not items:
+            return
+        engine = await self.engine()
+        stmt = insert(Item)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Item.key],
+            set_={
+                "value": stmt.excluded.value,
+                "codec": stmt.excluded.codec,
+                "created_at": func.now(),
+                "updated_at": func.now(),
+                "used_at": stmt.excluded.used_at,
+            },
+        )
+        now = _now()
+        params = [
+            {"key": key, "value": self._compress(value), "codec": self.write_codec.name, "used_at": now}
+            for key, value in items.items()
+        ]
+        for key in items:
+            self._used.pop(key, None)
+        self._writes += 1
+        async with engine.begin() as conn:
+            await conn.execute(stmt, params)
+            if self._writes >= self.evict_every:
+                self._writes = 0
+                await self._evict(conn)
+        self.memory.update(items)
+
+    async def _evict(self, conn: Any) -> None:
+        """Delete expired rows and the least recently used rows over max_items, both found through indexes"""
+        if self.ttl is not None:
+            await conn.execute(delete(Item).where(~self._is_fresh_clause()))
+        if self.max_items is None:
+            return
+        if self._used:
+            used = [{"b_key": key, "b_used_at": used_at} for key, used_at in self._used.items()]
+            self._used = {}
+            await conn.execute(
+                update(Item).where(Item.key == bindparam("b_key")).values(used_at=bindparam("b_used_at")), used
+            )
+        excess = await conn.scalar(select(func.count()).select_from(Item)) - self.max_items
+        if excess > 0:
+            least_used = select(Item.id).order_by(Item.used_at, Item.id).limit(excess)
+            await conn.execute(delete(Item).where(Item.id.in_(least_used)))
+
+    async def train_dictionary(self, samples: int = 2000, dict_size: int = 112640) -> int:
+        """Train a zstd dictionary on a random sample of stored pages, returns its id"""
+        engine = await self.engine()
+        async with engine.connect() as conn:
+            stmt = select(Item.value, Item.codec).where(Item.value.is_not(None)).order_by(func.random()).limit(samples)
+            rows = (await conn.execute(stmt)).all()
+        data = [(await self._get_codec(row.codec)).decompress(row.value) for row in rows]
+        dictionary = train_dictionary(data, dict_size=dict_size)
+
+        async with engine.begin() as conn:
+            dictionary_id = await conn.scalar(insert(Dictionary).values(data=dictionary).returning(Dictionary.id))
+            await conn.run_sync(self._load_dictionaries)
+        return dictionary_id
+
+    async def recompress(self, batch_size: int = 500) -> int:
+        """Rewrite rows not stored with the current write codec, returns number of rewritten rows"""
+        engine = await self.engine()
+        count = 0
+        last_id = 0
+        while True:
+            async with engine.begin() as conn:
+                stmt = select(Item.id, Item.value, Item.codec).where(Item.id > last_id).order_by(Item.id)
+                rows = (await conn.execute(stmt.limit(batch_size))).all()
+                if not rows:
+                    break
+                params = []
+                for row in rows:
+                    if row.value is not None and (row.codec or ZLIB) != self.write_codec.name:
+                        data = (await self._get_codec(row.codec)).decompress(row.value)
+                        params.append({"b_id": row.id, "b_value": self.write_codec.compress(data)})
+                if params:
+                    stmt = (
+                        update(Item)
+                        .where(Item.id == bindparam("b_id"))
+                        .values(value=bindparam("b_value"), codec=self.write_codec.name)
+                    )
+                    await conn.execute(stmt, params)
+                count += len(params)
+                last_id = rows[-1].id
+
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM"))
+        return count
+
+    async def close(self) -> None:
+        self.memory.clear()
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+
+def zlib_memoize(
+    filename: str,
+    key_creator: Callable[..., str],
+    encoding: str = "utf-8",
+    memory_maxsize: int = 128,
+    ttl: Optional[float] = None,
+    max_items: Optional[int] = None,
+    codec: str = ZLIB,
+    evict_every: int = 64,
+) -> Callable:
+    """Cache with in-memory LRU tier and compressed SQLite storage, optionally bounded by ttl and max_items"""
 
     def wrapper(user_function: Callable[..., Awaitable[Optional[str]]]) -> Callable[..., Awaitable[Optional[str]]]:
-        engine: Optional[AsyncEngine] = None
-        async_session: Optional[async_sessionmaker[AsyncSession]] = None
+        cache = PageCache(
+            filename,
+            encoding=encoding,
+            memory_maxsize=memory_maxsize,
+            ttl=ttl,
+            max_items=max_items,
+            codec=codec,
+            evict_every=evict_every,
+        )
 
         @wraps(user_function)
         async def wrapped(*args, **kwargs) -> Optional[str]:
-            nonlocal engine, async_session
-            if engine is None:
-                engine = create_async_engine(f"sqlite+aiosqlite:///{filename}")
-                async_session = async_sessionmaker(engine, class_=AsyncSession)
-                async with engine.begin() as conn:
-                    await conn.run_sync(Base.metadata.create_all)
-
             key = key_creator(*args, **kwargs)
-            async with async_session() as session:  # type: ignore
-                item = await session.scalar(select(Item).where(Item.key == key))
-                if item is not None:
-                    return zlib.decompress(item.value).decode(encoding=encoding) if item.value is not None else None
+            value = await cache.get(key)
+            if value is not _missing:
+                return value
             value = await user_function(*args, **kwargs)
-            async with async_session() as session:  # type: ignore
-                c_value = zlib.compress(value.encode(encoding=encoding)) if value is not None else null()
-                session.add(Item(key=key, value=c_value))
-                await session.commit()
+            await cache.set(key, value)
             return value
 
+        async def get_many(keys: Iterable[Any]) -> list[Optional[str]]:
+            """Call user_function for every single argument in keys, fetching only cache misses"""
+            keys = list(keys)
+            cache_keys = [key_creator(key) for key in keys]
+            found = await cache.get_many(cache_keys)
+
+            misses = {cache_key: key for cache_key, key in zip(cache_keys, keys, strict=True) if cache_key not in found}
+            results = await asyncio.gather(*(user_function(key) for key in misses.values()), return_exceptions=True)
+            fetched = {
+                cache_key: result
+                for cache_key, result in zip(misses, results, strict=True)
+                if not isinstance(result, BaseException)
+            }
+            await cache.set_many(fetched)
+
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            found.update(fetched)
+            return [found[cache_key] for cache_key in cache_keys]
+
+        async def prefetch(keys: Iterable[Any]) -> dict[Any, Optional[str]]:
+            """Cached values for every single argument in keys found with one query, misses are left out"""
+            cache_keys = {key_creator(key): key for key in keys}
+            # returned rather than left in the in-memory tier, which may be smaller than the batch
+            found = await cache.get_many(cache_keys)
+            return {cache_keys[cache_key]: value for cache_key, value in found.items()}
+
+        wrapped.cache = cache
+        wrapped.get_many = get_many
+        wrapped.prefetch = prefetch
         return wrapped
 
     return wrapper
@@ -1,8 +1,58 @@
-from fastapi import FastAPI
+import asyncio
+import contextlib
+import math
+import time
+from contextlib import asynccontextmanager
 
+from fastapi import FastAPI, Request
+
+from aoq_factory.animeapi.client import client
+from aoq_factory.config import get_settings
+from aoq_factory.database.connection import PoolStats, engines, get_engine
+
+from .cache import ResponseCache, cache_middleware
+from .deps.engine import PRIMARY_COOKIE, READ_METHODS
 from .routes import routers
 
-app = FastAPI()
+response_cache = ResponseCache()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    response_cache.resize(settings.api_cache_size, settings.api_cache_ttl)
+    # invalidations come from the primary, replicas don't relay NOTIFY
+    listener = asyncio.create_task(response_cache.listen(get_engine()))
+    yield
+    listener.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await listener
+    await client.close()
+    for engine in engines:
+        await engine.engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(cache_middleware(response_cache))
+
+
+@app.middleware("http")
+async def pin_to_primary_after_write(request: Request, call_next):
+    """Let the client read its own writes while the replica catches up"""
+    response = await call_next(request)
+    settings = get_settings()
+    pin_seconds = settings.db_replica_pin_seconds
+    if (
+        settings.db_replica_host is not None
+        and request.method not in READ_METHODS
+        and response.status_code < 400
+        and pin_seconds > 0
+    ):
+        response.set_cookie(
+            PRIMARY_COOKIE, str(time.time() + pin_seconds), max_age=math.ceil(pin_seconds), httponly=True
+        )
+    return response
+
 
 for router in routers:
     app.include_router(router, prefix="/api")
@@ -11,3 +61,8 @@ for router in routers:
 @app.get("/")
 def healthcheck() -> str:
     return "Hello, World!"
+
+
+@app.get("/metrics/pools")
+def pool_metrics() -> list[PoolStats]:
+    return [stats for engine in engines if (stats := engine.pool_stats()) is not None]
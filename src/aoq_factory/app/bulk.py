@@ -0,0 +1,129 @@
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+from fastapi import Body, HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from aoq_factory.database.models import BaseWithID
+
+T = TypeVar("T", bound=BaseModel)
+
+MAX_BULK_ITEMS = 1000
+
+BulkBody = Body(min_length=1, max_length=MAX_BULK_ITEMS)
+
+# constraint name -> status code and detail, the same the single-item routes report
+IntegrityErrors = dict[str, tuple[int, str]]
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: int
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+def integrity_error_detail(error: IntegrityError, errors: IntegrityErrors) -> tuple[int, str]:
+    """Map a constraint violation to status code and detail, unknown violations are reraised"""
+    error_str = str(error.orig).lower()
+    for constraint, status_detail in errors.items():
+        if constraint in error_str:
+            return status_detail
+    raise error
+
+
+async def existing_ids(session: AsyncSession, column: InstrumentedAttribute, ids: Sequence[int]) -> set[int]:
+    return set(await session.scalars(select(column).where(column.in_(set(ids)))))
+
+
+async def bulk_create(
+    session: AsyncSession,
+    model: type[BaseWithID],
+    items: Sequence[T],
+    parent: InstrumentedAttribute,
+    parent_id: Callable[[T], int],
+    parent_not_found: str,
+    values: Callable[[T], dict[str, Any]],
+    errors: IntegrityErrors,
+) -> list[BulkItemResult]:
+    """Insert all valid items with one statement, items with a missing parent or invalid values are reported
+
+    values raises HTTPException for invalid items
+    """
+    results: list[Optional[BulkItemResult]] = [None] * len(items)
+    parents = await existing_ids(session, parent, [parent_id(item) for item in items])
+    rows: dict[int, dict[str, Any]] = {}
+    for index, item in enumerate(items):
+        if parent_id(item) not in parents:
+            results[index] = BulkItemResult(index=index, status=status.HTTP_404_NOT_FOUND, detail=parent_not_found)
+            continue
+        try:
+            rows[index] = values(item)
+        except HTTPException as e:
+            results[index] = BulkItemResult(index=index, status=e.status_code, detail=e.detail)
+
+    if rows:
+        try:
+            ids = await session.scalars(
+                insert(model).returning(model.id, sort_by_parameter_order=True), list(rows.values())
+            )
+        except IntegrityError as e:
+            # parent deleted after the existence check
+            status_code, detail = integrity_error_detail(e, errors)
+            raise HTTPException(status_code=status_code, detail=detail) from e
+        for index, id_ in zip(rows, ids, strict=True):
+            results[index] = BulkItemResult(index=index, status=status.HTTP_201_CREATED, id=id_)
+    return results
+
+
+async def bulk_update(
+    session: AsyncSession,
+    model: type[BaseWithID],
+    items: Sequence[T],
+    apply: Callable[[Any, T], None],
+    errors: IntegrityErrors,
+    not_found: str,
+) -> list[BulkItemResult]:
+    """Apply every item to its row in a savepoint of its own, so one bad item doesn't roll back the batch
+
+    Items must have an `id` field, apply raises HTTPException for invalid values before touching the row
+    """
+    ids = {item.id for item in items}
+    rows = {row.id: row for row in await session.scalars(select(model).where(model.id.in_(ids)))}
+    results = []
+    for index, item in enumerate(items):
+        row = rows.get(item.id)
+        if row is None:
+            results.append(BulkItemResult(index=index, status=status.HTTP_404_NOT_FOUND, id=item.id, detail=not_found))
+            continue
+        try:
+            async with session.begin_nested():
+                apply(row, item)
+        except HTTPException as e:
+            results.append(BulkItemResult(index=index, status=e.status_code, id=item.id, detail=e.detail))
+        except IntegrityError as e:
+            status_code, detail = integrity_error_detail(e, errors)
+            results.append(BulkItemResult(index=index, status=status_code, id=item.id, detail=detail))
+        else:
+            results.append(BulkItemResult(index=index, status=status.HTTP_200_OK, id=item.id))
+    return results
+
+
+async def bulk_delete(
+    session: AsyncSession, model: type[BaseWithID], ids: Sequence[int], not_found: str
+) -> list[BulkItemResult]:
+    """Delete through the ORM so relationship cascades apply like in the single-item routes"""
+    rows = {row.id: row for row in await session.scalars(select(model).where(model.id.in_(set(ids))))}
+    results = []
+    for index, id_ in enumerate(ids):
+        row = rows.pop(id_, None)
+        if row is None:
+            results.append(BulkItemResult(index=index, status=status.HTTP_404_NOT_FOUND, id=id_, detail=not_found))
+            continue
+        await session.delete(row)
+        results.append(BulkItemResult(index=index, status=status.HTTP_200_OK, id=id_))
+    return results
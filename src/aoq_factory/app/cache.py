@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from cachetools import TTLCache
+from fastapi import Request, Response, status
+
+from aoq_factory.config import get_settings
+from aoq_factory.database.connection import Engine
+
+from .deps.engine import READ_METHODS, routed_to_replica
+
+logger = logging.getLogger(__name__)
+
+ENTITY_CHANGED_CHANNEL = "entity_changed"
+
+# tables whose rows are removed or changed together with a row of the key table
+TABLE_DEPENDENTS = {
+    "animes": ("animes", "anime_infos", "id_mappings", "songs", "sources", "timings", "levels"),
+    "anime_infos": ("anime_infos",),
+    "id_mappings": ("id_mappings",),
+    "songs": ("songs", "sources", "timings", "levels"),
+    "sources": ("sources", "timings"),
+    "timings": ("timings",),
+    "levels": ("levels",),
+}
+
+# cacheable GET paths and the tables their responses are built from
+CACHED_ROUTES = [
+    (re.compile(r"/api/animes/\d+/detail"), TABLE_DEPENDENTS["animes"]),
+    (re.compile(r"/api/animes(/[^/]+)?"), ("animes",)),
+    (re.compile(r"/api/songs(/\d+)?"), ("songs",)),
+    (re.compile(r"/api/sources(/\d+)?"), ("sources",)),
+    (re.compile(r"/api/timings(/\d+)?"), ("timings",)),
+    (re.compile(r"/api/levels(/\d+)?"), ("levels",)),
+]
+
+WRITE_PATH = re.compile(r"/api/(animes|songs|sources|timings|levels)(/.*)?")
+
+
+@dataclass
+class CachedResponse:
+    versions: tuple[int, ...]
+    body: bytes
+    headers: dict[str, str]
+    etag: str
+
+
+class ResponseCache:
+    """In-process TTL/LRU cache of GET responses, invalidated by per-table version counters
+
+    Counters are bumped by writes through this process and by NOTIFY on entity_changed, so
+    worker writes and other API processes invalidate it too. Responses are only served from
+    cache while the listener is connected, TTL bounds how stale a missed notification can make them.
+    Replica reads of a table changed less than the replica lag ago aren't cached, they may predate the change.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300) -> None:
+        self._entries: TTLCache[str, CachedResponse] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: defaultdict[str, int] = defaultdict(int)
+        self._changed_at: dict[str, float] = {}
+        self.listening = False
+
+    def versions(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        return tuple(self._versions[table] for table in tables)
+
+    def bump(self, table: str) -> None:
+        now = time.monotonic()
+        for dependent in TABLE_DEPENDENTS.get(table, (table,)):
+            self._versions[dependent] += 1
+            self._changed_at[dependent] = now
+
+    def changed_within(self, tables: tuple[str, ...], seconds: float) -> bool:
+        since = time.monotonic() - seconds
+        return any(self._changed_at.get(table, -math.inf) > since for table in tables)
+
+    def get(self, key: str, tables: tuple[str, ...]) -> Optional[CachedResponse]:
+        if not self.listening:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry.versions != self.versions(tables):
+            return None
+        return entry
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        if self.listening:
+            self._entries[key] = entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def resize(self, maxsize: int, ttl: float) -> None:
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        self.bump(payload)
+
+    async def listen(self, engine: Engine, check_interval: float = 5, reconnect_interval: float = 10) -> None:
+        """Keep a LISTEN connection open until cancelled, reconnecting when it drops"""
+        while True:
+            try:
+                async with engine.engine.connect() as conn:
+                    driver_conn = (await conn.get_raw_connection()).driver_connection
+                    await driver_conn.add_listener(ENTITY_CHANGED_CHANNEL, self._on_notify)
+                    # changes made while not listening went unnoticed
+                    self.clear()
+                    self.listening = True
+                    logger.info(f"listening on {ENTITY_CHANGED_CHANNEL}")
+                    while not driver_conn.is_closed():
+                        await asyncio.sleep(check_interval)
+                    logger.warning(f"{ENTITY_CHANGED_CHANNEL} listener connection lost, reconnecting")
+                    await conn.invalidate()
+            except Exception as e:
+                logger.warning(f"can't listen on {ENTITY_CHANGED_CHANNEL}, response cache disabled: {e}")
+            finally:
+                self.listening = False
+            await asyncio.sleep(reconnect_interval)
+
+
+def _cached_tables(path: str) -> Optional[tuple[str, ...]]:
+    for pattern, tables in CACHED_ROUTES:
+        if pattern.fullmatch(path):
+            return tables
+    return None
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    return if_none_match is not None and etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def cache_middleware(cache: ResponseCache) -> Callable[[Request, Callable], Awaitable[Response]]:
+    async def middleware(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+        path = request.url.path
+        if request.method not in READ_METHODS:
+            response = await call_next(request)
+            if response.status_code < 400 and (match := WRITE_PATH.fullmatch(path)) is not None:
+                cache.bump(match.group(1))
+            return response
+
+        tables = _cached_tables(path) if request.method == "GET" else None
+        if tables is None:
+            return await call_next(request)
+
+        key = f"{path}?{request.url.query}"
+        entry = cache.get(key, tables)
+        if entry is not None:
+            if _etag_matches(request, entry.etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": entry.etag})
+            return Response(content=entry.body, headers=entry.headers)
+
+        # versions before the read, a write racing with it leaves the entry already stale
+        versions = cache.versions(tables)
+        response = await call_next(request)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = dict(response.headers)
+        etag = headers.get("etag") or f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        headers["etag"] = etag
+        headers["cache-control"] = "private, no-cache"
+        # a lagging replica may have answered with rows from before the change
+        if not (routed_to_replica(request) and cache.changed_within(tables, get_settings().db_replica_pin_seconds)):
+            cache.put(key, CachedResponse(versions, body, headers, etag))
+        if _etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response(content=body, status_code=response.status_code, headers=headers)
+
+    return middleware
@@ -1,7 +1,39 @@
+import time
 from typing import Annotated
 
-from fastapi import Depends
+from fastapi import Depends, Request
 
-from aoq_factory.database.connection import Engine, get_engine
+from aoq_factory.config import get_settings
+from aoq_factory.database.connection import Engine, EngineRole, get_engine
 
-EngineDep = Annotated[Engine, Depends(lambda: get_engine())]
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# set after a successful write, reads go to the primary until the timestamp it holds
+PRIMARY_COOKIE = "aoq_read_primary_until"
+# any value sends the request to the primary
+PRIMARY_HEADER = "X-Read-Primary"
+
+
+def pinned_to_primary(request: Request) -> bool:
+    if request.headers.get(PRIMARY_HEADER) is not None:
+        return True
+    try:
+        return time.time() < float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        return False
+
+
+def routed_to_replica(request: Request) -> bool:
+    return (
+        request.method in READ_METHODS and not pinned_to_primary(request) and get_settings().db_replica_host is not None
+    )
+
+
+def request_engine(request: Request) -> Engine:
+    """Read replica for reads, primary for writes and for reads pinned to it"""
+    if routed_to_replica(request):
+        return get_engine(EngineRole.REPLICA)
+    return get_engine()
+
+
+EngineDep = Annotated[Engine, Depends(request_engine)]
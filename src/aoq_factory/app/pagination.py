@@ -0,0 +1,92 @@
+import base64
+import enum
+import json
+from datetime import datetime
+from typing import Annotated, Any, Generic, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+from sqlalchemy import Row, Select, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+T = TypeVar("T")
+
+LimitQuery = Annotated[int, Query(ge=1, le=500)]
+
+
+class ListOrder(enum.Enum):
+    ID = "id"
+    ID_DESC = "-id"
+    CREATED = "created"
+    CREATED_DESC = "-created"
+    UPDATED = "updated"
+    UPDATED_DESC = "-updated"
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next: Optional[str] = None
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.name
+    return value
+
+
+def _load_value(value: Any, column: InstrumentedAttribute) -> Any:
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if issubclass(python_type, enum.Enum):
+        return python_type[value]
+    if not isinstance(value, python_type):
+        raise TypeError(f"expected {python_type.__name__}, got {type(value).__name__}")
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    data = json.dumps([_dump_value(value) for value in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[InstrumentedAttribute]) -> list[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor doesn't match ordering")
+        return [_load_value(value, column) for value, column in zip(values, columns, strict=True)]
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+
+
+async def paginate(
+    session: AsyncSession,
+    stmt: Select,
+    order_by: Sequence[InstrumentedAttribute],
+    limit: int,
+    after: Optional[str],
+    descending: bool = False,
+) -> tuple[list[Row], Optional[str]]:
+    """Fetch one page of stmt with keyset pagination, order_by must end with a unique column
+
+    Returns rows and the cursor of the next page, None on the last page
+    """
+    key = tuple_(*order_by)
+    if after is not None:
+        values = decode_cursor(after, order_by)
+        values = tuple_(*(literal(value, column.type) for value, column in zip(values, order_by, strict=True)))
+        stmt = stmt.where(key < values if descending else key > values)
+    stmt = (
+        stmt.add_columns(*order_by)
+        .order_by(*(column.desc() if descending else column.asc() for column in order_by))
+        .limit(limit + 1)
+    )
+    rows = list((await session.execute(stmt)).all())
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][-len(order_by) :])
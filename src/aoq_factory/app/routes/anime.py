@@ -1,74 +1,230 @@
-from typing import Optional
+import enum
+import hashlib
+from typing import Annotated, Any, Optional
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Query, Response, status
 from pydantic import BaseModel
-from sqlalchemy import select
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
 
 from aoq_factory.app.deps.engine import EngineDep
-from aoq_factory.database.models import Anime, AnimeStatus
+from aoq_factory.app.pagination import LimitQuery, Page, paginate
+from aoq_factory.database.models import Anime, AnimeInfo, AnimeStatus, IDMapping, Level, Song, Source, Timing
+
+from .level import LevelResponse
+from .song import SongResponse
+from .source import SourceResponse
+from .timing import TimingResponse
 
 router = APIRouter(prefix="/animes")
 
 
 class CreateAnimeRequest(BaseModel):
-    mal_id: int
     title_ro: str
-    poster_url: str
-    release_year: int
     status: Optional[str] = None
 
 
 class AnimeResponse(BaseModel):
-    mal_id: int
+    id: int
     title_ro: str
-    poster_url: str
-    release_year: int
     status: str
 
 
 class UpdateAnimeRequest(BaseModel):
     title_ro: Optional[str] = None
-    poster_url: Optional[str] = None
-    release_year: Optional[int] = None
     status: Optional[str] = None
 
 
+class AnimeInfoResponse(BaseModel):
+    id: int
+    source: str
+    data: dict[str, Any]
+
+
+class IDMappingResponse(BaseModel):
+    platform: str
+    value: int
+
+
+class SourceDetailResponse(SourceResponse):
+    timings: list[TimingResponse]
+
+
+class SongDetailResponse(SongResponse):
+    sources: list[SourceDetailResponse]
+    levels: list[LevelResponse]
+
+
+class AnimeDetailResponse(BaseModel):
+    id: int
+    title_ro: str
+    status: str
+    infos: list[AnimeInfoResponse]
+    ids: list[IDMappingResponse]
+    songs: list[SongDetailResponse]
+
+
+class AnimeOrder(enum.Enum):
+    TITLE = "title"
+    TITLE_DESC = "-title"
+    CREATED = "created"
+    CREATED_DESC = "-created"
+    UPDATED = "updated"
+    UPDATED_DESC = "-updated"
+
+
 @router.get("", tags=["anime"])
-async def get_all(engine: EngineDep) -> list[AnimeResponse]:
+async def get_all(
+    engine: EngineDep,
+    limit: LimitQuery = 50,
+    after: Optional[str] = None,
+    status_filter: Annotated[Optional[str], Query(alias="status")] = None,
+    q: Optional[str] = None,
+    order: AnimeOrder = AnimeOrder.TITLE,
+) -> Page[AnimeResponse]:
+    stmt = select(Anime.id, Anime.title_ro, Anime.status)
+    if status_filter is not None:
+        if status_filter not in AnimeStatus.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+        stmt = stmt.where(Anime.status == AnimeStatus[status_filter])
+    if q:
+        stmt = stmt.where(Anime.title_ro.icontains(q, autoescape=True))
+
+    order_by = {
+        "title": [Anime.title_ro, Anime.id],
+        "created": [Anime.created_at, Anime.id],
+        "updated": [Anime.updated_at, Anime.id],
+    }[order.value.removeprefix("-")]
     async with engine.async_session() as session:
-        animes: list[Anime] = (await session.scalars(select(Anime))).all()
-        session.expunge_all()
-    return [
-        AnimeResponse(
-            mal_id=anime.mal_id,
+        rows, next_cursor = await paginate(
+            session,
+            stmt,
+            order_by=order_by,
+            limit=limit,
+            after=after,
+            descending=order.value.startswith("-"),
+        )
+    return Page(
+        items=[AnimeResponse(id=row.id, title_ro=row.title_ro, status=row.status.name) for row in rows],
+        next=next_cursor,
+    )
+
+
+def _detail_version_stmt(anime_id: int):
+    """Count and latest update of every table in the anime tree, changes on any insert, update or delete"""
+    song_ids = select(Song.id).where(Song.anime_id == anime_id)
+    source_ids = select(Source.id).where(Source.song_id.in_(song_ids))
+    children = [
+        (AnimeInfo, AnimeInfo.anime_id == anime_id),
+        (IDMapping, IDMapping.anime_id == anime_id),
+        (Song, Song.anime_id == anime_id),
+        (Source, Source.song_id.in_(song_ids)),
+        (Timing, Timing.source_id.in_(source_ids)),
+        (Level, Level.song_id.in_(song_ids)),
+    ]
+    return select(
+        Anime.updated_at,
+        *(
+            subquery
+            for model, where in children
+            for subquery in (
+                select(func.count()).select_from(model).where(where).scalar_subquery(),
+                select(func.max(model.updated_at)).where(where).scalar_subquery(),
+            )
+        ),
+    ).where(Anime.id == anime_id)
+
+
+@router.get("/{anime_id}/detail", tags=["anime"])
+async def get_detail(
+    engine: EngineDep,
+    anime_id: int,
+    response: Response,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+) -> AnimeDetailResponse:
+    """Anime with its infos, id mappings and songs with their sources, timings and levels
+
+    Keyed by the id of the anime list and of /animes/{anime_id}, like every other anime route
+    """
+    async with engine.async_session() as session:
+        version = (await session.execute(_detail_version_stmt(anime_id))).one_or_none()
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Anime not found")
+        etag = f'W/"{hashlib.blake2b(repr(tuple(version)).encode(), digest_size=16).hexdigest()}"'
+        if if_none_match is not None and etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        anime: Optional[Anime] = await session.scalar(
+            select(Anime)
+            .where(Anime.id == anime_id)
+            .options(
+                selectinload(Anime.infos),
+                selectinload(Anime.ids),
+                selectinload(Anime.songs).selectinload(Song.sources).selectinload(Source.timings),
+                selectinload(Anime.songs).selectinload(Song.levels),
+            )
+        )
+        if anime is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Anime not found")
+        detail = AnimeDetailResponse(
+            id=anime.id,
             title_ro=anime.title_ro,
-            poster_url=anime.poster_url,
-            release_year=anime.release_year,
             status=anime.status.name,
+            infos=[AnimeInfoResponse(id=info.id, source=info.source, data=info.data) for info in anime.infos],
+            ids=[IDMappingResponse(platform=mapping.platform.name, value=mapping.value) for mapping in anime.ids],
+            songs=[
+                SongDetailResponse(
+                    id=song.id,
+                    anime_id=song.anime_id,
+                    category=song.category.name,
+                    number=song.number,
+                    song_artist=song.song_artist,
+                    song_name=song.song_name,
+                    sources=[
+                        SourceDetailResponse(
+                            id=source.id,
+                            song_id=source.song_id,
+                            location=source.location,
+                            local_path=source.local_path,
+                            added_by=source.added_by,
+                            status=source.status.name,
+                            timings=[
+                                TimingResponse(
+                                    id=timing.id,
+                                    source_id=timing.source_id,
+                                    guess_start=timing.guess_start,
+                                    reveal_start=timing.reveal_start,
+                                    added_by=timing.added_by,
+                                )
+                                for timing in sorted(source.timings, key=lambda timing: timing.id)
+                            ],
+                        )
+                        for source in sorted(song.sources, key=lambda source: source.id)
+                    ],
+                    levels=[
+                        LevelResponse(id=level.id, song_id=level.song_id, value=level.value, added_by=level.added_by)
+                        for level in sorted(song.levels, key=lambda level: level.id)
+                    ],
+                )
+                for song in sorted(anime.songs, key=lambda song: (song.category.value, song.number))
+            ],
         )
-        for anime in animes
-    ]
+    response.headers["ETag"] = etag
+    return detail
 
 
-@router.get("/{mal_id}", tags=["anime"])
-async def get(engine: EngineDep, mal_id: int) -> AnimeResponse:
+@router.get("/{anime_id}", tags=["anime"])
+async def get(engine: EngineDep, anime_id: int) -> AnimeResponse:
     async with engine.async_session() as session:
-        anime: Anime = await session.scalar(select(Anime).where(Anime.mal_id == mal_id))
+        anime: Anime = await session.scalar(select(Anime).where(Anime.id == anime_id))
         if anime is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Anime not found")
         session.expunge(anime)
-    return AnimeResponse(
-        mal_id=anime.mal_id,
-        title_ro=anime.title_ro,
-        poster_url=anime.poster_url,
-        release_year=anime.release_year,
-        status=anime.status.name,
-    )
+    return AnimeResponse(id=anime.id, title_ro=anime.title_ro, status=anime.status.name)
 
 
 @router.post("", tags=["anime"], status_code=status.HTTP_201_CREATED)
-async def create(engine: EngineDep, anime: CreateAnimeRequest) -> None:
+async def create(engine: EngineDep, anime: CreateAnimeRequest) -> AnimeResponse:
     async with engine.async_session() as session:
         status_enum = AnimeStatus.NORMAL
         if anime.status is not None:
@@ -76,40 +232,24 @@ async def create(engine: EngineDep, anime: CreateAnimeRequest) -> None:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
             status_enum = AnimeStatus[anime.status]
 
-        session.add(
-            Anime(
-                mal_id=anime.mal_id,
-                title_ro=anime.title_ro,
-                poster_url=anime.poster_url,
-                release_year=anime.release_year,
-                status=status_enum,
-            )
-        )
-        try:
-            await session.commit()
-        except IntegrityError as e:
-            error_str = str(e.orig).lower()
-            if "pk_animes" in error_str:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=f"Anime with such mal_id(={anime.mal_id}) already exists.",
-                ) from e
-            raise
-
-
-@router.put("/{mal_id}", tags=["anime"])
-async def update(engine: EngineDep, mal_id: int, anime: UpdateAnimeRequest) -> None:
+        db_anime = Anime(title_ro=anime.title_ro, status=status_enum)
+        session.add(db_anime)
+        # ids are generated, the client needs the new one to address the anime
+        await session.flush()
+        created = AnimeResponse(id=db_anime.id, title_ro=db_anime.title_ro, status=db_anime.status.name)
+        await session.commit()
+    return created
+
+
+@router.put("/{anime_id}", tags=["anime"])
+async def update(engine: EngineDep, anime_id: int, anime: UpdateAnimeRequest) -> None:
     async with engine.async_session() as session:
-        db_anime: Anime = await session.scalar(select(Anime).where(Anime.mal_id == mal_id))
+        db_anime: Anime = await session.scalar(select(Anime).where(Anime.id == anime_id))
         if db_anime is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Anime not found")
 
         if anime.title_ro is not None:
             db_anime.title_ro = anime.title_ro
-        if anime.poster_url is not None:
-            db_anime.poster_url = anime.poster_url
-        if anime.release_year is not None:
-            db_anime.release_year = anime.release_year
         if anime.status is not None:
             if anime.status not in AnimeStatus.__members__:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
@@ -118,10 +258,10 @@ async def update(engine: EngineDep, mal_id: int, anime: UpdateAnimeRequest) -> N
         await session.commit()
 
 
-@router.delete("/{mal_id}", tags=["anime"])
-async def delete(engine: EngineDep, mal_id: int) -> None:
+@router.delete("/{anime_id}", tags=["anime"])
+async def delete(engine: EngineDep, anime_id: int) -> None:
     async with engine.async_session() as session:
-        anime: Anime = await session.scalar(select(Anime).where(Anime.mal_id == mal_id))
+        anime: Anime = await session.scalar(select(Anime).where(Anime.id == anime_id))
         if anime is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Anime not found")
         await session.delete(anime)
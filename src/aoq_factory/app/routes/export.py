@@ -0,0 +1,80 @@
+import enum
+from typing import Any, AsyncIterator
+
+import orjson
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row, select
+
+from aoq_factory.app.deps.engine import EngineDep
+from aoq_factory.database.models import Anime, Level, Song, Source, Timing
+
+router = APIRouter(prefix="/export")
+
+YIELD_PER = 1000
+
+
+class ExportTable(enum.Enum):
+    ANIMES = "animes"
+    SONGS = "songs"
+    SOURCES = "sources"
+    TIMINGS = "timings"
+    LEVELS = "levels"
+
+
+COLUMNS = {
+    ExportTable.ANIMES: [Anime.id, Anime.title_ro, Anime.status, Anime.created_at, Anime.updated_at],
+    ExportTable.SONGS: [
+        Song.id,
+        Song.anime_id,
+        Song.category,
+        Song.number,
+        Song.song_artist,
+        Song.song_name,
+        Song.created_at,
+        Song.updated_at,
+    ],
+    ExportTable.SOURCES: [
+        Source.id,
+        Source.song_id,
+        Source.location,
+        Source.local_path,
+        Source.status,
+        Source.added_by,
+        Source.created_at,
+        Source.updated_at,
+    ],
+    ExportTable.TIMINGS: [
+        Timing.id,
+        Timing.source_id,
+        Timing.guess_start,
+        Timing.reveal_start,
+        Timing.added_by,
+        Timing.created_at,
+        Timing.updated_at,
+    ],
+    ExportTable.LEVELS: [Level.id, Level.song_id, Level.value, Level.added_by, Level.created_at, Level.updated_at],
+}
+
+
+def _dump_row(row: Row) -> bytes:
+    # orjson serializes enums by value, API exposes them by name
+    data: dict[str, Any] = {
+        key: value.name if isinstance(value, enum.Enum) else value for key, value in row._mapping.items()
+    }
+    return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+
+
+@router.get("/{table}", tags=["export"])
+async def export(engine: EngineDep, table: ExportTable) -> StreamingResponse:
+    """Stream the whole table as NDJSON ordered by id, one object per line"""
+    columns = COLUMNS[table]
+    stmt = select(*columns).order_by(columns[0]).execution_options(yield_per=YIELD_PER)
+
+    async def lines() -> AsyncIterator[bytes]:
+        async with engine.async_session() as session:
+            result = await session.stream(stmt)
+            async for partition in result.partitions():
+                yield b"".join(_dump_row(row) for row in partition)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,12 +1,21 @@
-from typing import Optional
+from typing import Annotated, Any, Optional
 
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
+from aoq_factory.app.bulk import (
+    BulkBody,
+    BulkItemResult,
+    IntegrityErrors,
+    bulk_create,
+    bulk_delete,
+    bulk_update,
+)
 from aoq_factory.app.deps.engine import EngineDep
-from aoq_factory.database.models import Level
+from aoq_factory.app.pagination import LimitQuery, ListOrder, Page, paginate
+from aoq_factory.database.models import Level, Song
 
 router = APIRouter(prefix="/levels")
 
@@ -29,20 +38,102 @@ class UpdateLevelRequest(BaseModel):
     added_by: Optional[str] = None
 
 
+class BulkUpdateLevelRequest(UpdateLevelRequest):
+    id: int
+
+
+INTEGRITY_ERRORS: IntegrityErrors = {
+    "fk_levels_song_id_songs": (status.HTTP_404_NOT_FOUND, "Song not found"),
+    "ck_levels_value_range": (status.HTTP_400_BAD_REQUEST, "Level value must be between 0 and 100"),
+}
+
+
+def _create_values(level: CreateLevelRequest) -> dict[str, Any]:
+    if not 0 <= level.value <= 100:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Level value must be between 0 and 100")
+    return dict(song_id=level.song_id, value=level.value, added_by=level.added_by)
+
+
+def _apply_update(db_level: Level, level: UpdateLevelRequest) -> None:
+    if level.value is not None:
+        db_level.value = level.value
+    if level.added_by is not None:
+        db_level.added_by = level.added_by
+
+
 @router.get("", tags=["level"])
-async def get_all(engine: EngineDep) -> list[LevelResponse]:
+async def get_all(
+    engine: EngineDep,
+    limit: LimitQuery = 50,
+    after: Optional[str] = None,
+    song_id: Optional[int] = None,
+    order: ListOrder = ListOrder.ID,
+) -> Page[LevelResponse]:
+    stmt = select(Level.id, Level.song_id, Level.value, Level.added_by)
+    if song_id is not None:
+        stmt = stmt.where(Level.song_id == song_id)
+
+    order_by = {
+        "id": [Level.id],
+        "created": [Level.created_at, Level.id],
+        "updated": [Level.updated_at, Level.id],
+    }[order.value.removeprefix("-")]
+    async with engine.async_session() as session:
+        rows, next_cursor = await paginate(
+            session,
+            stmt,
+            order_by=order_by,
+            limit=limit,
+            after=after,
+            descending=order.value.startswith("-"),
+        )
+    return Page(
+        items=[
+            LevelResponse(
+                id=row.id,
+                song_id=row.song_id,
+                value=row.value,
+                added_by=row.added_by,
+            )
+            for row in rows
+        ],
+        next=next_cursor,
+    )
+
+
+@router.post("/bulk", tags=["level"])
+async def create_many(engine: EngineDep, levels: Annotated[list[CreateLevelRequest], BulkBody]) -> list[BulkItemResult]:
     async with engine.async_session() as session:
-        levels: list[Level] = (await session.scalars(select(Level))).all()
-        session.expunge_all()
-    return [
-        LevelResponse(
-            id=level.id,
-            song_id=level.song_id,
-            value=level.value,
-            added_by=level.added_by,
+        results = await bulk_create(
+            session,
+            Level,
+            levels,
+            Song.id,
+            lambda level: level.song_id,
+            "Song not found",
+            _create_values,
+            INTEGRITY_ERRORS,
         )
-        for level in levels
-    ]
+        await session.commit()
+    return results
+
+
+@router.put("/bulk", tags=["level"])
+async def update_many(
+    engine: EngineDep, levels: Annotated[list[BulkUpdateLevelRequest], BulkBody]
+) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        results = await bulk_update(session, Level, levels, _apply_update, INTEGRITY_ERRORS, "Level not found")
+        await session.commit()
+    return results
+
+
+@router.post("/bulk/delete", tags=["level"])
+async def delete_many(engine: EngineDep, ids: Annotated[list[int], BulkBody]) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        results = await bulk_delete(session, Level, ids, "Level not found")
+        await session.commit()
+    return results
 
 
 @router.get("/{level_id}", tags=["level"])
@@ -90,10 +181,7 @@ async def update(engine: EngineDep, level_id: int, level: UpdateLevelRequest) ->
         if db_level is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Level not found")
 
-        if level.value is not None:
-            db_level.value = level.value
-        if level.added_by is not None:
-            db_level.added_by = level.added_by
+        _apply_update(db_level, level)
 
         await session.commit()
 
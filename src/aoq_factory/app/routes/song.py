@@ -1,12 +1,24 @@
-from typing import Optional
+import enum
+from typing import Annotated, Optional
 
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 
+from aoq_factory.app.bulk import (
+    BulkBody,
+    BulkItemResult,
+    IntegrityErrors,
+    bulk_delete,
+    bulk_update,
+    existing_ids,
+    integrity_error_detail,
+)
 from aoq_factory.app.deps.engine import EngineDep
-from aoq_factory.database.models import Category, Song
+from aoq_factory.app.pagination import LimitQuery, Page, paginate
+from aoq_factory.database.models import Anime, Category, Song
 
 router = APIRouter(prefix="/songs")
 
@@ -35,22 +47,157 @@ class UpdateSongRequest(BaseModel):
     song_name: Optional[str] = None
 
 
+class BulkUpdateSongRequest(UpdateSongRequest):
+    id: int
+
+
+INTEGRITY_ERRORS: IntegrityErrors = {
+    "uq_songs_anime_id": (status.HTTP_409_CONFLICT, "Song already exists"),
+    "fk_songs_anime_id_animes": (status.HTTP_404_NOT_FOUND, "Anime not found"),
+}
+
+
+def _apply_update(db_song: Song, song: UpdateSongRequest) -> None:
+    if song.category is not None and song.category not in Category.__members__:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid category")
+
+    if song.category is not None:
+        db_song.category = Category[song.category]
+    if song.number is not None:
+        db_song.number = song.number
+    if song.song_artist is not None:
+        db_song.song_artist = song.song_artist
+    if song.song_name is not None:
+        db_song.song_name = song.song_name
+
+
+class SongOrder(enum.Enum):
+    NUMBER = "number"
+    CREATED = "created"
+    CREATED_DESC = "-created"
+    UPDATED = "updated"
+    UPDATED_DESC = "-updated"
+
+
 @router.get("", tags=["song"])
-async def get_all(engine: EngineDep) -> list[SongResponse]:
+async def get_all(
+    engine: EngineDep,
+    limit: LimitQuery = 50,
+    after: Optional[str] = None,
+    anime_id: Optional[int] = None,
+    category: Optional[str] = None,
+    order: SongOrder = SongOrder.NUMBER,
+) -> Page[SongResponse]:
+    stmt = select(Song.id, Song.anime_id, Song.category, Song.number, Song.song_artist, Song.song_name)
+    if anime_id is not None:
+        stmt = stmt.where(Song.anime_id == anime_id)
+    if category is not None:
+        if category not in Category.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid category")
+        stmt = stmt.where(Song.category == Category[category])
+
+    order_by = {
+        "number": [Song.anime_id, Song.category, Song.number, Song.id],
+        "created": [Song.created_at, Song.id],
+        "updated": [Song.updated_at, Song.id],
+    }[order.value.removeprefix("-")]
     async with engine.async_session() as session:
-        songs: list[Song] = (await session.scalars(select(Song))).all()
-        session.expunge_all()
-    return [
-        SongResponse(
-            id=song.id,
-            anime_id=song.anime_id,
-            category=song.category.name,
-            number=song.number,
-            song_artist=song.song_artist,
-            song_name=song.song_name,
+        rows, next_cursor = await paginate(
+            session,
+            stmt,
+            order_by=order_by,
+            limit=limit,
+            after=after,
+            descending=order.value.startswith("-"),
         )
-        for song in songs
-    ]
+    return Page(
+        items=[
+            SongResponse(
+                id=row.id,
+                anime_id=row.anime_id,
+                category=row.category.name,
+                number=row.number,
+                song_artist=row.song_artist,
+                song_name=row.song_name,
+            )
+            for row in rows
+        ],
+        next=next_cursor,
+    )
+
+
+def _song_exists(index: int) -> BulkItemResult:
+    return BulkItemResult(index=index, status=status.HTTP_409_CONFLICT, detail="Song already exists")
+
+
+@router.post("/bulk", tags=["song"])
+async def create_many(engine: EngineDep, songs: Annotated[list[CreateSongRequest], BulkBody]) -> list[BulkItemResult]:
+    """Create songs in one transaction, songs that already exist are reported and skipped"""
+    results: list[Optional[BulkItemResult]] = [None] * len(songs)
+    async with engine.async_session() as session:
+        animes = await existing_ids(session, Anime.id, [song.anime_id for song in songs])
+        pending: dict[tuple[int, Category, int], int] = {}
+        for index, song in enumerate(songs):
+            if song.category not in Category.__members__:
+                results[index] = BulkItemResult(
+                    index=index, status=status.HTTP_400_BAD_REQUEST, detail="Invalid category"
+                )
+            elif song.anime_id not in animes:
+                results[index] = BulkItemResult(index=index, status=status.HTTP_404_NOT_FOUND, detail="Anime not found")
+            elif (key := (song.anime_id, Category[song.category], song.number)) in pending:
+                results[index] = _song_exists(index)
+            else:
+                pending[key] = index
+
+        if pending:
+            stmt = (
+                insert(Song)
+                .values(
+                    [
+                        dict(
+                            anime_id=songs[index].anime_id,
+                            category=Category[songs[index].category],
+                            number=songs[index].number,
+                            song_artist=songs[index].song_artist,
+                            song_name=songs[index].song_name,
+                        )
+                        for index in pending.values()
+                    ]
+                )
+                .on_conflict_do_nothing(constraint="uq_songs_anime_id")
+                .returning(Song.id, Song.anime_id, Song.category, Song.number)
+            )
+            try:
+                rows = (await session.execute(stmt)).all()
+            except IntegrityError as e:
+                # parent deleted after the existence check
+                status_code, detail = integrity_error_detail(e, INTEGRITY_ERRORS)
+                raise HTTPException(status_code=status_code, detail=detail) from e
+            for row in rows:
+                index = pending.pop((row.anime_id, row.category, row.number))
+                results[index] = BulkItemResult(index=index, status=status.HTTP_201_CREATED, id=row.id)
+            for index in pending.values():
+                results[index] = _song_exists(index)
+        await session.commit()
+    return results
+
+
+@router.put("/bulk", tags=["song"])
+async def update_many(
+    engine: EngineDep, songs: Annotated[list[BulkUpdateSongRequest], BulkBody]
+) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        results = await bulk_update(session, Song, songs, _apply_update, INTEGRITY_ERRORS, "Song not found")
+        await session.commit()
+    return results
+
+
+@router.post("/bulk/delete", tags=["song"])
+async def delete_many(engine: EngineDep, ids: Annotated[list[int], BulkBody]) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        results = await bulk_delete(session, Song, ids, "Song not found")
+        await session.commit()
+    return results
 
 
 @router.get("/{song_id}", tags=["song"])
@@ -102,16 +249,7 @@ async def update(engine: EngineDep, song_id: int, song: UpdateSongRequest) -> No
         if db_song is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Song not found")
 
-        if song.category is not None:
-            if song.category not in Category.__members__:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid category")
-            db_song.category = Category[song.category]
-        if song.number is not None:
-            db_song.number = song.number
-        if song.song_artist is not None:
-            db_song.song_artist = song.song_artist
-        if song.song_name is not None:
-            db_song.song_name = song.song_name
+        _apply_update(db_song, song)
 
         await session.commit()
 
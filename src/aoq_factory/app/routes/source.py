@@ -1,12 +1,22 @@
-from typing import Any, Optional
+from typing import Annotated, Any, Optional
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
+from aoq_factory.app.bulk import (
+    BulkBody,
+    BulkItemResult,
+    IntegrityErrors,
+    bulk_create,
+    bulk_delete,
+    bulk_update,
+)
 from aoq_factory.app.deps.engine import EngineDep
-from aoq_factory.database.models import Source, SourceStatus
+from aoq_factory.app.pagination import LimitQuery, ListOrder, Page, paginate
+from aoq_factory.database.json_filters import find_source, find_sources, location_filter, location_key
+from aoq_factory.database.models import Song, Source, SourceStatus
 
 router = APIRouter(prefix="/sources")
 
@@ -35,22 +45,152 @@ class UpdateSourceRequest(BaseModel):
     status: Optional[str] = None
 
 
+class BulkUpdateSourceRequest(UpdateSourceRequest):
+    id: int
+
+
+def _duplicate_detail(source_id: int) -> str:
+    return f"Song already has a source with this location (id={source_id})"
+
+
+INTEGRITY_ERRORS: IntegrityErrors = {
+    "fk_sources_song_id_songs": (status.HTTP_404_NOT_FOUND, "Song not found"),
+}
+
+
+def _create_values(source: CreateSourceRequest) -> dict[str, Any]:
+    status_enum = SourceStatus.NORMAL
+    if source.status is not None:
+        if source.status not in SourceStatus.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+        status_enum = SourceStatus[source.status]
+    return dict(
+        song_id=source.song_id,
+        location=source.location,
+        local_path=source.local_path,
+        added_by=source.added_by,
+        status=status_enum,
+    )
+
+
+def _apply_update(db_source: Source, source: UpdateSourceRequest) -> None:
+    if source.status is not None and source.status not in SourceStatus.__members__:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+
+    if source.location is not None:
+        db_source.location = source.location
+    if source.local_path is not None:
+        db_source.local_path = source.local_path
+    if source.added_by is not None:
+        db_source.added_by = source.added_by
+    if source.status is not None:
+        db_source.status = SourceStatus[source.status]
+
+
 @router.get("", tags=["source"])
-async def get_all(engine: EngineDep) -> list[SourceResponse]:
+async def get_all(
+    engine: EngineDep,
+    limit: LimitQuery = 50,
+    after: Optional[str] = None,
+    song_id: Optional[int] = None,
+    status_filter: Annotated[Optional[str], Query(alias="status")] = None,
+    platform: Optional[str] = None,
+    url: Optional[str] = None,
+    order: ListOrder = ListOrder.ID,
+) -> Page[SourceResponse]:
+    stmt = select(Source.id, Source.song_id, Source.location, Source.local_path, Source.added_by, Source.status)
+    if platform is not None or url is not None:
+        stmt = stmt.where(location_filter(platform=platform, url=url))
+    if song_id is not None:
+        stmt = stmt.where(Source.song_id == song_id)
+    if status_filter is not None:
+        if status_filter not in SourceStatus.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+        stmt = stmt.where(Source.status == SourceStatus[status_filter])
+
+    order_by = {
+        "id": [Source.id],
+        "created": [Source.created_at, Source.id],
+        "updated": [Source.updated_at, Source.id],
+    }[order.value.removeprefix("-")]
     async with engine.async_session() as session:
-        sources: list[Source] = (await session.scalars(select(Source))).all()
-        session.expunge_all()
-    return [
-        SourceResponse(
-            id=source.id,
-            song_id=source.song_id,
-            location=source.location,
-            local_path=source.local_path,
-            added_by=source.added_by,
-            status=source.status.name,
+        rows, next_cursor = await paginate(
+            session,
+            stmt,
+            order_by=order_by,
+            limit=limit,
+            after=after,
+            descending=order.value.startswith("-"),
         )
-        for source in sources
-    ]
+    return Page(
+        items=[
+            SourceResponse(
+                id=row.id,
+                song_id=row.song_id,
+                location=row.location,
+                local_path=row.local_path,
+                added_by=row.added_by,
+                status=row.status.name,
+            )
+            for row in rows
+        ],
+        next=next_cursor,
+    )
+
+
+@router.post("/bulk", tags=["source"])
+async def create_many(
+    engine: EngineDep, sources: Annotated[list[CreateSourceRequest], BulkBody]
+) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        existing = await find_sources(session, [(source.song_id, source.location) for source in sources])
+        results: dict[int, BulkItemResult] = {}
+        new: list[int] = []
+        seen = set()
+        for index, (source, source_id) in enumerate(zip(sources, existing, strict=True)):
+            key = (source.song_id, tuple(location_key(source.location).items()))
+            if source_id is not None:
+                detail = _duplicate_detail(source_id)
+            elif key[1] and key in seen:
+                detail = "Duplicate location in request"
+            else:
+                seen.add(key)
+                new.append(index)
+                continue
+            results[index] = BulkItemResult(index=index, status=status.HTTP_409_CONFLICT, detail=detail)
+        created = await bulk_create(
+            session,
+            Source,
+            [sources[index] for index in new],
+            Song.id,
+            lambda source: source.song_id,
+            "Song not found",
+            _create_values,
+            INTEGRITY_ERRORS,
+        )
+        await session.commit()
+    # bulk_create numbers its results by position among the new sources
+    for index, result in zip(new, created, strict=True):
+        results[index] = result.model_copy(update={"index": index})
+    return [results[index] for index in range(len(sources))]
+
+
+@router.put("/bulk", tags=["source"])
+async def update_many(
+    engine: EngineDep, sources: Annotated[list[BulkUpdateSourceRequest], BulkBody]
+) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        results = await bulk_update(session, Source, sources, _apply_update, INTEGRITY_ERRORS, "Source not found")
+        await session.commit()
+    return results
+
+
+@router.post("/bulk/delete", tags=["source"])
+async def delete_many(engine: EngineDep, ids: Annotated[list[int], BulkBody]) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        results = await bulk_delete(session, Source, ids, "Source not found")
+        await session.commit()
+    return results
 
 
 @router.get("/{source_id}", tags=["source"])
@@ -78,6 +218,9 @@ async def create(engine: EngineDep, source: CreateSourceRequest) -> None:
             if source.status not in SourceStatus.__members__:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
             status_enum = SourceStatus[source.status]
+        source_id = await find_source(session, source.song_id, source.location)
+        if source_id is not None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=_duplicate_detail(source_id))
 
         session.add(
             Source(
@@ -104,16 +247,7 @@ async def update(engine: EngineDep, source_id: int, source: UpdateSourceRequest)
         if db_source is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Source not found")
 
-        if source.location is not None:
-            db_source.location = source.location
-        if source.local_path is not None:
-            db_source.local_path = source.local_path
-        if source.added_by is not None:
-            db_source.added_by = source.added_by
-        if source.status is not None:
-            if source.status not in SourceStatus.__members__:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
-            db_source.status = SourceStatus[source.status]
+        _apply_update(db_source, source)
 
         await session.commit()
 
@@ -1,12 +1,21 @@
-from typing import Optional
+from typing import Annotated, Any, Optional
 
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
+from aoq_factory.app.bulk import (
+    BulkBody,
+    BulkItemResult,
+    IntegrityErrors,
+    bulk_create,
+    bulk_delete,
+    bulk_update,
+)
 from aoq_factory.app.deps.engine import EngineDep
-from aoq_factory.database.models import Timing
+from aoq_factory.app.pagination import LimitQuery, ListOrder, Page, paginate
+from aoq_factory.database.models import Source, Timing
 
 router = APIRouter(prefix="/timings")
 
@@ -32,21 +41,109 @@ class UpdateTimingRequest(BaseModel):
     added_by: Optional[str] = None
 
 
+class BulkUpdateTimingRequest(UpdateTimingRequest):
+    id: int
+
+
+INTEGRITY_ERRORS: IntegrityErrors = {
+    "fk_timings_source_id_sources": (status.HTTP_404_NOT_FOUND, "Source not found"),
+}
+
+
+def _create_values(timing: CreateTimingRequest) -> dict[str, Any]:
+    return dict(
+        source_id=timing.source_id,
+        guess_start=timing.guess_start,
+        reveal_start=timing.reveal_start,
+        added_by=timing.added_by,
+    )
+
+
+def _apply_update(db_timing: Timing, timing: UpdateTimingRequest) -> None:
+    if timing.guess_start is not None:
+        db_timing.guess_start = timing.guess_start
+    if timing.reveal_start is not None:
+        db_timing.reveal_start = timing.reveal_start
+    if timing.added_by is not None:
+        db_timing.added_by = timing.added_by
+
+
 @router.get("", tags=["timing"])
-async def get_all(engine: EngineDep) -> list[TimingResponse]:
+async def get_all(
+    engine: EngineDep,
+    limit: LimitQuery = 50,
+    after: Optional[str] = None,
+    source_id: Optional[int] = None,
+    order: ListOrder = ListOrder.ID,
+) -> Page[TimingResponse]:
+    stmt = select(Timing.id, Timing.source_id, Timing.guess_start, Timing.reveal_start, Timing.added_by)
+    if source_id is not None:
+        stmt = stmt.where(Timing.source_id == source_id)
+
+    order_by = {
+        "id": [Timing.id],
+        "created": [Timing.created_at, Timing.id],
+        "updated": [Timing.updated_at, Timing.id],
+    }[order.value.removeprefix("-")]
     async with engine.async_session() as session:
-        timings: list[Timing] = (await session.scalars(select(Timing))).all()
-        session.expunge_all()
-    return [
-        TimingResponse(
-            id=timing.id,
-            source_id=timing.source_id,
-            guess_start=timing.guess_start,
-            reveal_start=timing.reveal_start,
-            added_by=timing.added_by,
+        rows, next_cursor = await paginate(
+            session,
+            stmt,
+            order_by=order_by,
+            limit=limit,
+            after=after,
+            descending=order.value.startswith("-"),
         )
-        for timing in timings
-    ]
+    return Page(
+        items=[
+            TimingResponse(
+                id=row.id,
+                source_id=row.source_id,
+                guess_start=row.guess_start,
+                reveal_start=row.reveal_start,
+                added_by=row.added_by,
+            )
+            for row in rows
+        ],
+        next=next_cursor,
+    )
+
+
+@router.post("/bulk", tags=["timing"])
+async def create_many(
+    engine: EngineDep, timings: Annotated[list[CreateTimingRequest], BulkBody]
+) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        results = await bulk_create(
+            session,
+            Timing,
+            timings,
+            Source.id,
+            lambda timing: timing.source_id,
+            "Source not found",
+            _create_values,
+            INTEGRITY_ERRORS,
+        )
+        await session.commit()
+    return results
+
+
+@router.put("/bulk", tags=["timing"])
+async def update_many(
+    engine: EngineDep, timings: Annotated[list[BulkUpdateTimingRequest], BulkBody]
+) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        results = await bulk_update(session, Timing, timings, _apply_update, INTEGRITY_ERRORS, "Timing not found")
+        await session.commit()
+    return results
+
+
+@router.post("/bulk/delete", tags=["timing"])
+async def delete_many(engine: EngineDep, ids: Annotated[list[int], BulkBody]) -> list[BulkItemResult]:
+    async with engine.async_session() as session:
+        results = await bulk_delete(session, Timing, ids, "Timing not found")
+        await session.commit()
+    return results
 
 
 @router.get("/{timing_id}", tags=["timing"])
@@ -92,12 +189,7 @@ async def update(engine: EngineDep, timing_id: int, timing: UpdateTimingRequest)
         if db_timing is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Timing not found")
 
-        if timing.guess_start is not None:
-            db_timing.guess_start = timing.guess_start
-        if timing.reveal_start is not None:
-            db_timing.reveal_start = timing.reveal_start
-        if timing.added_by is not None:
-            db_timing.added_by = timing.added_by
+        _apply_update(db_timing, timing)
 
         await session.commit()
 
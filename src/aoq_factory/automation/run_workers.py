@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import logging
+from dataclasses import asdict
+from typing import Any, Callable
+
+from aoq_factory.database.connection import Engine, EngineRole, get_engine
+
+logger = logging.getLogger(__name__)
+
+
+def _songs_worker(engine: Engine, args: argparse.Namespace) -> Any:
+    from .workers.songs_worker import SongsWorker
+
+    return SongsWorker(engine, args.batch_size, args.interval, concurrency=args.concurrency)
+
+
+def _download_worker(engine: Engine, args: argparse.Namespace) -> Any:
+    from .workers.download_worker import DownloadWorker
+
+    return DownloadWorker(engine, args.batch_size, args.interval, concurrency=args.concurrency or 4)
+
+
+def _timing_worker(engine: Engine, args: argparse.Namespace) -> Any:
+    # analysis workers need numpy, imported only when they run
+    from aoq_factory.analysis.feature_store import FeatureStore
+
+    from .workers.timing_worker import TimingWorker
+
+    return TimingWorker(
+        engine, args.batch_size, args.interval, concurrency=args.concurrency, store=FeatureStore.from_settings()
+    )
+
+
+def _difficulty_worker(engine: Engine, args: argparse.Namespace) -> Any:
+    from aoq_factory.analysis.feature_store import FeatureStore
+
+    from .workers.difficulty_worker import DifficultyWorker
+
+    return DifficultyWorker(engine, args.batch_size, args.interval, store=FeatureStore.from_settings())
+
+
+WORKERS: dict[str, Callable[[Engine, argparse.Namespace], Any]] = {
+    "songs": _songs_worker,
+    "download": _download_worker,
+    "timing": _timing_worker,
+    "difficulty": _difficulty_worker,
+}
+
+
+async def log_pool_stats(engine: Engine, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        stats = engine.pool_stats()
+        if stats is not None:
+            logger.info(f"worker pool: {asdict(stats)}")
+
+
+async def run(names: list[str], args: argparse.Namespace) -> None:
+    """Run workers in one process, sharing the connection pool of the worker role"""
+    engine = get_engine(EngineRole.WORKER)
+    workers = [WORKERS[name](engine, args) for name in names]
+    try:
+        async with asyncio.TaskGroup() as group:
+            for worker in workers:
+                group.create_task(worker.run(), name=worker.name)
+            if args.stats_interval > 0:
+                group.create_task(log_pool_stats(engine, args.stats_interval))
+    finally:
+        await engine.engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run automation workers on the worker connection pool")
+    parser.add_argument("workers", nargs="+", choices=list(WORKERS))
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=5, help="seconds between rounds while busy")
+    parser.add_argument("--concurrency", type=int, default=None, help="parallel jobs per worker")
+    parser.add_argument("--stats-interval", type=float, default=60, help="seconds between pool stats logs, 0 disables")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(list(dict.fromkeys(args.workers)), args))
+
+
+if __name__ == "__main__":
+    main()
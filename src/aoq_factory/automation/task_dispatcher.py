@@ -0,0 +1,199 @@
+import logging
+import os
+import random
+import socket
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import ColumnElement, Select, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aoq_factory.database.connection import Engine
+from aoq_factory.database.models import (
+    TaskAssignment,
+    TaskQueue,
+    TaskResult,
+    TaskStatus,
+    TaskType,
+    WorkerResultStatus,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_instance(name: str) -> str:
+    return f"{name}@{socket.gethostname()}:{os.getpid()}"
+
+
+class TaskDispatcher:
+    """Claims tasks from task_queue with SKIP LOCKED and records their outcome
+
+    A claim is a lease of `lease` seconds, tasks still assigned after it ran out belong to a worker
+    that died or was cancelled and are claimed again, counting another attempt
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        worker_instance: str,
+        retry_base_delay: float = 300,
+        retry_max_delay: float = 86400,
+        retry_jitter: float = 0.2,
+        lease: float = 3600,
+    ) -> None:
+        self.engine = engine
+        self.worker_instance = worker_instance
+        self.lease = lease
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retry_jitter = retry_jitter
+
+    async def create_tasks(self, task_type: TaskType, column: str, ids_stmt: Select) -> int:
+        """Create pending tasks referencing `column` for every id selected by ids_stmt, skipping active duplicates"""
+        target = getattr(TaskQueue, column)
+        existing_task = (
+            select(TaskQueue.id)
+            .where(
+                TaskQueue.task_type == task_type,
+                target == ids_stmt.selected_columns[0],
+                TaskQueue.status != TaskStatus.CANCELLED,
+            )
+            .exists()
+        )
+        source = ids_stmt.add_columns(literal(task_type, TaskQueue.task_type.type)).where(~existing_task)
+        # unique partial indexes make concurrent creators skip tasks that became active meanwhile
+        stmt = insert(TaskQueue).from_select([column, "task_type"], source).on_conflict_do_nothing()
+        async with self.engine.async_session() as session:
+            result = await session.execute(stmt)
+            await session.commit()
+        if result.rowcount:
+            logger.info(f"created {result.rowcount} {task_type.name} tasks")
+        return result.rowcount
+
+    def _lease_cutoff(self) -> ColumnElement:
+        return func.now() - timedelta(seconds=self.lease)
+
+    async def _release_expired(self, session: AsyncSession, task_types: list[TaskType]) -> None:
+        """Make tasks whose lease ran out pending again, or failed once out of attempts"""
+        expired = (
+            await session.execute(
+                select(TaskQueue.id, TaskQueue.attempt_count, TaskQueue.max_attempts, TaskAssignment)
+                .join(TaskAssignment, TaskAssignment.task_id == TaskQueue.id)
+                .where(
+                    TaskQueue.status == TaskStatus.ASSIGNED,
+                    TaskQueue.task_type.in_(task_types),
+                    TaskAssignment.assigned_at < self._lease_cutoff(),
+                )
+                .with_for_update(skip_locked=True, of=TaskQueue)
+            )
+        ).all()
+        for task_id, attempt_count, max_attempts, assignment in expired:
+            exhausted = attempt_count >= max_attempts
+            # scheduled_after is already due, pending tasks are claimed again right away
+            status = TaskStatus.FAILED if exhausted else TaskStatus.PENDING
+            await session.execute(update(TaskQueue).where(TaskQueue.id == task_id).values(status=status))
+            await session.delete(assignment)
+            session.add(
+                TaskResult(
+                    task_id=task_id,
+                    worker_instance=assignment.worker_instance,
+                    status=WorkerResultStatus.FAIL_TEMPORARY,
+                    error_type="LeaseExpired",
+                    error_message=f"not finished within {self.lease:.0f}s",
+                    started_at=assignment.assigned_at,
+                )
+            )
+            logger.warning(
+                f"task {task_id} of {assignment.worker_instance} lease expired (attempt {attempt_count}), "
+                + ("failed" if exhausted else "released")
+            )
+        if expired:
+            await session.flush()
+
+    async def claim(self, task_types: list[TaskType], limit: int) -> list[TaskQueue]:
+        """Claim up to `limit` due tasks in a single transaction, without blocking on tasks claimed by others
+
+        Tasks whose lease expired are released first, so they are claimed like pending ones
+        """
+        claimable = (
+            select(TaskQueue.id)
+            .where(
+                TaskQueue.status == TaskStatus.PENDING,
+                TaskQueue.task_type.in_(task_types),
+                TaskQueue.scheduled_after <= func.now(),
+            )
+            .order_by(TaskQueue.scheduled_after, TaskQueue.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(TaskQueue)
+            .where(TaskQueue.id.in_(claimable))
+            .values(status=TaskStatus.ASSIGNED, attempt_count=TaskQueue.attempt_count + 1)
+            .returning(TaskQueue)
+        )
+        async with self.engine.async_session() as session:
+            await self._release_expired(session, task_types)
+            tasks = list((await session.scalars(stmt)).all())
+            if tasks:
+                await session.execute(
+                    insert(TaskAssignment),
+                    [{"task_id": task.id, "worker_instance": self.worker_instance} for task in tasks],
+                )
+            # detach before commit, so loaded attributes are not expired
+            session.expunge_all()
+            await session.commit()
+        return tasks
+
+    def retry_delay(self, attempt_count: int) -> float:
+        """Exponential backoff with jitter, base delay for the first retry"""
+        delay = min(self.retry_base_delay * 2 ** max(attempt_count - 1, 0), self.retry_max_delay)
+        return delay * random.uniform(1 - self.retry_jitter, 1 + self.retry_jitter)
+
+    async def _finish(
+        self,
+        session: AsyncSession,
+        task: TaskQueue,
+        status: WorkerResultStatus,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        started_at = await session.scalar(
+            delete(TaskAssignment).where(TaskAssignment.task_id == task.id).returning(TaskAssignment.assigned_at)
+        )
+        session.add(
+            TaskResult(
+                task_id=task.id,
+                worker_instance=self.worker_instance,
+                status=status,
+                error_type=type(error).__name__ if error is not None else None,
+                error_message=str(error) if error is not None else None,
+                started_at=started_at,
+            )
+        )
+
+    async def complete(self, session: AsyncSession, task: TaskQueue) -> None:
+        """Mark task completed, as part of the caller's transaction"""
+        await session.execute(update(TaskQueue).where(TaskQueue.id == task.id).values(status=TaskStatus.COMPLETED))
+        await self._finish(session, task, WorkerResultStatus.SUCCESS)
+
+    async def fail(self, session: AsyncSession, task: TaskQueue, error: BaseException, temporary: bool) -> None:
+        """Reschedule temporarily failed task with backoff, or mark it failed, as part of the caller's transaction"""
+        if temporary and task.attempt_count < task.max_attempts:
+            delay = self.retry_delay(task.attempt_count)
+            values = {
+                "status": TaskStatus.PENDING,
+                "scheduled_after": func.now() + timedelta(seconds=delay),
+            }
+            logger.info(f"task {task.id} rescheduled in {delay:.0f}s (attempt {task.attempt_count}): {error}")
+        else:
+            values = {"status": TaskStatus.FAILED}
+        await session.execute(update(TaskQueue).where(TaskQueue.id == task.id).values(**values))
+        status = WorkerResultStatus.FAIL_TEMPORARY if temporary else WorkerResultStatus.FAIL_INVALID
+        await self._finish(session, task, status, error)
+
+    async def cancel(self, session: AsyncSession, task: TaskQueue) -> None:
+        """Cancel task whose entity no longer needs processing, as part of the caller's transaction"""
+        await session.execute(update(TaskQueue).where(TaskQueue.id == task.id).values(status=TaskStatus.CANCELLED))
+        await session.execute(delete(TaskAssignment).where(TaskAssignment.task_id == task.id))
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from typing import Any, Optional
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from aoq_factory.database.connection import Engine
+
+logger = logging.getLogger(__name__)
+
+WAKEUP_CHANNEL = "worker_wakeup"
+
+
+class Wakeup:
+    """Waits for NOTIFY on the wakeup channel, polling with adaptive backoff as a fallback"""
+
+    def __init__(
+        self,
+        engine: Engine,
+        min_interval: float,
+        max_interval: float,
+        channel: str = WAKEUP_CHANNEL,
+    ) -> None:
+        self.engine = engine
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.channel = channel
+        self.interval = min_interval
+        self._event = asyncio.Event()
+        self._conn: Optional[AsyncConnection] = None
+        self._driver_conn: Any = None
+
+    async def __aenter__(self) -> "Wakeup":
+        await self._listen()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self._unlisten()
+
+    @property
+    def listening(self) -> bool:
+        return self._driver_conn is not None and not self._driver_conn.is_closed()
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        self._event.set()
+
+    async def _listen(self) -> None:
+        try:
+            self._conn = await self.engine.engine.connect()
+            driver_conn = (await self._conn.get_raw_connection()).driver_connection
+            await driver_conn.add_listener(self.channel, self._on_notify)
+            self._driver_conn = driver_conn
+            logger.info(f"listening on {self.channel}")
+        except Exception as e:
+            logger.warning(f"can't listen on {self.channel}, falling back to polling: {e}")
+            await self._unlisten()
+
+    async def _unlisten(self) -> None:
+        try:
+            if self.listening:
+                await self._driver_conn.remove_listener(self.channel, self._on_notify)
+        except Exception as e:
+            logger.warning(f"exception occured while removing {self.channel} listener: {e}")
+        if self._conn is not None:
+            if self._driver_conn is not None and self._driver_conn.is_closed():
+                # don't return a dead connection to the pool
+                await self._conn.invalidate()
+            await self._conn.close()
+        self._conn = None
+        self._driver_conn = None
+
+    async def wait(self, idle: bool) -> None:
+        """Sleep until notified or the polling interval passes, which grows while rounds stay idle"""
+        if not idle:
+            self.interval = self.min_interval
+        if self._driver_conn is not None and not self.listening:
+            logger.warning(f"{self.channel} listener connection lost, reconnecting")
+            await self._unlisten()
+            await self._listen()
+        try:
+            await asyncio.wait_for(self._event.wait(), self.interval)
+        except TimeoutError:
+            pass
+        self._event.clear()
+        if idle:
+            self.interval = min(self.interval * 2, self.max_interval)
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aoq_factory.analysis.difficulty import (
+    MEMBERS_KEYS,
+    STRATEGIES,
+    SongInputs,
+    added_by,
+    info_number,
+    info_year,
+    inputs_hashes,
+)
+from aoq_factory.analysis.feature_store import FeatureStore
+from aoq_factory.automation.wakeup import Wakeup
+from aoq_factory.database.connection import Engine
+from aoq_factory.database.models import (
+    Anime,
+    AnimeInfo,
+    AnimeStatus,
+    Category,
+    Level,
+    Song,
+    Source,
+    SourceStatus,
+    Timing,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DifficultyWorker:
+    name: str = "difficulty_worker"
+
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int,
+        interval: float,
+        strategy: str = "popularity",
+        incremental: bool = True,
+        max_interval: float = 3600,
+        store: Optional[FeatureStore] = None,
+    ) -> None:
+        """Score all songs in batches of batch_size with one bulk upsert of levels per batch
+
+        In incremental mode only songs whose inputs changed since their level was written are rescored,
+        otherwise run rescores every song once and returns. Loudness of guess parts is read from store
+        when already cached there, songs without cached features lack that input
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown difficulty strategy {strategy}, expected one of {list(STRATEGIES)}")
+        self.engine = engine
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_interval = max_interval
+        self.strategy = STRATEGIES[strategy]
+        self.added_by = added_by(self.strategy)
+        self.incremental = incremental
+        self.store = store
+
+    async def run(self) -> None:
+        if not self.incremental:
+            # a full rescore writes every level, repeating it would never go idle
+            await self.score_all()
+            return
+        async with Wakeup(self.engine, self.interval, self.max_interval) as wakeup:
+            while True:
+                scored = await self.score_all()
+                await wakeup.wait(idle=not scored)
+
+    async def score_all(self) -> int:
+        """Walk all songs by id, returns number of levels written"""
+        after = 0
+        written = 0
+        while True:
+            async with self.engine.async_session() as session:
+                inputs = await self._load_inputs(session, after)
+                if len(inputs) == 0:
+                    break
+                after = int(inputs.song_ids[-1])
+                written += await self._score_batch(session, inputs)
+                await session.commit()
+        if written:
+            logger.info(f"wrote {written} levels of {self.added_by}")
+        return written
+
+    async def _load_inputs(self, session: AsyncSession, after: int) -> SongInputs:
+        songs = (
+            await session.execute(
+                select(Song.id, Song.anime_id, Song.category, Song.number)
+                .join(Anime, Anime.id == Song.anime_id)
+                .where(Song.id > after, Anime.status != AnimeStatus.BLACKLISTED)
+                .order_by(Song.id)
+                .limit(self.batch_size)
+            )
+        ).all()
+        anime_ids = {song.anime_id for song in songs}
+        members: dict[int, float] = {}
+        years: dict[int, float] = {}
+        infos = await session.execute(
+            select(AnimeInfo.anime_id, AnimeInfo.data).where(AnimeInfo.anime_id.in_(anime_ids))
+        )
+        for anime_id, data in infos.tuples():
+            # several sources may know the same anime, keep the largest audience and earliest year
+            count = info_number(data, MEMBERS_KEYS)
+            if count is not None:
+                members[anime_id] = max(count, members.get(anime_id, 0))
+            year = info_year(data)
+            if year is not None:
+                years[anime_id] = min(year, years.get(anime_id, year))
+
+        loudness = await self._guess_loudness(session, [song.id for song in songs])
+        return SongInputs(
+            song_ids=np.array([song.id for song in songs], dtype=np.int64),
+            members=np.array([members.get(song.anime_id, np.nan) for song in songs], dtype=np.float64),
+            year=np.array([years.get(song.anime_id, np.nan) for song in songs], dtype=np.float64),
+            is_ending=np.array([song.category == Category.ED for song in songs], dtype=bool),
+            number=np.array([song.number for song in songs], dtype=np.float64),
+            loudness=np.array([loudness.get(song.id, np.nan) for song in songs], dtype=np.float64),
+        )
+
+    async def _guess_loudness(self, session: AsyncSession, song_ids: list[int]) -> dict[int, float]:
+        """Mean loudness of the guess part of the latest timing of every song, from the feature store"""
+        if self.store is None or not song_ids:
+            return {}
+        rows = (
+            await session.execute(
+                select(Source.song_id, Source.local_path, Timing.guess_start, Timing.reveal_start)
+                .join(Timing, Timing.source_id == Source.id)
+                .where(
+                    Source.song_id.in_(song_ids),
+                    Source.status == SourceStatus.DOWNLOADED,
+                    Source.local_path.is_not(None),
+                )
+                .order_by(Source.song_id, Timing.created_at.desc())
+                .distinct(Source.song_id)
+            )
+        ).tuples()
+
+        def read(path: str, start: float, end: float) -> Optional[float]:
+            # decoding missing files here would run ffmpeg on every source, the timing worker stores them
+            features = self.store.peek(path)
+            if features is None:
+                return None
+            part = features.loudness[round(start * features.frame_rate) : round(end * features.frame_rate)]
+            return float(np.mean(part)) if len(part) else None
+
+        loudness = {}
+        for song_id, path, guess_start, reveal_start in rows:
+            value = await asyncio.to_thread(read, path, guess_start, reveal_start)
+            if value is not None:
+                loudness[song_id] = value
+        return loudness
+
+    async def _score_batch(self, session: AsyncSession, inputs: SongInputs) -> int:
+        hashes = np.array(inputs_hashes(self.strategy, inputs))
+        if self.incremental:
+            current = dict(
+                (
+                    await session.execute(
+                        select(Level.song_id, Level.inputs_hash).where(
+                            Level.song_id.in_(inputs.song_ids.tolist()),
+                            Level.added_by == self.added_by,
+                            Level.inputs_hash.is_not(None),
+                        )
+                    )
+                ).tuples()
+            )
+            changed = np.array(
+                [current.get(int(song_id)) != hash_ for song_id, hash_ in zip(inputs.song_ids, hashes, strict=True)]
+            )
+            if not changed.any():
+                return 0
+            inputs = SongInputs(**{name: column[changed] for name, column in vars(inputs).items()})
+            hashes = hashes[changed]
+
+        values = np.clip(self.strategy.score(inputs), 0, 100)
+        stmt = insert(Level).values(
+            [
+                {"song_id": int(song_id), "value": int(value), "added_by": self.added_by, "inputs_hash": str(hash_)}
+                for song_id, value, hash_ in zip(inputs.song_ids, values, hashes, strict=True)
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Level.song_id, Level.added_by],
+            index_where=Level.inputs_hash.is_not(None),
+            set_={"value": stmt.excluded.value, "inputs_hash": stmt.excluded.inputs_hash, "updated_at": func.now()},
+        )
+        await session.execute(stmt)
+        return len(inputs)
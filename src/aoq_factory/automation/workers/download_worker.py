@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from aiohttp import ClientTimeout
+from sqlalchemy import Select, select, update
+
+from aoq_factory.animeapi.client import client
+from aoq_factory.automation.task_dispatcher import TaskDispatcher, default_worker_instance
+from aoq_factory.automation.wakeup import Wakeup
+from aoq_factory.config import get_settings
+from aoq_factory.database.connection import Engine
+from aoq_factory.database.models import Source, SourceStatus, TaskQueue, TaskType
+from aoq_factory.download.budget import DiskBudget
+from aoq_factory.download.dedup import Fingerprint, deduplicate
+from aoq_factory.download.downloaders import (
+    HTTP,
+    LOCAL,
+    DownloadError,
+    HostLimits,
+    download_http,
+    download_ytdlp,
+    location_host,
+    verify,
+)
+
+logger = logging.getLogger(__name__)
+
+DownloadResult = tuple[TaskQueue, int, Fingerprint | BaseException]
+
+
+class DownloadWorker:
+    name: str = "download_worker"
+
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int,
+        interval: float,
+        concurrency: int = 4,
+        per_host: Optional[int] = None,
+        worker_instance: Optional[str] = None,
+        max_interval: float = 300,
+        flush_interval: float = 5,
+        expected_file_size: int = 64 * 1024**2,
+    ) -> None:
+        """Download claimed sources, at most `concurrency` at once and `per_host` from the same host
+
+        Finished downloads are written in batches every `flush_interval` seconds. Before claiming,
+        downloaded sources are evicted to fit expected_file_size for every source of the batch
+        """
+        settings = get_settings()
+        self.engine = engine
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_interval = max_interval
+        self.concurrency = concurrency
+        self.flush_interval = flush_interval
+        self.expected_file_size = expected_file_size
+        self.host_limits = HostLimits(per_host or settings.download_per_host)
+        self.budget = DiskBudget(
+            engine,
+            settings.downloads_dir or os.path.join(settings.resources_dir, "sources"),
+            settings.download_disk_budget,
+        )
+        self.ytdlp = settings.ytdlp_path
+        self.ffprobe = settings.ffprobe_path
+        self.dispatcher = TaskDispatcher(engine, worker_instance or default_worker_instance(self.name))
+
+    async def run(self) -> None:
+        os.makedirs(self.budget.directory, exist_ok=True)
+        try:
+            async with Wakeup(self.engine, self.interval, self.max_interval) as wakeup:
+                while True:
+                    await self.dispatcher.create_tasks(
+                        TaskType.DOWNLOAD_SOURCE, "source_id", self._unprocessed_sources_stmt()
+                    )
+                    await self.budget.ensure(self.batch_size * self.expected_file_size)
+                    sources = await self._claim_sources(self.batch_size)
+                    logger.info(f"claimed {len(sources)} sources: {[source_id for _, source_id, _ in sources]}")
+                    if sources:
+                        await self._process_sources(sources)
+                    await wakeup.wait(idle=not sources)
+        finally:
+            await client.close()
+
+    def _unprocessed_sources_stmt(self) -> Select:
+        return select(Source.id).where(Source.status == SourceStatus.NORMAL, Source.local_path.is_(None))
+
+    async def _claim_sources(self, limit: int) -> list[tuple[TaskQueue, int, dict[str, Any]]]:
+        """Claim tasks and mark their sources DOWNLOADING, tasks of sources no longer NORMAL are cancelled"""
+        tasks = await self.dispatcher.claim([TaskType.DOWNLOAD_SOURCE], limit)
+        if not tasks:
+            return []
+        async with self.engine.async_session() as session:
+            locations: dict[int, dict[str, Any]] = dict(
+                (
+                    await session.execute(
+                        update(Source)
+                        .where(
+                            Source.id.in_([task.source_id for task in tasks]),
+                            # DOWNLOADING when a previous worker died mid download
+                            Source.status.in_([SourceStatus.NORMAL, SourceStatus.DOWNLOADING]),
+                        )
+                        .values(status=SourceStatus.DOWNLOADING)
+                        .returning(Source.id, Source.location)
+                    )
+                ).tuples()
+            )
+            for task in tasks:
+                if task.source_id not in locations:
+                    await self.dispatcher.cancel(session, task)
+            await session.commit()
+        return [(task, task.source_id, locations[task.source_id]) for task in tasks if task.source_id in locations]
+
+    def _destination(self, source_id: int, url: str) -> str:
+        extension = os.path.splitext(urlsplit(url).path)[1]
+        if not 1 < len(extension) <= 5:
+            extension = ".mp4"
+        return os.path.join(self.budget.directory, f"{source_id}{extension}")
+
+    async def _download(self, source_id: int, location: dict[str, Any]) -> Fingerprint:
+        platform = location.get("platform")
+        if platform == LOCAL:
+            path = location.get("path")
+            if not path or not os.path.isfile(path):
+                raise DownloadError(f"local file {path} doesn't exist", temporary=False)
+        else:
+            url = location.get("url")
+            if not url:
+                raise DownloadError(f"location {location} has no url", temporary=False)
+            async with self.host_limits(location_host(location)):
+                if platform == HTTP:
+                    settings = get_settings()
+                    # no total timeout, only stalled reads abort
+                    session = client.session(
+                        "downloads",
+                        timeout=ClientTimeout(sock_read=settings.http_timeout, connect=settings.http_connect_timeout),
+                    )
+                    path = await download_http(session, url, self._destination(source_id, url))
+                else:
+                    path = await download_ytdlp(url, self.budget.directory, str(source_id), self.ytdlp)
+        try:
+            await verify(path, self.ffprobe)
+        except DownloadError as e:
+            if platform != LOCAL and not e.temporary:
+                os.remove(path)
+            raise
+        async with self.engine.async_session() as session:
+            fingerprint = await deduplicate(session, source_id, path, owned=platform != LOCAL)
+            await session.commit()
+        return fingerprint
+
+    async def _process_sources(self, sources: list[tuple[TaskQueue, int, dict[str, Any]]]) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process(task: TaskQueue, source_id: int, location: dict[str, Any]) -> DownloadResult:
+            async with semaphore:
+                try:
+                    return task, source_id, await self._download(source_id, location)
+                except Exception as e:
+                    return task, source_id, e
+
+        pending: list[DownloadResult] = []
+        last_flush = time.monotonic()
+        for future in asyncio.as_completed([process(*source) for source in sources]):
+            pending.append(await future)
+            if time.monotonic() - last_flush >= self.flush_interval:
+                await self._flush(pending)
+                pending, last_flush = [], time.monotonic()
+        if pending:
+            await self._flush(pending)
+
+    async def _flush(self, results: list[DownloadResult]) -> None:
+        """Write statuses of finished downloads and finish their tasks in one transaction"""
+        values = []
+        async with self.engine.async_session() as session:
+            for task, source_id, result in results:
+                if isinstance(result, BaseException):
+                    logger.warning(f"exception occured during download of source {source_id}: {result}")
+                    temporary = not isinstance(result, DownloadError) or result.temporary
+                    status = SourceStatus.NORMAL if temporary else SourceStatus.INVALID
+                    values.append(
+                        {
+                            "id": source_id,
+                            "status": status,
+                            "local_path": None,
+                            "content_size": None,
+                            "partial_hash": None,
+                            "content_hash": None,
+                        }
+                    )
+                    await self.dispatcher.fail(session, task, result, temporary)
+                else:
+                    logger.info(f"source {source_id}: downloaded to {result.local_path}")
+                    values.append(
+                        {
+                            "id": source_id,
+                            "status": SourceStatus.DOWNLOADED,
+                            "local_path": result.local_path,
+                            "content_size": result.content_size,
+                            "partial_hash": result.partial_hash,
+                            "content_hash": result.content_hash,
+                        }
+                    )
+                    await self.dispatcher.complete(session, task)
+            # bulk update by primary key, a single executemany
+            await session.execute(update(Source), values)
+            await session.commit()
@@ -1,131 +1,241 @@
 import asyncio
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 
-from sqlalchemy import ColumnElement, Select, and_, func, select
+from aiohttp import ClientError
+from sqlalchemy import ColumnElement, Select, and_, select
 
 from aoq_factory.animeapi import anidb
+from aoq_factory.animeapi.client import client
+from aoq_factory.automation.task_dispatcher import TaskDispatcher, default_worker_instance
+from aoq_factory.automation.wakeup import Wakeup
 from aoq_factory.database.connection import Engine
-from aoq_factory.database.models import Anime, AnimeStatus, IDMapping, Platform, Song, WorkerResult, WorkerResultStatus
+from aoq_factory.database.models import (
+    Anime,
+    AnimeStatus,
+    IDMapping,
+    Platform,
+    Song,
+    TaskQueue,
+    TaskType,
+    WorkerResult,
+    WorkerResultStatus,
+)
 
 logger = logging.getLogger(__name__)
 
+ProcessingResult = tuple[TaskQueue, Anime, list[Song] | Exception]
+
 
 class SongsWorker:
     name: str = "songs_worker"
 
-    def __init__(self, engine: Engine, batch_size: int, interval: float) -> None:
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int,
+        interval: float,
+        concurrency: Optional[int] = None,
+        worker_instance: Optional[str] = None,
+        max_interval: float = 300,
+    ) -> None:
+        """Process animes one at a time, or through the pipeline with `concurrency` parser processes
+
+        Rounds are woken up by inserts of animes, mappings and tasks, polling every `interval` seconds
+        while busy and backing off up to `max_interval` while idle
+        """
         self.engine = engine
         self.batch_size = batch_size
         self.interval = interval
+        self.max_interval = max_interval
+        self.concurrency = concurrency
+        self.dispatcher = TaskDispatcher(engine, worker_instance or default_worker_instance(self.name))
 
     def _transform_songs_to_dict(self, songs: list[Song]) -> dict[str, Song]:
         return {f"{song.category} {song.number}": song for song in songs}
 
     async def run(self) -> None:
-        while True:
-            animes = await self._get_unprocessed_animes(self.batch_size)
-            logger.info(f"found {len(animes)} unprocessed animes: {[anime.title_ro for anime in animes]}")
-            for anime in animes:
-                logger.info(f"processing {anime.title_ro} (id={anime.id})")
-                await self._process_anime(anime)
-            await asyncio.sleep(self.interval)
-
-    async def _process_anime(self, anime: Anime) -> None:
-        if not (await self._does_anime_need_processing(anime)):
+        executor = ProcessPoolExecutor(max_workers=self.concurrency) if self.concurrency is not None else None
+        try:
+            async with Wakeup(self.engine, self.interval, self.max_interval) as wakeup:
+                while True:
+                    await self.dispatcher.create_tasks(TaskType.FIND_SONGS, "anime_id", self._unprocessed_animes_stmt())
+                    animes = await self._claim_animes(self.batch_size)
+                    logger.info(f"claimed {len(animes)} animes: {[anime.title_ro for _, anime, _ in animes]}")
+                    if executor is not None:
+                        await self._process_animes_pipeline(animes, executor)
+                    else:
+                        pages = await self._prefetch_pages(animes)
+                        for task, anime, anidb_id in animes:
+                            logger.info(f"processing {anime.title_ro} (id={anime.id})")
+                            await self._process_anime(task, anime, anidb_id, pages.get(anime.id))
+                    await wakeup.wait(idle=not animes)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            await client.close()
+
+    async def _process_animes_pipeline(
+        self, animes: list[tuple[TaskQueue, Anime, int]], executor: ProcessPoolExecutor
+    ) -> None:
+        """Fetch pages concurrently, parse them in the process pool and store results through a single writer"""
+        if not animes:
             return
+        cached = await anidb.get_page.prefetch(anidb_id for _, _, anidb_id in animes)
+
+        loop = asyncio.get_running_loop()
+        parse_semaphore = asyncio.Semaphore(self.concurrency)
+        queue: asyncio.Queue[Optional[ProcessingResult]] = asyncio.Queue()
+        writer = asyncio.create_task(self._songs_writer(queue))
+
+        async def process(task: TaskQueue, anime: Anime, anidb_id: int) -> None:
+            try:
+                # cache misses are throttled by anidb rate limiter only
+                html = cached[anidb_id] if anidb_id in cached else await anidb.get_page(anidb_id)
+                if html is None:
+                    raise RuntimeError(f"can't get anidb page for anidb_id={anidb_id}")
+                async with parse_semaphore:
+                    songs = await loop.run_in_executor(executor, anidb.parse_songs, html, anidb_id)
+                for song in songs:
+                    song.anime_id = anime.id
+                await queue.put((task, anime, songs))
+            except Exception as e:
+                await queue.put((task, anime, e))
 
         try:
-            songs = await self.get_songs(anime)
-        except Exception as e:
-            logger.warning(f"exception occured during song list extraction from anidb page: {e}")
-
-            async with self.engine.async_session() as session:
-                session.add(
-                    WorkerResult(
-                        worker_name=self.name,
-                        anime_id=anime.id,
-                        status=WorkerResultStatus.FAIL_INVALID,
-                    )
-                )
-                await session.commit()
-                return
-
+            await asyncio.gather(*(process(task, anime, anidb_id) for task, anime, anidb_id in animes))
+        finally:
+            await queue.put(None)
+            await writer
+
+    async def _songs_writer(self, queue: asyncio.Queue[Optional[ProcessingResult]]) -> None:
+        """Write everything available in the queue in one transaction, until None is received"""
+        done = False
+        while not done:
+            items = [await queue.get()]
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            if items[-1] is None:
+                done = True
+                items.pop()
+            if items:
+                await self._store_results(items)
+
+    async def _store_results(self, items: list[ProcessingResult]) -> None:
+        anime_ids = [anime.id for _, anime, _ in items]
         async with self.engine.async_session() as session:
-            # filter out existings songs
-            existings_songs = await session.scalars(select(Song).where(Song.anime_id == anime.id))
-
-            existing_songs_dict = self._transform_songs_to_dict(existings_songs)
-            songs_dict = self._transform_songs_to_dict(songs)
-
-            songs_to_add_dict = {k: v for k, v in songs_dict.items() if k not in existing_songs_dict}
-            filtered_songs_dict = {k: v for k, v in songs_dict.items() if k in existing_songs_dict}
-
-            logger.info(
-                f"adding songs {list(songs_to_add_dict.keys())} "
-                f"(found, but already exist {list(filtered_songs_dict.keys())})"
-            )
-
-            session.add_all(list(songs_to_add_dict.values()))
-            session.add(
-                WorkerResult(
-                    worker_name=self.name,
-                    anime_id=anime.id,
-                    status=WorkerResultStatus.SUCCESS,
+            # recheck in the writing transaction, anime could have been changed or processed since it was selected
+            needing_processing = set(
+                await session.scalars(
+                    select(Anime.id).where(
+                        self._does_anime_need_processing_clause(),
+                        self._is_anime_processed_clause(),
+                        Anime.id.in_(anime_ids),
+                    )
                 )
             )
+            existing_songs: dict[int, list[Song]] = {}
+            for song in await session.scalars(select(Song).where(Song.anime_id.in_(anime_ids))):
+                existing_songs.setdefault(song.anime_id, []).append(song)
+
+            for task, anime, result in items:
+                if anime.id not in needing_processing:
+                    await self.dispatcher.cancel(session, task)
+                    continue
+                if isinstance(result, Exception):
+                    logger.warning(f"exception occured during song list extraction for {anime.title_ro}: {result}")
+                    temporary = isinstance(result, (ClientError, TimeoutError))
+                    status = WorkerResultStatus.FAIL_TEMPORARY if temporary else WorkerResultStatus.FAIL_INVALID
+                    await self.dispatcher.fail(session, task, result, temporary)
+                else:
+                    existing_songs_dict = self._transform_songs_to_dict(existing_songs.get(anime.id, []))
+                    songs_dict = self._transform_songs_to_dict(result)
+
+                    songs_to_add_dict = {k: v for k, v in songs_dict.items() if k not in existing_songs_dict}
+                    filtered_songs_dict = {k: v for k, v in songs_dict.items() if k in existing_songs_dict}
+
+                    logger.info(
+                        f"adding songs {list(songs_to_add_dict.keys())} for {anime.title_ro} (id={anime.id}) "
+                        f"(found, but already exist {list(filtered_songs_dict.keys())})"
+                    )
+                    session.add_all(list(songs_to_add_dict.values()))
+                    status = WorkerResultStatus.SUCCESS
+                    await self.dispatcher.complete(session, task)
+                session.add(WorkerResult(worker_name=self.name, anime_id=anime.id, status=status))
             await session.commit()
 
-    async def get_songs(self, anime: Anime) -> list[Song]:
-        async with self.engine.async_session() as session:
-            anidb_id = await session.scalar(
-                select(IDMapping.value).where(IDMapping.anime_id == anime.id, IDMapping.platform == Platform.ANIDB)
-            )
-            if anidb_id is None:
-                raise RuntimeError(f"can't find anidb_id for anime with id={anime.id}")
-        songs = (await anidb.Page.from_id(anidb_id)).songs
+    async def _prefetch_pages(self, animes: list[tuple[TaskQueue, Anime, int]]) -> dict[int, anidb.Page]:
+        """Fetch anidb pages for the whole batch, so cache hits cost one round trip"""
+        if not animes:
+            return {}
+        try:
+            pages = await anidb.Page.from_ids([anidb_id for _, _, anidb_id in animes])
+        except Exception as e:
+            logger.warning(f"exception occured during anidb pages prefetch: {e}")
+            return {}
+        return {anime.id: page for (_, anime, _), page in zip(animes, pages, strict=True) if page is not None}
+
+    async def _process_anime(
+        self, task: TaskQueue, anime: Anime, anidb_id: int, page: Optional[anidb.Page] = None
+    ) -> None:
+        try:
+            result = await self.get_songs(anime, anidb_id, page)
+        except Exception as e:
+            result = e
+        await self._store_results([(task, anime, result)])
+
+    async def get_songs(self, anime: Anime, anidb_id: int, page: Optional[anidb.Page] = None) -> list[Song]:
+        if page is None:
+            page = await anidb.Page.from_id(anidb_id)
+        songs = page.songs
         for song in songs:
             song.anime_id = anime.id
         return songs
 
     def _is_anime_processed_clause(self) -> ColumnElement:
-        processed_anime_subquery = (
-            select(WorkerResult.anime_id)
+        processed_anime = (
+            select(WorkerResult.id)
             .where(
                 WorkerResult.worker_name == self.name,
-                WorkerResult.anime_id.is_not(None),
+                WorkerResult.anime_id == Anime.id,
                 WorkerResult.status != WorkerResultStatus.FAIL_TEMPORARY,
             )
-            .scalar_subquery()
+            .exists()
         )
 
-        return Anime.id.not_in(processed_anime_subquery)
+        return ~processed_anime
 
     def _does_anime_need_processing_clause(self) -> ColumnElement:
-        anime_with_anidb_id_subquery = (
-            select(IDMapping.anime_id).where(IDMapping.platform == Platform.ANIDB).scalar_subquery()
+        anime_with_anidb_id = (
+            select(IDMapping.id).where(IDMapping.anime_id == Anime.id, IDMapping.platform == Platform.ANIDB).exists()
         )
-        return and_(Anime.status == AnimeStatus.NORMAL, Anime.id.in_(anime_with_anidb_id_subquery))
+        return and_(Anime.status == AnimeStatus.NORMAL, anime_with_anidb_id)
 
     def _unprocessed_animes_stmt(self) -> Select:
-        return (
-            select(Anime)
-            .where(self._does_anime_need_processing_clause(), self._is_anime_processed_clause())
-            .order_by(Anime.created_at.desc())
-        )
-
-    async def _get_unprocessed_animes(self, limit: int) -> list[Anime]:
-        async with self.engine.async_session() as session:
-            stmt = self._unprocessed_animes_stmt().limit(limit)
-            animes = (await session.scalars(stmt)).all()
-            session.expunge_all()
-        return animes
-
-    async def _does_anime_need_processing(self, anime: Anime) -> bool:
+        """Anti-join selecting ids of unprocessed animes, used to create tasks"""
+        return select(Anime.id).where(self._does_anime_need_processing_clause(), self._is_anime_processed_clause())
+
+    async def _claim_animes(self, limit: int) -> list[tuple[TaskQueue, Anime, int]]:
+        """Claim tasks and load their animes together with anidb id in one query"""
+        tasks = await self.dispatcher.claim([TaskType.FIND_SONGS], limit)
+        if not tasks:
+            return []
         async with self.engine.async_session() as session:
             stmt = (
-                select(func.count())
-                .select_from(Anime)
-                .where(self._does_anime_need_processing_clause(), Anime.id == anime.id)
+                select(Anime, IDMapping.value)
+                .join(IDMapping, and_(IDMapping.anime_id == Anime.id, IDMapping.platform == Platform.ANIDB))
+                .where(Anime.id.in_([task.anime_id for task in tasks]))
             )
-            count = await session.scalar(stmt)
-            return count > 0
+            animes: dict[int, tuple[Anime, int]] = {}
+            for anime, anidb_id in await session.execute(stmt):
+                # anime with several anidb ids is processed once, with the first one
+                animes.setdefault(anime.id, (anime, anidb_id))
+
+            for task in tasks:
+                if task.anime_id not in animes:
+                    await self.dispatcher.cancel(session, task)
+            # detach before commit, so loaded attributes are not expired
+            session.expunge_all()
+            await session.commit()
+        return [(task, *animes[task.anime_id]) for task in tasks if task.anime_id in animes]
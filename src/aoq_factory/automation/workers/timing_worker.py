@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Optional
+
+from sqlalchemy import Select, and_, select
+from sqlalchemy.orm import aliased
+
+from aoq_factory.analysis.audio import AudioDecodeError
+from aoq_factory.analysis.feature_store import FeatureStore
+from aoq_factory.analysis.timing import ENERGY_ONSET, STRATEGIES, TimingResult
+from aoq_factory.analysis.video import VideoDecodeError
+from aoq_factory.automation.task_dispatcher import TaskDispatcher, default_worker_instance
+from aoq_factory.automation.wakeup import Wakeup
+from aoq_factory.config import get_settings
+from aoq_factory.database.connection import Engine
+from aoq_factory.database.models import Source, SourceStatus, TaskQueue, TaskType, Timing
+
+logger = logging.getLogger(__name__)
+
+
+class TimingWorker:
+    name: str = "timing_worker"
+
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int,
+        interval: float,
+        concurrency: Optional[int] = None,
+        worker_instance: Optional[str] = None,
+        max_interval: float = 300,
+        strategy: str = ENERGY_ONSET,
+        store: Optional[FeatureStore] = None,
+    ) -> None:
+        """Analyze downloaded sources in `concurrency` processes and store timings added by `strategy`"""
+        self.engine = engine
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_interval = max_interval
+        self.concurrency = concurrency
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown timing strategy {strategy}, expected one of {list(STRATEGIES)}")
+        self.strategy = strategy
+        self.store = store
+        self.dispatcher = TaskDispatcher(engine, worker_instance or default_worker_instance(self.name))
+
+    async def run(self) -> None:
+        executor = ProcessPoolExecutor(max_workers=self.concurrency)
+        try:
+            async with Wakeup(self.engine, self.interval, self.max_interval) as wakeup:
+                while True:
+                    await self.dispatcher.create_tasks(
+                        TaskType.ANALYZE_TIMING, "source_id", self._unprocessed_sources_stmt()
+                    )
+                    sources = await self._claim_sources(self.batch_size)
+                    logger.info(f"claimed {len(sources)} sources: {[source_id for _, source_id, _ in sources]}")
+                    if sources:
+                        await self._process_sources(sources, executor)
+                    await wakeup.wait(idle=not sources)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def _unprocessed_sources_stmt(self) -> Select:
+        """Downloaded sources without a timing of this strategy, used to create tasks"""
+        has_timing = select(Timing.id).where(Timing.source_id == Source.id, Timing.added_by == self.strategy).exists()
+        return select(Source.id).where(
+            Source.status == SourceStatus.DOWNLOADED, Source.local_path.is_not(None), ~has_timing
+        )
+
+    async def _claim_sources(self, limit: int) -> list[tuple[TaskQueue, int, str]]:
+        """Claim tasks with local paths of their sources, tasks of sources no longer downloaded are cancelled"""
+        tasks = await self.dispatcher.claim([TaskType.ANALYZE_TIMING], limit)
+        if not tasks:
+            return []
+        async with self.engine.async_session() as session:
+            paths: dict[int, str] = dict(
+                (
+                    await session.execute(
+                        select(Source.id, Source.local_path).where(
+                            Source.id.in_([task.source_id for task in tasks]),
+                            Source.status == SourceStatus.DOWNLOADED,
+                            Source.local_path.is_not(None),
+                        )
+                    )
+                ).tuples()
+            )
+            for task in tasks:
+                if task.source_id not in paths:
+                    await self.dispatcher.cancel(session, task)
+            await session.commit()
+        return [(task, task.source_id, paths[task.source_id]) for task in tasks if task.source_id in paths]
+
+    async def _duplicate_timings(self, source_ids: list[int]) -> dict[int, TimingResult]:
+        """Latest timing of this strategy of another source with the same content, for every source having one"""
+        other = aliased(Source)
+        stmt = (
+            select(Source.id, Timing.guess_start, Timing.reveal_start)
+            .join(other, and_(other.content_hash == Source.content_hash, other.id != Source.id))
+            .join(Timing, Timing.source_id == other.id)
+            .where(Source.id.in_(source_ids), Timing.added_by == self.strategy)
+            .order_by(Source.id, Timing.created_at.desc())
+            .distinct(Source.id)
+        )
+        async with self.engine.async_session() as session:
+            rows = (await session.execute(stmt)).tuples().all()
+        return {source_id: TimingResult(guess_start, reveal_start) for source_id, guess_start, reveal_start in rows}
+
+    async def _process_sources(self, sources: list[tuple[TaskQueue, int, str]], executor: ProcessPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        analyze = partial(STRATEGIES[self.strategy], ffmpeg=get_settings().ffmpeg_path, store=self.store)
+        reused = await self._duplicate_timings([source_id for _, source_id, _ in sources])
+        if reused:
+            logger.info(f"reusing timings of duplicates for sources {list(reused)}")
+        # deduplicated sources share a file, analyze it once
+        paths = list(dict.fromkeys(path for _, source_id, path in sources if source_id not in reused))
+        analyzed: list[TimingResult | BaseException] = await asyncio.gather(
+            *(loop.run_in_executor(executor, analyze, path) for path in paths), return_exceptions=True
+        )
+        results = dict(zip(paths, analyzed, strict=True))
+        async with self.engine.async_session() as session:
+            for task, source_id, path in sources:
+                result = reused[source_id] if source_id in reused else results[path]
+                if isinstance(result, BaseException):
+                    logger.warning(f"exception occured during timing analysis of {path}: {result}")
+                    # unreadable or too short files won't get better, anything else may be a hiccup of the host
+                    temporary = not isinstance(result, (AudioDecodeError, VideoDecodeError, ValueError))
+                    await self.dispatcher.fail(session, task, result, temporary)
+                    continue
+                logger.info(f"source {source_id}: guess_start={result.guess_start} reveal_start={result.reveal_start}")
+                session.add(
+                    Timing(
+                        source_id=source_id,
+                        guess_start=result.guess_start,
+                        reveal_start=result.reveal_start,
+                        added_by=self.strategy,
+                    )
+                )
+                await self.dispatcher.complete(session, task)
+            await session.commit()
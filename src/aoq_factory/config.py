@@ -1,4 +1,5 @@
 from functools import cache
+from typing import Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,11 +10,38 @@ class Settings(BaseSettings):
     db_password: str
     db_host: str
     db_port: int
+    db_replica_host: Optional[str] = None
+    db_replica_port: Optional[int] = None
+    db_replica_pin_seconds: float = 5
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_worker_pool_size: int = 5
+    db_worker_max_overflow: int = 5
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    db_pool_timeout: float = 30
+    db_prepared_statement_cache_size: int = 100
     resources_dir: str
+    ffmpeg_path: str = "ffmpeg"
+    feature_store_max_bytes: int = 10 * 1024**3
+    ffprobe_path: str = "ffprobe"
+    ytdlp_path: str = "yt-dlp"
+    downloads_dir: Optional[str] = None
+    download_disk_budget: int = 200 * 1024**3
+    download_per_host: int = 2
     anidb_request_interval: float
+    anidb_cache_codec: str = "zlib"
     idsmoe_api_key: str
     idsmoe_rate_limiter_max_rate: float
     idsmoe_rate_limiter_time_period: float
+    api_cache_size: int = 4096
+    api_cache_ttl: float = 300
+    http_limit: int = 100
+    http_limit_per_host: int = 8
+    http_keepalive_timeout: float = 30
+    http_dns_cache_ttl: int = 300
+    http_timeout: float = 60
+    http_connect_timeout: float = 10
 
     model_config = SettingsConfigDict(env_file=None)
 
@@ -1,41 +1,160 @@
+import enum
+import time
 from dataclasses import dataclass
 from typing import Any, Optional
 
 from cachetools import cached
+from cachetools.keys import hashkey
 from sqlalchemy import URL
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.pool.base import ConnectionPoolEntry
 
 from aoq_factory.config import get_settings
 
 
+class EngineRole(enum.Enum):
+    API = "api"
+    REPLICA = "replica"
+    WORKER = "worker"
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_time += elapsed
+            self.max_wait_time = max(self.max_wait_time, elapsed)
+
+
+@dataclass
+class PoolStats:
+    role: str
+    size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    checkouts: int
+    wait_time_total: float
+    wait_time_max: float
+    timeouts: int
+
+
 @dataclass
 class Engine:
     engine: AsyncEngine
     async_session: async_sessionmaker[AsyncSession]
+    role: EngineRole = EngineRole.API
+
+    def pool_stats(self) -> Optional[PoolStats]:
+        """Pool usage counters, None when engine doesn't use TimedQueuePool"""
+        pool = self.engine.pool
+        if not isinstance(pool, TimedQueuePool):
+            return None
+        return PoolStats(
+            role=self.role.value,
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            checkouts=pool.checkouts,
+            wait_time_total=pool.wait_time,
+            wait_time_max=pool.max_wait_time,
+            timeouts=pool.timeouts,
+        )
+
 
+# every engine created by get_engine, to report pool stats of the process
+engines: list[Engine] = []
 
-@cached(cache={}, key=lambda *args, **kwargs: ())
-def get_url() -> URL:
+
+@cached(cache={})
+def get_url(replica: bool = False) -> URL:
+    """URL of the primary, or of the read replica when replica is set and one is configured"""
     settings = get_settings()
+    host, port = settings.db_host, settings.db_port
+    if replica and settings.db_replica_host is not None:
+        host, port = settings.db_replica_host, settings.db_replica_port or settings.db_port
     return URL.create(
         drivername="postgresql+asyncpg",
         database=settings.db_name,
         username=settings.db_username,
         password=settings.db_password,
-        host=settings.db_host,
-        port=settings.db_port,
+        host=host,
+        port=port,
+    )
+
+
+def _engine_key(
+    role: EngineRole = EngineRole.API,
+    engine_kwargs: Optional[dict[str, Any]] = None,
+    session_kwargs: Optional[dict[str, Any]] = None,
+):
+    # kwargs are part of the key, callers with different kwargs get their own engine
+    return hashkey(role, repr(sorted((engine_kwargs or {}).items())), repr(sorted((session_kwargs or {}).items())))
+
+
+def _default_engine_kwargs(role: EngineRole) -> dict[str, Any]:
+    settings = get_settings()
+    if role is EngineRole.WORKER:
+        pool_size, max_overflow = settings.db_worker_pool_size, settings.db_worker_max_overflow
+    else:
+        # replica takes the read share of API traffic, sized like the API pool
+        pool_size, max_overflow = settings.db_pool_size, settings.db_max_overflow
+    return dict(
+        poolclass=TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_recycle=settings.db_pool_recycle,
+        pool_timeout=settings.db_pool_timeout,
+        connect_args={
+            "prepared_statement_cache_size": settings.db_prepared_statement_cache_size,
+            "server_settings": {"application_name": f"aoq_factory_{role.value}"},
+        },
     )
 
 
-@cached(cache={}, key=lambda *args, **kwargs: ())
+@cached(cache={}, key=_engine_key)
 def get_engine(
-    engine_kwargs: Optional[dict[str, Any]] = None, session_kwargs: Optional[dict[str, Any]] = None
+    role: EngineRole = EngineRole.API,
+    engine_kwargs: Optional[dict[str, Any]] = None,
+    session_kwargs: Optional[dict[str, Any]] = None,
 ) -> Engine:
-    engine = create_async_engine(get_url(), **(engine_kwargs or {}))
+    """Get engine with its own connection pool for role, engine_kwargs override pool settings"""
+    engine = create_async_engine(
+        get_url(replica=role is EngineRole.REPLICA), **(_default_engine_kwargs(role) | (engine_kwargs or {}))
+    )
     async_session = async_sessionmaker(bind=engine, **(session_kwargs or {}))
-    return Engine(engine, async_session)
+    result = Engine(engine, async_session, role)
+    engines.append(result)
+    return result
+
+
+def get_read_engine() -> Engine:
+    """Engine of the read replica, the primary API engine when no replica is configured"""
+    if get_settings().db_replica_host is None:
+        return get_engine()
+    return get_engine(EngineRole.REPLICA)
@@ -0,0 +1,69 @@
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import ColumnElement, and_, or_, select, true, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aoq_factory.database.models import AnimeInfo, Source
+
+
+def contains(column: Any, value: dict[str, Any]) -> ColumnElement[bool]:
+    """column @> value, answered by the jsonb_path_ops GIN index of the column"""
+    # the json variant of the column compares with LIKE, only the jsonb comparator knows @>
+    return type_coerce(column, JSONB).contains(value)
+
+
+def location_filter(platform: Optional[str] = None, url: Optional[str] = None, **fields: Any) -> ColumnElement[bool]:
+    """Sources whose location has all given values, true when none are given"""
+    value: dict[str, Any] = {key: item for key, item in fields.items() if item is not None}
+    if platform is not None:
+        value["platform"] = platform
+    if url is not None:
+        value["url"] = url
+    return contains(Source.location, value) if value else true()
+
+
+def anime_info_filter(source: Optional[str] = None, **fields: Any) -> ColumnElement[bool]:
+    """Anime infos from source whose data has all given top level values"""
+    conditions = []
+    if source is not None:
+        conditions.append(AnimeInfo.source == source)
+    if fields:
+        conditions.append(contains(AnimeInfo.data, fields))
+    return and_(true(), *conditions)
+
+
+def location_key(location: dict[str, Any]) -> dict[str, Any]:
+    """Values identifying the file of a location, the url of remote files and the path of local ones"""
+    key = {"platform": location["platform"]} if "platform" in location else {}
+    for name in ("url", "path"):
+        if name in location:
+            key[name] = location[name]
+            break
+    return key
+
+
+def _contains(location: dict[str, Any], key: dict[str, Any]) -> bool:
+    # same test as @>, so rows found by the probe are matched by the same rule
+    return all(name in location and location[name] == value for name, value in key.items())
+
+
+async def find_sources(session: AsyncSession, sources: Sequence[tuple[int, dict[str, Any]]]) -> list[Optional[int]]:
+    """Id of an existing source of the same song with the same location for every (song_id, location)
+
+    One query of index probes, sources of other songs may share a location, like deduplicated files
+    """
+    keys = [(song_id, location_key(location)) for song_id, location in sources]
+    probes = [and_(Source.song_id == song_id, contains(Source.location, key)) for song_id, key in keys if key]
+    if not probes:
+        return [None] * len(sources)
+    rows = (await session.execute(select(Source.id, Source.song_id, Source.location).where(or_(*probes)))).all()
+    return [
+        next((row.id for row in rows if row.song_id == song_id and _contains(row.location, key)), None) if key else None
+        for song_id, key in keys
+    ]
+
+
+async def find_source(session: AsyncSession, song_id: int, location: dict[str, Any]) -> Optional[int]:
+    """Id of an existing source of song_id with the same location"""
+    return (await find_sources(session, [(song_id, location)]))[0]
@@ -3,7 +3,7 @@ from datetime import datetime
 from typing import Any, ClassVar, Optional
 
 import sqlalchemy.types as types
-from sqlalchemy import CheckConstraint, ForeignKey, String, UniqueConstraint, func
+from sqlalchemy import CheckConstraint, ForeignKey, Index, String, UniqueConstraint, func, text
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
@@ -36,7 +36,8 @@ class Base(AsyncAttrs, DeclarativeBase):
         datetime: types.TIMESTAMP(timezone=True),
         list[str]: postgresql.ARRAY(String, dimensions=1, zero_indexes=True),
         list[list[str]]: postgresql.ARRAY(String, dimensions=2, zero_indexes=True),
-        dict[str, Any]: types.JSON(),
+        # jsonb on postgres, indexable and parsed once on write
+        dict[str, Any]: types.JSON().with_variant(postgresql.JSONB(), "postgresql"),
     }
 
     def __repr__(self):
@@ -68,6 +69,20 @@ class Anime(BaseWithID):
 
     worker_results: Mapped[list["WorkerResult"]] = relationship(back_populates="anime")
 
+    __table_args__ = (
+        # keyset pagination orders, id breaks ties
+        Index("ix_animes_title_ro_id", "title_ro", "id"),
+        Index("ix_animes_created_at_id", "created_at", "id"),
+        Index("ix_animes_updated_at_id", "updated_at", "id"),
+        # substring title search
+        Index(
+            "ix_animes_title_ro_trgm",
+            "title_ro",
+            postgresql_using="gin",
+            postgresql_ops={"title_ro": "gin_trgm_ops"},
+        ),
+    )
+
 
 class Platform(enum.Enum):
     MAL = enum.auto()
@@ -83,7 +98,10 @@ class IDMapping(BaseWithID):
 
     anime: Mapped[Anime] = relationship(back_populates="ids")
 
-    __table_args__ = (UniqueConstraint("value", "platform"),)
+    __table_args__ = (
+        UniqueConstraint("value", "platform"),
+        Index("ix_id_mappings_anime_id_platform", "anime_id", "platform"),
+    )
 
 
 class AnimeInfo(BaseWithID):
@@ -95,6 +113,10 @@ class AnimeInfo(BaseWithID):
 
     anime: Mapped[Anime] = relationship(back_populates="infos")
 
+    __table_args__ = (
+        Index("ix_anime_infos_data", "data", postgresql_using="gin", postgresql_ops={"data": "jsonb_path_ops"}),
+    )
+
 
 class Category(enum.Enum):
     OP = enum.auto()
@@ -128,21 +150,36 @@ class SourceStatus(enum.Enum):
 class Source(BaseWithID):
     __tablename__ = "sources"
 
-    song_id: Mapped[int] = mapped_column(ForeignKey("songs.id"))
+    song_id: Mapped[int] = mapped_column(ForeignKey("songs.id"), index=True)
     location: Mapped[dict[str, Any]]
     local_path: Mapped[Optional[str]]
     status: Mapped[SourceStatus] = mapped_column(default=SourceStatus.NORMAL)
     added_by: Mapped[str]
+    # fingerprint of the downloaded file, duplicates share local_path
+    content_size: Mapped[Optional[int]] = mapped_column(types.BigInteger)
+    partial_hash: Mapped[Optional[str]]
+    content_hash: Mapped[Optional[str]] = mapped_column(index=True)
 
     song: Mapped[Song] = relationship(back_populates="sources")
     timings: Mapped[list["Timing"]] = relationship(back_populates="source", cascade="all, delete")
     worker_results: Mapped[list["WorkerResult"]] = relationship(back_populates="source")
 
+    __table_args__ = (
+        Index("ix_sources_content_size_partial_hash", "content_size", "partial_hash"),
+        # containment lookups of locations, like an already known url
+        Index(
+            "ix_sources_location",
+            "location",
+            postgresql_using="gin",
+            postgresql_ops={"location": "jsonb_path_ops"},
+        ),
+    )
+
 
 class Timing(BaseWithID):
     __tablename__ = "timings"
 
-    source_id: Mapped[int] = mapped_column(ForeignKey("sources.id"))
+    source_id: Mapped[int] = mapped_column(ForeignKey("sources.id"), index=True)
     guess_start: Mapped[float]
     reveal_start: Mapped[float]
     added_by: Mapped[str]
@@ -153,13 +190,25 @@ class Timing(BaseWithID):
 class Level(BaseWithID):
     __tablename__ = "levels"
 
-    song_id: Mapped[int] = mapped_column(ForeignKey("songs.id"))
+    song_id: Mapped[int] = mapped_column(ForeignKey("songs.id"), index=True)
     value: Mapped[int]
     added_by: Mapped[str]
+    # inputs the difficulty engine scored, unset for levels added by hand
+    inputs_hash: Mapped[Optional[str]]
 
     song: Mapped[Song] = relationship(back_populates="levels")
 
-    __table_args__ = (CheckConstraint("value >= 0 AND value <= 100", name="value_range"),)
+    __table_args__ = (
+        CheckConstraint("value >= 0 AND value <= 100", name="value_range"),
+        # one engine level per strategy, target of its upserts
+        Index(
+            "ix_levels_song_id_added_by_scored",
+            "song_id",
+            "added_by",
+            unique=True,
+            postgresql_where=text("inputs_hash IS NOT NULL"),
+        ),
+    )
 
 
 class WorkerResultStatus(enum.Enum):
@@ -190,4 +239,92 @@ class WorkerResult(BaseWithID):
             """,
             name="only_one_reference",
         ),
+        Index("ix_worker_results_worker_name_anime_id_status", "worker_name", "anime_id", "status"),
+    )
+
+
+class TaskType(enum.Enum):
+    FIND_SONGS = enum.auto()
+    FIND_SOURCES = enum.auto()
+    DOWNLOAD_SOURCE = enum.auto()
+    ANALYZE_TIMING = enum.auto()
+    ASSESS_DIFFICULTY = enum.auto()
+    MONITOR_TORRENT = enum.auto()
+
+
+class TaskStatus(enum.Enum):
+    PENDING = enum.auto()
+    ASSIGNED = enum.auto()
+    COMPLETED = enum.auto()
+    FAILED = enum.auto()
+    CANCELLED = enum.auto()
+
+
+class TaskQueue(BaseWithID):
+    __tablename__ = "task_queue"
+
+    task_type: Mapped[TaskType]
+    status: Mapped[TaskStatus] = mapped_column(default=TaskStatus.PENDING)
+    anime_id: Mapped[Optional[int]] = mapped_column(ForeignKey("animes.id", ondelete="CASCADE"))
+    song_id: Mapped[Optional[int]] = mapped_column(ForeignKey("songs.id", ondelete="CASCADE"))
+    source_id: Mapped[Optional[int]] = mapped_column(ForeignKey("sources.id", ondelete="CASCADE"))
+    attempt_count: Mapped[int] = mapped_column(default=0)
+    max_attempts: Mapped[int] = mapped_column(default=5)
+    scheduled_after: Mapped[datetime] = mapped_column(server_default=func.now())
+    data: Mapped[Optional[dict[str, Any]]]
+
+    assignment: Mapped[Optional["TaskAssignment"]] = relationship(back_populates="task", cascade="all, delete")
+    results: Mapped[list["TaskResult"]] = relationship(back_populates="task", cascade="all, delete")
+
+    __table_args__ = (
+        CheckConstraint(
+            """
+            (CASE WHEN anime_id IS NOT NULL THEN 1 ELSE 0 END +
+             CASE WHEN song_id IS NOT NULL THEN 1 ELSE 0 END +
+             CASE WHEN source_id IS NOT NULL THEN 1 ELSE 0 END) = 1
+            """,
+            name="only_one_reference",
+        ),
+        # claim query scans only pending tasks
+        Index(
+            "ix_task_queue_pending",
+            "task_type",
+            "scheduled_after",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+        # at most one active task of each type per entity
+        *(
+            Index(
+                f"ix_task_queue_active_{column}",
+                "task_type",
+                column,
+                unique=True,
+                postgresql_where=text(f"status IN ('PENDING', 'ASSIGNED') AND {column} IS NOT NULL"),
+            )
+            for column in ("anime_id", "song_id", "source_id")
+        ),
     )
+
+
+class TaskAssignment(BaseWithID):
+    __tablename__ = "task_assignments"
+
+    task_id: Mapped[int] = mapped_column(ForeignKey("task_queue.id", ondelete="CASCADE"), unique=True)
+    worker_instance: Mapped[str]
+    assigned_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    task: Mapped[TaskQueue] = relationship(back_populates="assignment")
+
+
+class TaskResult(BaseWithID):
+    __tablename__ = "task_results"
+
+    task_id: Mapped[int] = mapped_column(ForeignKey("task_queue.id", ondelete="CASCADE"), index=True)
+    worker_instance: Mapped[str]
+    status: Mapped[WorkerResultStatus]
+    error_type: Mapped[Optional[str]]
+    error_message: Mapped[Optional[str]]
+    started_at: Mapped[Optional[datetime]]
+    completed_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    task: Mapped[TaskQueue] = relationship(back_populates="results")
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from aiohttp import ClientSession, TCPConnector, web
+
+from .downloaders import HostLimits, download_http
+
+
+class StandInServer:
+    """Serves random files with range support, cutting the first response of every file after drop_fraction"""
+
+    def __init__(self, files: int, size: int, drop_fraction: float) -> None:
+        self.files = [os.urandom(size) for _ in range(files)]
+        self.drop_fraction = drop_fraction
+        self.dropped: set[int] = set()
+        self.range_requests = 0
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        index = int(request.match_info["index"])
+        data = self.files[index]
+        offset = 0
+        if request.http_range.start is not None:
+            offset = request.http_range.start
+            self.range_requests += 1
+            if offset >= len(data):
+                return web.Response(status=416)
+        response = web.StreamResponse(status=206 if offset else 200)
+        response.content_length = len(data) - offset
+        if offset:
+            response.headers["Content-Range"] = f"bytes {offset}-{len(data) - 1}/{len(data)}"
+        await response.prepare(request)
+        end = len(data)
+        if self.drop_fraction and index not in self.dropped:
+            self.dropped.add(index)
+            end = offset + int((len(data) - offset) * self.drop_fraction)
+        for start in range(offset, end, 1 << 16):
+            await response.write(data[start : min(start + (1 << 16), end)])
+        if end < len(data):
+            # abort mid body, the client sees a truncated payload
+            request.transport.close()
+        return response
+
+
+async def run(files: int, size: int, concurrency: int, per_host: int, drop_fraction: float) -> None:
+    server = StandInServer(files, size, drop_fraction)
+    app = web.Application()
+    app.router.add_get("/{index}.mp4", server.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    limits = HostLimits(per_host)
+    semaphore = asyncio.Semaphore(concurrency)
+    with tempfile.TemporaryDirectory() as directory:
+        async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+
+            async def fetch(index: int) -> str:
+                async with semaphore, limits("127.0.0.1"):
+                    url = f"http://127.0.0.1:{port}/{index}.mp4"
+                    return await download_http(session, url, os.path.join(directory, f"{index}.mp4"))
+
+            wall = time.perf_counter()
+            paths = await asyncio.gather(*(fetch(index) for index in range(files)))
+            wall = time.perf_counter() - wall
+
+        corrupt = 0
+        for index, path in enumerate(paths):
+            with open(path, "rb") as f:
+                if f.read() != server.files[index]:
+                    corrupt += 1
+    await runner.cleanup()
+
+    total = files * size
+    print(f"{files} files, {total / 1024**2:.0f} MiB in {wall:.2f}s, {total / 1024**2 / wall:.0f} MiB/s")
+    print(f"{server.range_requests} resumed with range requests, {corrupt} corrupt files")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure download throughput and resume against a local server")
+    parser.add_argument("--files", type=int, default=32)
+    parser.add_argument("--size", type=int, default=16 * 1024**2, help="bytes per file")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--per-host", type=int, default=8, help="downloads at once from the server")
+    parser.add_argument("--drop", type=float, default=0.5, help="fraction sent before cutting the first response")
+    args = parser.parse_args()
+    asyncio.run(run(args.files, args.size, args.concurrency, args.per_host, args.drop))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import logging
+import os
+
+from sqlalchemy import Select, select, update
+
+from aoq_factory.database.connection import Engine
+from aoq_factory.database.models import Source, SourceStatus, TaskQueue, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+
+def directory_size(directory: str) -> int:
+    """Total size of files under directory, partial downloads included"""
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class DiskBudget:
+    """Keeps files downloaded to directory within max_bytes
+
+    Evicts least recently updated downloaded sources that no active task needs. Evicted sources
+    go back to NORMAL without a local path, files outside directory are never touched
+    """
+
+    def __init__(self, engine: Engine, directory: str, max_bytes: int) -> None:
+        self.engine = engine
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+
+    def _evictable_stmt(self, limit: int) -> Select:
+        active_task = (
+            select(TaskQueue.id)
+            .where(
+                TaskQueue.source_id == Source.id,
+                TaskQueue.status.in_([TaskStatus.PENDING, TaskStatus.ASSIGNED]),
+            )
+            .exists()
+        )
+        return (
+            select(Source.id, Source.local_path)
+            .where(
+                Source.status == SourceStatus.DOWNLOADED,
+                Source.local_path.startswith(self.directory + os.sep),
+                ~active_task,
+            )
+            .order_by(Source.updated_at, Source.id)
+            .limit(limit)
+        )
+
+    async def ensure(self, reserve: int = 0, batch_size: int = 100) -> int:
+        """Evict until reserve more bytes fit in the budget, returns number of evicted sources"""
+        used = directory_size(self.directory)
+        evicted = 0
+        while used + reserve > self.max_bytes:
+            async with self.engine.async_session() as session:
+                candidates = (await session.execute(self._evictable_stmt(batch_size))).tuples().all()
+                chosen: dict[int, int] = {}
+                paths: dict[int, str] = {}
+                for source_id, path in candidates:
+                    if used + reserve - sum(chosen.values()) <= self.max_bytes:
+                        break
+                    try:
+                        chosen[source_id] = os.path.getsize(path)
+                    except OSError:
+                        chosen[source_id] = 0
+                    paths[source_id] = path
+                if not chosen:
+                    logger.warning(f"{self.directory} uses {used} bytes but no downloaded source can be evicted")
+                    return evicted
+                # status changes first, so a path is never referenced after its file is removed
+                evicted_ids = (
+                    await session.scalars(
+                        update(Source)
+                        .where(Source.id.in_(chosen), Source.status == SourceStatus.DOWNLOADED)
+                        .values(status=SourceStatus.NORMAL, local_path=None)
+                        .returning(Source.id)
+                    )
+                ).all()
+                # deduplicated sources share files, which are removed with their last downloaded source,
+                # sources still DOWNLOADING reference the files they were just linked to
+                shared = set(
+                    (
+                        await session.scalars(
+                            select(Source.local_path).where(
+                                Source.local_path.in_({paths[source_id] for source_id in evicted_ids}),
+                                Source.status.in_([SourceStatus.DOWNLOADED, SourceStatus.DOWNLOADING]),
+                            )
+                        )
+                    ).all()
+                )
+                await session.commit()
+            for source_id in evicted_ids:
+                if paths[source_id] in shared:
+                    continue
+                try:
+                    os.remove(paths[source_id])
+                except FileNotFoundError:
+                    pass
+                used -= chosen[source_id]
+                shared.add(paths[source_id])
+            evicted += len(evicted_ids)
+            logger.info(f"evicted {len(evicted_ids)} downloaded sources, {used} bytes used of {self.max_bytes}")
+        return evicted
@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aoq_factory.database.models import Source, SourceStatus
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_CHUNK = 1 << 20
+
+
+def partial_hash(path: str, chunk_size: int = PARTIAL_CHUNK) -> tuple[int, str]:
+    """Size and hash of the first, middle and last chunk, whole file when it's not larger than three chunks"""
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=16)
+    with open(path, "rb") as f:
+        if size <= 3 * chunk_size:
+            digest.update(f.read())
+        else:
+            for offset in (0, (size - chunk_size) // 2, size - chunk_size):
+                f.seek(offset)
+                digest.update(f.read(chunk_size))
+    return size, digest.hexdigest()
+
+
+def content_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=20)).hexdigest()
+
+
+@dataclass
+class Fingerprint:
+    local_path: str
+    content_size: int
+    partial_hash: str
+    content_hash: Optional[str] = None
+
+
+async def deduplicate(session: AsyncSession, source_id: int, path: str, owned: bool = True) -> Fingerprint:
+    """Fingerprint path and point it at the copy of a downloaded source with equal content, if there is one
+
+    Files are fully hashed only when size and partial hash collide. An owned duplicate is removed in
+    favor of the existing copy, files not owned by the downloader are kept but get their full hash,
+    which is enough to reuse results of the other source. Hashes computed for existing copies and
+    the path of a linked copy are stored through the caller's transaction, the copies stay locked
+    until it commits, so disk budget eviction sees the new reference before removing a shared file
+    """
+    size, partial = await asyncio.to_thread(partial_hash, path)
+    fingerprint = Fingerprint(path, size, partial)
+    rows = await session.execute(
+        select(Source.local_path, Source.content_hash)
+        .where(
+            Source.content_size == size,
+            Source.partial_hash == partial,
+            Source.status == SourceStatus.DOWNLOADED,
+            Source.local_path.is_not(None),
+            Source.local_path != path,
+            Source.id != source_id,
+        )
+        .with_for_update()
+    )
+    # FOR UPDATE can't be combined with DISTINCT
+    candidates: dict[str, Optional[str]] = {}
+    for other_path, other_hash in rows:
+        candidates[other_path] = candidates.get(other_path) or other_hash
+    for other_path, other_hash in candidates.items():
+        if fingerprint.content_hash is None:
+            fingerprint.content_hash = await asyncio.to_thread(content_hash, path)
+        if other_hash is None:
+            try:
+                other_hash = await asyncio.to_thread(content_hash, other_path)
+            except OSError as e:
+                logger.warning(f"can't hash {other_path}: {e}")
+                continue
+            await session.execute(update(Source).where(Source.local_path == other_path).values(content_hash=other_hash))
+        if other_hash != fingerprint.content_hash:
+            continue
+        logger.info(f"source {source_id}: {path} duplicates {other_path}")
+        if owned:
+            if not os.path.samefile(path, other_path):
+                os.remove(path)
+            fingerprint.local_path = other_path
+            await session.execute(update(Source).where(Source.id == source_id).values(local_path=other_path))
+        break
+    return fingerprint
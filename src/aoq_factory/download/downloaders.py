@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from aiohttp import ClientError, ClientSession
+
+logger = logging.getLogger(__name__)
+
+# a location is {"platform": "local", "path": ...} for files already on disk, {"platform": "http", "url": ...}
+# for direct links and {"platform": ..., "url": ...} for any page yt-dlp can extract a video from
+LOCAL = "local"
+HTTP = "http"
+
+# yt-dlp errors retrying won't fix
+PERMANENT_YTDLP_ERRORS = (
+    "Unsupported URL",
+    "Video unavailable",
+    "Private video",
+    "This video is not available",
+    "removed",
+    "copyright",
+)
+
+
+class DownloadError(Exception):
+    def __init__(self, message: str, temporary: bool = True) -> None:
+        super().__init__(message)
+        self.temporary = temporary
+
+
+def location_host(location: dict[str, Any]) -> str:
+    """Host downloads of location are limited by, local files share one slot group"""
+    if location.get("platform") == LOCAL:
+        return LOCAL
+    return urlsplit(location.get("url", "")).hostname or ""
+
+
+class HostLimits:
+    """Semaphores limiting concurrent downloads per host"""
+
+    def __init__(self, limit: int) -> None:
+        self._semaphores: defaultdict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(limit))
+
+    def __call__(self, host: str) -> asyncio.Semaphore:
+        return self._semaphores[host]
+
+
+async def _fetch_http(session: ClientSession, url: str, part: str, chunk_size: int) -> None:
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    async with session.get(url, headers=headers) as response:
+        if response.status == 416 and offset:
+            # nothing left after offset, the part file is complete
+            return
+        if response.status >= 400:
+            temporary = response.status >= 500 or response.status in (408, 429)
+            raise DownloadError(f"HTTP {response.status} for {url}", temporary)
+        if response.status != 206:
+            # server ignored the range, start over
+            offset = 0
+        received = 0
+        with open(part, "ab" if offset else "wb") as f:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                f.write(chunk)
+                received += len(chunk)
+        if response.content_length is not None and received < response.content_length:
+            raise DownloadError(f"connection closed after {offset + received} bytes of {url}")
+
+
+async def download_http(
+    session: ClientSession, url: str, path: str, attempts: int = 3, chunk_size: int = 1 << 20
+) -> str:
+    """Download url to path through a .part file, resuming it with a range request after interruptions"""
+    part = f"{path}.part"
+    for attempt in range(1, attempts + 1):
+        try:
+            await _fetch_http(session, url, part, chunk_size)
+            break
+        except DownloadError as e:
+            if not e.temporary or attempt == attempts:
+                raise
+            logger.info(f"resuming {url} after {e}")
+        except (ClientError, TimeoutError) as e:
+            if attempt == attempts:
+                raise DownloadError(f"{type(e).__name__}: {e}") from e
+            logger.info(f"resuming {url} after {type(e).__name__}: {e}")
+    os.replace(part, path)
+    return path
+
+
+async def download_ytdlp(url: str, directory: str, stem: str, ytdlp: str = "yt-dlp") -> str:
+    """Download video of the page at url with yt-dlp, which resumes its own .part files"""
+    cmd = [
+        ytdlp,
+        "--no-playlist",
+        "--continue",
+        "--no-progress",
+        "--format",
+        "bv*+ba/b",
+        "--output",
+        os.path.join(directory, f"{stem}.%(ext)s"),
+        "--print",
+        "after_move:filepath",
+        "--",
+        url,
+    ]
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError as e:
+        raise DownloadError(f"yt-dlp not found: {ytdlp}", temporary=False) from e
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        message = stderr.decode(errors="replace").strip() or f"yt-dlp exited with {proc.returncode}"
+        raise DownloadError(message, temporary=not any(error in message for error in PERMANENT_YTDLP_ERRORS))
+    lines = stdout.decode(errors="replace").strip().splitlines()
+    if not lines or not os.path.exists(lines[-1]):
+        raise DownloadError(f"yt-dlp didn't report the file of {url}")
+    return lines[-1]
+
+
+@dataclass
+class ProbeResult:
+    duration: float
+    video_codec: Optional[str]
+    audio_codec: Optional[str]
+
+
+async def probe(path: str, ffprobe: str = "ffprobe") -> ProbeResult:
+    cmd = [
+        ffprobe,
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration:stream=codec_type,codec_name",
+        "-of",
+        "json",
+        path,
+    ]
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError as e:
+        raise DownloadError(f"ffprobe not found: {ffprobe}", temporary=False) from e
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        message = stderr.decode(errors="replace").strip() or f"ffprobe exited with {proc.returncode}"
+        raise DownloadError(f"unreadable file {path}: {message}", temporary=False)
+    data = json.loads(stdout)
+    codecs = {stream.get("codec_type"): stream.get("codec_name") for stream in reversed(data.get("streams", []))}
+    return ProbeResult(
+        duration=float(data.get("format", {}).get("duration") or 0),
+        video_codec=codecs.get("video"),
+        audio_codec=codecs.get("audio"),
+    )
+
+
+async def verify(path: str, ffprobe: str = "ffprobe", min_duration: float = 30, max_duration: float = 600) -> None:
+    """Check that path has audio and video streams and a plausible duration for an opening or ending"""
+    result = await probe(path, ffprobe)
+    if result.video_codec is None or result.audio_codec is None:
+        raise DownloadError(f"{path} lacks a video or audio stream", temporary=False)
+    if not min_duration <= result.duration <= max_duration:
+        raise DownloadError(f"{path} lasts {result.duration:.1f}s", temporary=False)
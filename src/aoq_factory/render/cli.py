@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from aoq_factory.config import get_settings
+from aoq_factory.database.connection import get_read_engine
+
+from .renderer import QuizItem, QuizRenderer, load_quiz_items
+from .template import RenderTemplate
+
+logger = logging.getLogger(__name__)
+
+
+async def load_items(
+    song_ids: list[int], timing_added_by: Optional[str], level_added_by: Optional[str]
+) -> list[QuizItem]:
+    engine = get_read_engine()
+    try:
+        async with engine.async_session() as session:
+            return await load_quiz_items(session, song_ids, timing_added_by, level_added_by)
+    finally:
+        await engine.engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render a quiz video from songs with downloaded sources and timings")
+    parser.add_argument("songs", type=int, nargs="+", help="song ids in quiz order")
+    parser.add_argument("--output", required=True, help="quiz video file")
+    parser.add_argument("--template", default=None, help="template json, default template if omitted")
+    parser.add_argument("--cache-dir", default=None, help="rendered segments, segments in resources_dir by default")
+    parser.add_argument("--concurrency", type=int, default=None, help="segments encoded at once")
+    parser.add_argument("--timing-strategy", default=None, help="use only timings added by this strategy")
+    parser.add_argument("--level-strategy", default=None, help="use only levels added by this strategy")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+    template = RenderTemplate.load(args.template) if args.template else RenderTemplate()
+    items = asyncio.run(load_items(args.songs, args.timing_strategy, args.level_strategy))
+    renderer = QuizRenderer(
+        template,
+        args.cache_dir or os.path.join(settings.resources_dir, "segments"),
+        args.concurrency,
+        settings.ffmpeg_path,
+    )
+    renderer.render(items, args.output)
+
+
+if __name__ == "__main__":
+    main()
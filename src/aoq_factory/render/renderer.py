@@ -0,0 +1,261 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from aoq_factory.database.models import Song, Source, SourceStatus
+
+from .template import RenderTemplate
+
+logger = logging.getLogger(__name__)
+
+
+class RenderError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class QuizItem:
+    """One song of a quiz with its chosen source, timing and level"""
+
+    song_id: int
+    source_id: int
+    timing_id: int
+    local_path: str
+    guess_start: float
+    reveal_start: float
+    title: str
+    label: str
+    song: str = ""
+    level: Optional[int] = None
+
+    @property
+    def guess_duration(self) -> float:
+        return self.reveal_start - self.guess_start
+
+    def values(self, template: RenderTemplate) -> dict[str, object]:
+        """Placeholder values of template filters"""
+        return {
+            "guess_duration": f"{self.guess_duration:.3f}",
+            "reveal_duration": f"{template.reveal_duration:.3f}",
+            "title": self.title,
+            "label": self.label,
+            "song": self.song,
+            "level": "" if self.level is None else self.level,
+        }
+
+
+def segment_key(item: QuizItem, template: RenderTemplate) -> str:
+    """Cache key of a rendered segment, changes with its source, timing, template or overlay texts"""
+    data = {
+        "source_id": item.source_id,
+        "local_path": item.local_path,
+        "guess_start": item.guess_start,
+        "reveal_start": item.reveal_start,
+        "template": template.hash,
+        "values": item.values(template),
+    }
+    return hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=12).hexdigest()
+
+
+def segment_command(item: QuizItem, template: RenderTemplate, output: str, ffmpeg: str = "ffmpeg") -> list[str]:
+    duration = item.guess_duration + template.reveal_duration
+    return [
+        ffmpeg,
+        "-nostdin",
+        "-v",
+        "error",
+        "-y",
+        # input seeking, decoding starts at the keyframe before guess_start
+        "-ss",
+        f"{item.guess_start:.3f}",
+        "-t",
+        f"{duration:.3f}",
+        "-i",
+        item.local_path,
+        "-filter_complex",
+        f"[0:v]{template.video_filter(item.values(template))}[v];[0:a]{template.audio_filter(duration)}[a]",
+        "-map",
+        "[v]",
+        "-map",
+        "[a]",
+        *template.encoder_args(),
+        "-f",
+        "mp4",
+        output,
+    ]
+
+
+def run_ffmpeg(cmd: list[str]) -> None:
+    try:
+        proc = subprocess.run(cmd, capture_output=True, check=False)
+    except FileNotFoundError as e:
+        raise RenderError(f"ffmpeg not found: {cmd[0]}") from e
+    if proc.returncode != 0:
+        raise RenderError(proc.stderr.decode(errors="replace").strip() or f"ffmpeg exited with {proc.returncode}")
+
+
+def render_segment(item: QuizItem, template: RenderTemplate, output: str, ffmpeg: str = "ffmpeg") -> str:
+    """Encode the guess and reveal of item to output, written under a temporary name until complete"""
+    tmp = f"{output}.tmp"
+    try:
+        run_ffmpeg(segment_command(item, template, tmp, ffmpeg))
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return output
+
+
+def _concat_line(path: str) -> str:
+    escaped = os.path.abspath(path).replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+
+def concat_segments(segments: Sequence[str], output: str, ffmpeg: str = "ffmpeg") -> None:
+    """Join segments encoded with equal parameters by stream copy through the concat demuxer"""
+    list_path = f"{output}.segments.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        f.writelines(_concat_line(segment) for segment in segments)
+    try:
+        run_ffmpeg(
+            [
+                ffmpeg,
+                "-nostdin",
+                "-v",
+                "error",
+                "-y",
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                list_path,
+                "-c",
+                "copy",
+                "-movflags",
+                "+faststart",
+                output,
+            ]
+        )
+    finally:
+        os.remove(list_path)
+
+
+class QuizRenderer:
+    """Renders quiz videos from segments cached in cache_dir
+
+    Every song is an independent segment job, at most `concurrency` ffmpeg processes encode at once.
+    Segments already rendered with the same key are reused, so changing one song of a quiz
+    re-encodes only its segment before the cheap stream copy join
+    """
+
+    def __init__(
+        self, template: RenderTemplate, cache_dir: str, concurrency: Optional[int] = None, ffmpeg: str = "ffmpeg"
+    ) -> None:
+        self.template = template
+        self.cache_dir = cache_dir
+        self.concurrency = concurrency or max((os.cpu_count() or 1) // max(template.threads, 1), 1)
+        self.ffmpeg = ffmpeg
+
+    def segment_path(self, item: QuizItem) -> str:
+        return os.path.join(self.cache_dir, f"{item.source_id}_{segment_key(item, self.template)}.mp4")
+
+    def render_segments(self, items: Iterable[QuizItem]) -> list[str]:
+        """Paths of segments of items in order, encoding those not cached yet"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        items = list(items)
+        paths = [self.segment_path(item) for item in items]
+        missing = {path: item for item, path in zip(items, paths, strict=True) if not os.path.exists(path)}
+        logger.info(f"{len(items) - len(missing)} of {len(items)} segments cached, rendering {len(missing)}")
+        if missing:
+            # jobs are ffmpeg processes, threads only wait for them
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = {
+                    path: executor.submit(render_segment, item, self.template, path, self.ffmpeg)
+                    for path, item in missing.items()
+                }
+                errors = []
+                for path, future in futures.items():
+                    try:
+                        future.result()
+                    except RenderError as e:
+                        errors.append(f"source {missing[path].source_id}: {e}")
+            if errors:
+                raise RenderError("; ".join(errors))
+        return paths
+
+    def render(self, items: Iterable[QuizItem], output: str) -> None:
+        segments = self.render_segments(items)
+        if not segments:
+            raise RenderError("quiz has no songs")
+        concat_segments(segments, output, self.ffmpeg)
+        logger.info(f"rendered {len(segments)} songs to {output}")
+
+
+async def load_quiz_items(
+    session: AsyncSession,
+    song_ids: Sequence[int],
+    timing_added_by: Optional[str] = None,
+    level_added_by: Optional[str] = None,
+) -> list[QuizItem]:
+    """Quiz items of songs in the given order, using the latest timing of a downloaded source and the latest level
+
+    Songs without a downloaded source with a timing are skipped
+    """
+    songs = (
+        await session.scalars(
+            select(Song)
+            .where(Song.id.in_(song_ids))
+            .options(
+                selectinload(Song.anime),
+                selectinload(Song.levels),
+                selectinload(Song.sources.and_(Source.status == SourceStatus.DOWNLOADED)).selectinload(Source.timings),
+            )
+        )
+    ).all()
+    by_id = {song.id: song for song in songs}
+
+    items = []
+    for song_id in song_ids:
+        song = by_id.get(song_id)
+        if song is None:
+            logger.warning(f"song {song_id} not found")
+            continue
+        timings = [
+            (timing, source)
+            for source in song.sources
+            if source.local_path is not None
+            for timing in source.timings
+            if timing_added_by is None or timing.added_by == timing_added_by
+        ]
+        if not timings:
+            logger.warning(f"song {song_id} has no downloaded source with a timing")
+            continue
+        timing, source = max(timings, key=lambda pair: (pair[0].created_at, pair[0].id))
+        levels = [level for level in song.levels if level_added_by is None or level.added_by == level_added_by]
+        level = max(levels, key=lambda level: (level.created_at, level.id)) if levels else None
+        items.append(
+            QuizItem(
+                song_id=song.id,
+                source_id=source.id,
+                timing_id=timing.id,
+                local_path=source.local_path,
+                guess_start=timing.guess_start,
+                reveal_start=timing.reveal_start,
+                title=song.anime.title_ro,
+                label=f"{song.category.name} {song.number}",
+                song=" - ".join(part for part in (song.song_artist, song.song_name) if part),
+                level=None if level is None else level.value,
+            )
+        )
+    return items
@@ -0,0 +1,137 @@
+import hashlib
+import json
+from dataclasses import asdict, dataclass, fields
+from string import Template as Placeholders
+from typing import Any, Optional
+
+COUNTDOWN = (
+    "drawbox=c=black:t=fill:enable='lt(t,$guess_duration)',"
+    "drawtext=text='%{eif\\:ceil($guess_duration-t)\\:d}':fontcolor=white:fontsize=h/4"
+    ":x=(w-tw)/2:y=(h-th)/2:enable='lt(t,$guess_duration)'"
+)
+TITLE = (
+    "drawtext=text=$title:fontcolor=white:fontsize=h/16:borderw=2"
+    ":x=(w-tw)/2:y=h-2*th:enable='gte(t,$guess_duration)',"
+    "drawtext=text=$label:fontcolor=white:fontsize=h/24:borderw=2"
+    ":x=(w-tw)/2:y=h-4*th:enable='gte(t,$guess_duration)'"
+)
+
+
+class TemplateError(Exception):
+    pass
+
+
+def _escape(text: str, special: str) -> str:
+    return "".join(f"\\{char}" if char in special else char for char in text)
+
+
+def escape_option(text: str) -> str:
+    """Escape text for an unquoted filter option value inside a filtergraph
+
+    ffmpeg unescapes the value twice, first when splitting the filtergraph into filters,
+    then when splitting the filter arguments into options
+    """
+    return _escape(_escape(text, "\\':"), "\\'[],;")
+
+
+def escape_text(text: str) -> str:
+    """Escape text for an unquoted drawtext text option, which also expands % sequences"""
+    return escape_option(_escape(text, "\\%"))
+
+
+@dataclass(frozen=True)
+class RenderTemplate:
+    """Encoding parameters and overlay filters of a quiz video
+
+    Filters are filtergraph fragments applied to the scaled video of a segment, with $placeholders
+    for the values of the song: guess_duration, reveal_duration, title, label, song and level.
+    Values are substituted fully escaped for drawtext, so placeholders must not be quoted.
+    Every segment is encoded with the same parameters, so segments can be joined without re-encoding
+    """
+
+    width: int = 1280
+    height: int = 720
+    fps: int = 30
+    video_codec: str = "libx264"
+    preset: str = "veryfast"
+    crf: int = 23
+    pix_fmt: str = "yuv420p"
+    audio_codec: str = "aac"
+    audio_bitrate: str = "192k"
+    sample_rate: int = 48000
+    # ffmpeg threads per segment job, 0 lets ffmpeg decide
+    threads: int = 2
+    reveal_duration: float = 10.0
+    fade: float = 0.5
+    guess_filter: str = COUNTDOWN
+    reveal_filter: str = TITLE
+    font_file: Optional[str] = None
+
+    @classmethod
+    def load(cls, path: str) -> "RenderTemplate":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        unknown = set(data) - {field.name for field in fields(cls)}
+        if unknown:
+            raise TemplateError(f"unknown template fields in {path}: {sorted(unknown)}")
+        return cls(**data)
+
+    @property
+    def hash(self) -> str:
+        """Hash of every parameter, segments rendered with an equal hash look the same"""
+        data = json.dumps(asdict(self), sort_keys=True).encode()
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+    def video_filter(self, values: dict[str, Any]) -> str:
+        """Scale and pad to the template size, then the guess and reveal overlays"""
+        text_values = {key: escape_text(str(value)) for key, value in values.items()}
+        try:
+            overlays = [Placeholders(f).substitute(text_values) for f in (self.guess_filter, self.reveal_filter) if f]
+        except (KeyError, ValueError) as e:
+            raise TemplateError(f"invalid placeholder in template filter: {e}") from e
+        if self.font_file is not None:
+            font = f"drawtext=fontfile={escape_option(self.font_file)}:"
+            overlays = [overlay.replace("drawtext=", font) for overlay in overlays]
+        base = [
+            f"scale={self.width}:{self.height}:force_original_aspect_ratio=decrease",
+            f"pad={self.width}:{self.height}:(ow-iw)/2:(oh-ih)/2",
+            "setsar=1",
+            f"fps={self.fps}",
+            f"format={self.pix_fmt}",
+        ]
+        return ",".join(base + overlays)
+
+    def audio_filter(self, duration: float) -> str:
+        fade_out = max(duration - self.fade, 0)
+        return ",".join(
+            (
+                f"aresample={self.sample_rate}",
+                "aformat=channel_layouts=stereo",
+                f"afade=t=in:d={self.fade}",
+                f"afade=t=out:st={fade_out:.3f}:d={self.fade}",
+            )
+        )
+
+    def encoder_args(self) -> list[str]:
+        return [
+            "-c:v",
+            self.video_codec,
+            "-preset",
+            self.preset,
+            "-crf",
+            str(self.crf),
+            "-pix_fmt",
+            self.pix_fmt,
+            "-r",
+            str(self.fps),
+            "-c:a",
+            self.audio_codec,
+            "-b:a",
+            self.audio_bitrate,
+            "-ar",
+            str(self.sample_rate),
+            "-ac",
+            "2",
+            "-threads",
+            str(self.threads),
+        ]
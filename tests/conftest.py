@@ -0,0 +1,50 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from aoq_factory.app.app import app
+from aoq_factory.app.deps.engine import request_engine
+from aoq_factory.database.connection import Engine
+from aoq_factory.database.models import Base
+
+# required settings, tests never reach these services
+for name, value in {
+    "DB_NAME": "aoq_test",
+    "DB_USERNAME": "postgres",
+    "DB_PASSWORD": "postgres",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "RESOURCES_DIR": tempfile.mkdtemp(prefix="aoq_test_"),
+    "ANIDB_REQUEST_INTERVAL": "1",
+    "IDSMOE_API_KEY": "test",
+    "IDSMOE_RATE_LIMITER_MAX_RATE": "1",
+    "IDSMOE_RATE_LIMITER_TIME_PERIOD": "1",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def engine():
+    """In-memory sqlite engine with all tables, one shared connection"""
+    async_engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+
+    async def create_all() -> None:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_all())
+    yield Engine(async_engine, async_sessionmaker(bind=async_engine))
+    asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture
+def client(engine):
+    # no lifespan, the response cache stays off without its LISTEN connection
+    app.dependency_overrides[request_engine] = lambda: engine
+    yield TestClient(app)
+    app.dependency_overrides.clear()
@@ -0,0 +1,37 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from aoq_factory.animeapi.anidb.benchmark_page import legacy_songs, synthetic_page
+from aoq_factory.animeapi.anidb.page import parse_songs
+
+# saved anime pages with the songs expected from each, checked by hand against the markup
+PAGES = sorted((Path(__file__).parent / "data" / "anidb").glob("*.html"))
+
+
+def song_dicts(songs) -> list[dict]:
+    return [
+        {
+            "category": song.category.name,
+            "number": song.number,
+            "song_name": song.song_name,
+            "song_artist": song.song_artist,
+        }
+        for song in songs
+    ]
+
+
+@pytest.mark.parametrize("page", PAGES, ids=[page.stem for page in PAGES])
+def test_saved_pages(page):
+    html = page.read_text(encoding="utf-8")
+    expected = json.loads(page.with_suffix(".json").read_text(encoding="utf-8"))
+
+    assert song_dicts(parse_songs(html, int(page.stem))) == expected
+    assert song_dicts(legacy_songs(html, int(page.stem))) == expected
+
+
+@pytest.mark.parametrize("songs", [1, 7, 60])
+def test_synthetic_pages_match_legacy(songs):
+    html = synthetic_page(songs)
+    assert song_dicts(parse_songs(html, 0)) == song_dicts(legacy_songs(html, 0))
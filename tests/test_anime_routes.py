@@ -0,0 +1,53 @@
+def test_list_returns_ids(client):
+    for title in ("Re:Zero", "Bakemonogatari"):
+        assert client.post("/api/animes", json={"title_ro": title}).status_code == 201
+
+    page = client.get("/api/animes").json()
+    assert [item["title_ro"] for item in page["items"]] == ["Bakemonogatari", "Re:Zero"]
+    assert all(isinstance(item["id"], int) for item in page["items"])
+    assert page["next"] is None
+
+
+def test_crud_by_id(client):
+    anime_id = client.post("/api/animes", json={"title_ro": "Mushishi"}).json()["id"]
+
+    assert client.get(f"/api/animes/{anime_id}").json() == {"id": anime_id, "title_ro": "Mushishi", "status": "NORMAL"}
+    assert client.put(f"/api/animes/{anime_id}", json={"status": "BLACKLISTED"}).status_code == 200
+    assert client.get(f"/api/animes/{anime_id}").json()["status"] == "BLACKLISTED"
+    assert client.delete(f"/api/animes/{anime_id}").status_code == 200
+    assert client.get(f"/api/animes/{anime_id}").status_code == 404
+
+
+def test_pagination_and_filters(client):
+    for title in ("Aria", "Kaguya-sama: Love is War", "Kanon", "Clannad"):
+        client.post("/api/animes", json={"title_ro": title})
+
+    first = client.get("/api/animes", params={"limit": 2}).json()
+    second = client.get("/api/animes", params={"limit": 2, "after": first["next"]}).json()
+    titles = [item["title_ro"] for item in first["items"] + second["items"]]
+    assert titles == ["Aria", "Clannad", "Kaguya-sama: Love is War", "Kanon"]
+    assert second["next"] is None
+
+    found = client.get("/api/animes", params={"q": "love"}).json()["items"]
+    assert [item["title_ro"] for item in found] == ["Kaguya-sama: Love is War"]
+    assert client.get("/api/animes", params={"status": "UNKNOWN"}).status_code == 400
+
+
+def test_detail_from_list_id(client):
+    client.post("/api/animes", json={"title_ro": "Haibane Renmei"})
+    anime_id = client.get("/api/animes").json()["items"][0]["id"]
+    song = {"anime_id": anime_id, "category": "OP", "number": 1, "song_artist": "Kow Otani", "song_name": "Free Bird"}
+    assert client.post("/api/songs", json=song).status_code == 201
+
+    response = client.get(f"/api/animes/{anime_id}/detail")
+    assert response.status_code == 200
+    detail = response.json()
+    assert detail["id"] == anime_id
+    assert [song["song_name"] for song in detail["songs"]] == ["Free Bird"]
+
+    etag = response.headers["etag"]
+    assert client.get(f"/api/animes/{anime_id}/detail", headers={"If-None-Match": etag}).status_code == 304
+    # sqlite timestamps have second resolution, a new row changes the version regardless
+    client.post("/api/songs", json=song | {"category": "ED", "song_name": "Blue Flow"})
+    assert client.get(f"/api/animes/{anime_id}/detail", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/api/animes/0/detail").status_code == 404
@@ -0,0 +1,45 @@
+import asyncio
+
+import numpy as np
+
+from aoq_factory.analysis import feature_store
+from aoq_factory.analysis.audio import SAMPLE_RATE
+from aoq_factory.analysis.feature_store import FeatureStore
+from aoq_factory.automation.workers.difficulty_worker import DifficultyWorker
+
+
+def test_peek_never_decodes(tmp_path, monkeypatch):
+    decoded = []
+
+    def decode_audio(path, sample_rate, ffmpeg):
+        decoded.append(path)
+        return np.sin(np.arange(SAMPLE_RATE * 2) / SAMPLE_RATE * 2 * np.pi * 440).astype(np.float32)
+
+    monkeypatch.setattr(feature_store, "decode_audio", decode_audio)
+    audio = tmp_path / "song.webm"
+    audio.write_bytes(b"not really audio")
+    store = FeatureStore(str(tmp_path / "features"), max_bytes=1 << 30)
+
+    assert store.peek(str(audio)) is None
+    assert store.peek(str(tmp_path / "missing.webm")) is None
+    # peek doesn't even hash unknown files
+    assert not (tmp_path / "features").exists()
+    assert decoded == []
+
+    stored = store.get(str(audio))
+    peeked = store.peek(str(audio))
+    assert peeked is not None and peeked.file_hash == stored.file_hash
+    assert len(decoded) == 1
+
+
+def test_full_rescore_runs_once(engine, monkeypatch):
+    worker = DifficultyWorker(engine, batch_size=100, interval=0.01, incremental=False)
+    passes = []
+
+    async def score_all() -> int:
+        passes.append(1)
+        return 100
+
+    monkeypatch.setattr(worker, "score_all", score_all)
+    asyncio.run(asyncio.wait_for(worker.run(), timeout=5))
+    assert passes == [1]
@@ -0,0 +1,53 @@
+import asyncio
+
+from aoq_factory.database.models import Anime, Category, Song, Source, SourceStatus
+from aoq_factory.download.budget import DiskBudget
+from aoq_factory.download.dedup import deduplicate, partial_hash
+
+
+def test_linked_file_survives_eviction_before_flush(engine, tmp_path):
+    shared = tmp_path / "1.webm"
+    shared.write_bytes(b"same content")
+    duplicate = tmp_path / "2.webm"
+    duplicate.write_bytes(b"same content")
+    size, partial = partial_hash(str(shared))
+
+    async def run() -> int:
+        async with engine.async_session() as session:
+            anime = Anime(title_ro="Kino no Tabi")
+            session.add(anime)
+            await session.flush()
+            song = Song(anime_id=anime.id, category=Category.OP, number=1)
+            session.add(song)
+            await session.flush()
+            owner = Source(
+                song_id=song.id,
+                location={"platform": "http", "url": "https://example.com/1.webm"},
+                added_by="test",
+                status=SourceStatus.DOWNLOADED,
+                local_path=str(shared),
+                content_size=size,
+                partial_hash=partial,
+            )
+            linked = Source(
+                song_id=song.id,
+                location={"platform": "http", "url": "https://example.com/2.webm"},
+                added_by="test",
+                status=SourceStatus.DOWNLOADING,
+            )
+            session.add_all([owner, linked])
+            await session.flush()
+            linked_id = linked.id
+            await session.commit()
+
+        async with engine.async_session() as session:
+            fingerprint = await deduplicate(session, linked_id, str(duplicate))
+            await session.commit()
+        assert fingerprint.local_path == str(shared)
+
+        # the worker writes DOWNLOADED only at its next flush, the owner is evicted before that
+        return await DiskBudget(engine, str(tmp_path), max_bytes=0).ensure()
+
+    assert asyncio.run(run()) == 1
+    assert not duplicate.exists()
+    assert shared.exists()
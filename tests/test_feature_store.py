@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from aoq_factory.analysis import feature_store
+from aoq_factory.analysis.audio import SAMPLE_RATE
+from aoq_factory.analysis.feature_store import FeatureStore
+
+
+def fake_decoder(monkeypatch, seconds: float = 2.0) -> None:
+    def decode_audio(path, sample_rate, ffmpeg):
+        return np.sin(np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE * 2 * np.pi * 440).astype(np.float32)
+
+    monkeypatch.setattr(feature_store, "decode_audio", decode_audio)
+
+
+def audio_file(tmp_path, name: str):
+    audio = tmp_path / name
+    audio.write_bytes(name.encode())
+    return str(audio)
+
+
+def stored_entries(root) -> int:
+    return sum(len(os.listdir(shard.path)) for shard in os.scandir(root) if shard.is_dir() and shard.name != "paths")
+
+
+def test_entry_larger_than_store_is_returned_unstored(tmp_path, monkeypatch):
+    fake_decoder(monkeypatch)
+    store = FeatureStore(str(tmp_path / "features"), max_bytes=1024)
+
+    features = store.get(audio_file(tmp_path, "song.webm"))
+    assert features.duration == 2.0
+    assert not features.pcm.flags.writeable
+    assert stored_entries(store.root) == 0
+
+
+def test_new_entry_survives_its_eviction(tmp_path, monkeypatch):
+    fake_decoder(monkeypatch)
+    root = tmp_path / "features"
+    first_store = FeatureStore(str(root), max_bytes=1 << 30)
+    first = first_store.get(audio_file(tmp_path, "first.webm"))
+    entry_bytes = sum(array.nbytes for array in (first.pcm, first.mel, first.loudness))
+
+    # the old entry looks more recently used, still the one just written is kept
+    old_entry = first_store._entry_dir(first.file_hash)
+    os.utime(old_entry, (os.stat(old_entry).st_atime, os.stat(old_entry).st_mtime + 3600))
+    store = FeatureStore(str(root), max_bytes=entry_bytes + 4096)
+    second = audio_file(tmp_path, "second.webm")
+    store.get(second)
+    assert stored_entries(root) == 1
+    assert store.peek(second) is not None
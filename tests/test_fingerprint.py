@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from aoq_factory.analysis.audio import HOP_SIZE, SAMPLE_RATE
+from aoq_factory.analysis.fingerprint import FingerprintIndex, fingerprint
+
+
+def melody(seconds: float, seed: int) -> np.ndarray:
+    """Chords of three random tones changing every quarter second over quiet noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(SAMPLE_RATE // 4) / SAMPLE_RATE
+    chords = [sum(np.sin(2 * np.pi * f * t) for f in rng.uniform(200, 4000, 3)) for _ in range(int(seconds * 4))]
+    signal = np.concatenate(chords) * 0.3
+    return (signal + rng.normal(0, 0.01, len(signal))).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def fingerprints() -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    return {source_id: fingerprint(melody(20, source_id)) for source_id in (1, 2, 3)}
+
+
+def matched(index: FingerprintIndex, query: tuple[np.ndarray, np.ndarray]) -> list[int]:
+    return [match.source_id for match in index.query(*query)]
+
+
+def test_removed_sources_stay_masked_across_reloads(tmp_path, fingerprints):
+    index = FingerprintIndex(str(tmp_path))
+    for source_id, (hashes, frames) in fingerprints.items():
+        index.add(source_id, hashes, frames)
+    index.flush()
+    index.remove([2])
+    index.flush()
+
+    index = FingerprintIndex(str(tmp_path))
+    assert 2 not in index
+    assert matched(index, fingerprints[1]) == [1]
+    assert matched(index, fingerprints[2]) == []
+
+    # a source added again is found in its new shard, while its old postings stay masked
+    index.add(2, *fingerprints[2])
+    index.flush()
+    index = FingerprintIndex(str(tmp_path))
+    assert matched(index, fingerprints[2]) == [2]
+    assert index.query(*fingerprints[2])[0].score == len(fingerprints[2][0])
+
+    postings = index.posting_count
+    index.compact()
+    assert index.posting_count == postings - len(fingerprints[2][0])
+    index = FingerprintIndex(str(tmp_path))
+    assert len(index.shards) == 1 and index.removed == {}
+    assert [matched(index, fingerprints[source_id]) for source_id in (1, 2, 3)] == [[1], [2], [3]]
+
+
+def test_flush_compacts_over_max_shards(tmp_path, fingerprints):
+    index = FingerprintIndex(str(tmp_path), max_shards=2)
+    for source_id, (hashes, frames) in fingerprints.items():
+        index.add(source_id, hashes, frames)
+        index.flush()
+    assert len(index.shards) == 1
+    assert {path.name for path in tmp_path.iterdir()} == {
+        "manifest.json",
+        *(f"{index.shards[0]}.{part}.npy" for part in ("hashes", "sources", "frames")),
+    }
+
+
+def test_query_finds_excerpt_offset(tmp_path, fingerprints):
+    index = FingerprintIndex(str(tmp_path))
+    for source_id, (hashes, frames) in fingerprints.items():
+        index.add(source_id, hashes, frames)
+    index.flush()
+
+    start = HOP_SIZE * int(7 * SAMPLE_RATE / HOP_SIZE)
+    excerpt = melody(20, 2)[start : start + 8 * SAMPLE_RATE]
+    matches = index.query(*fingerprint(excerpt))
+    assert [match.source_id for match in matches] == [2]
+    # offsets are binned by two frames
+    assert matches[0].offset == pytest.approx(start / SAMPLE_RATE, abs=2 * HOP_SIZE / SAMPLE_RATE)
+    assert matches[0].ratio > 0.5
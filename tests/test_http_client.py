@@ -0,0 +1,72 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aoq_factory.animeapi.client import HTTPClient
+from aoq_factory.config import get_settings
+
+
+async def start_server(peers: list) -> TestServer:
+    """Stand-in API that records the client address of every request, one per TCP connection"""
+
+    async def handler(request: web.Request) -> web.Response:
+        peers.append(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(0.01)
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def test_sessions_reuse_connections_of_the_shared_connector():
+    async def scenario() -> None:
+        peers = []
+        server = await start_server(peers)
+        client = HTTPClient()
+        url = str(server.make_url("/"))
+        try:
+            for name in ("anidb", "idsmoe", "anidb", "idsmoe"):
+                async with client.session(name).get(url) as response:
+                    assert await response.text() == "ok"
+            # sequential requests of every session go over one keep-alive connection
+            assert len(set(peers)) == 1
+            assert client.session("anidb").connector is client.session("idsmoe").connector
+
+            peers.clear()
+            sessions = [client.session(name) for name in ("anidb", "idsmoe")]
+            responses = await asyncio.gather(*(sessions[i % 2].get(url) for i in range(40)))
+            for response in responses:
+                response.release()
+            assert len(set(peers)) <= get_settings().http_limit_per_host
+        finally:
+            sessions = list(client._sessions.values())
+            connector = client._connector
+            await client.close()
+            await server.close()
+        assert all(session.closed for session in sessions)
+        assert connector.closed
+
+    asyncio.run(scenario())
+
+
+def test_new_event_loop_gets_a_new_connector():
+    client = HTTPClient()
+
+    async def first_loop():
+        return client.session(), client.session().connector
+
+    async def second_loop():
+        session = client.session()
+        try:
+            return session is not old_session and session.connector is not old_connector
+        finally:
+            await client.close()
+            # nothing was sent, the abandoned session holds no connection
+            await old_session.close()
+
+    old_session, old_connector = asyncio.run(first_loop())
+    assert asyncio.run(second_loop())
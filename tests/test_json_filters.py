@@ -0,0 +1,81 @@
+import asyncio
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from aoq_factory.database.json_filters import anime_info_filter, find_sources, location_filter, location_key
+from aoq_factory.database.models import AnimeInfo, Source
+
+
+def compile_postgres(stmt) -> tuple[str, dict]:
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    return " ".join(str(compiled).split()), compiled.params
+
+
+def test_location_filter_uses_containment():
+    sql, params = compile_postgres(select(Source.id).where(location_filter(platform="http", url="https://a/op.webm")))
+    assert sql == "SELECT sources.id FROM sources WHERE sources.location @> %(param_1)s::JSONB"
+    assert params == {"param_1": {"platform": "http", "url": "https://a/op.webm"}}
+
+
+def test_location_filter_without_values():
+    sql, _ = compile_postgres(select(Source.id).where(location_filter()))
+    assert sql == "SELECT sources.id FROM sources WHERE true"
+
+
+class Row(NamedTuple):
+    id: int
+    song_id: int
+    location: dict
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, stmt):
+        self.statements.append(compile_postgres(stmt))
+        return self
+
+    def all(self):
+        return [Row(*row) for row in self.rows]
+
+
+def test_find_sources_probes_once_and_matches_keys():
+    session = FakeSession(
+        [
+            (7, 1, {"platform": "http", "url": "https://a/op.webm", "path": "/downloads/op.webm"}),
+            (8, 2, {"platform": "http", "url": "https://a/ed.webm"}),
+        ]
+    )
+    sources = [
+        # extra keys on either side don't make another location
+        (1, {"platform": "http", "url": "https://a/op.webm", "title": "OP"}),
+        # one file may back several songs
+        (2, {"platform": "http", "url": "https://a/op.webm"}),
+        (2, {"platform": "http", "url": "https://a/ed.webm"}),
+        (3, {}),
+    ]
+    assert asyncio.run(find_sources(session, sources)) == [7, None, 8, None]
+    [(sql, params)] = session.statements
+    assert sql.count("sources.song_id = ") == 3
+    assert sql.count("sources.location @>") == 3
+    assert {"platform": "http", "url": "https://a/op.webm"} in params.values()
+
+
+def test_location_key_identifies_the_file():
+    assert location_key({"platform": "http", "url": "u", "path": "p", "title": "t"}) == {"platform": "http", "url": "u"}
+    assert location_key({"platform": "local", "path": "p"}) == {"platform": "local", "path": "p"}
+
+
+def test_anime_info_filter():
+    sql, params = compile_postgres(select(AnimeInfo.id).where(anime_info_filter("anidb", type="TV", year=2006)))
+    assert sql == (
+        "SELECT anime_infos.id FROM anime_infos WHERE anime_infos.source = %(source_1)s::VARCHAR"
+        " AND (anime_infos.data @> %(param_1)s::JSONB)"
+    )
+    assert params == {"source_1": "anidb", "param_1": {"type": "TV", "year": 2006}}
+    sql, _ = compile_postgres(select(AnimeInfo.id).where(anime_info_filter()))
+    assert sql == "SELECT anime_infos.id FROM anime_infos WHERE true"
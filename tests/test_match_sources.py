@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from test_fingerprint import melody
+
+from aoq_factory.analysis import match_sources as match_sources_module
+from aoq_factory.analysis.fingerprint import FingerprintIndex, fingerprint
+from aoq_factory.analysis.match_sources import IssueKind, SourceRow, classify, match_sources
+from aoq_factory.database.models import Category
+
+
+def source_row(source_id: int, song_id: int, anime_id: int, path: str, content_hash: Optional[str] = None) -> SourceRow:
+    return SourceRow(source_id, song_id, anime_id, Category.OP, 1, path, content_hash)
+
+
+def test_classify():
+    row = source_row(1, song_id=10, anime_id=100, path="a.webm", content_hash="same")
+    assert classify(row, source_row(2, 10, 100, "b.webm", content_hash="same")) is None
+    assert classify(row, source_row(2, 10, 100, "b.webm", content_hash="other")) == IssueKind.DUPLICATE
+    assert classify(row, source_row(2, 11, 100, "b.webm")) == IssueKind.SONG_MISMATCH
+    assert classify(row, source_row(2, 11, 101, "b.webm")) == IssueKind.ANIME_MISMATCH
+    # unknown hashes never count as the same file
+    assert classify(source_row(1, 10, 100, "a.webm"), source_row(2, 10, 100, "b.webm")) == IssueKind.DUPLICATE
+
+
+def test_match_sources_reports_new_pairs(tmp_path, monkeypatch):
+    # every path names the seed of its audio
+    monkeypatch.setattr(
+        match_sources_module,
+        "fingerprint_file",
+        lambda path, ffmpeg, store: fingerprint(melody(20, int(path.split("-")[0]))),
+    )
+    rows = [
+        # deduplicated copies of one file
+        source_row(1, song_id=10, anime_id=100, path="1-a.webm", content_hash="same"),
+        source_row(2, song_id=10, anime_id=100, path="1-b.webm", content_hash="same"),
+        # the same song in another anime
+        source_row(3, song_id=20, anime_id=200, path="1-c.webm"),
+        source_row(4, song_id=30, anime_id=300, path="2-d.webm"),
+    ]
+    index = FingerprintIndex(str(tmp_path))
+    with ThreadPoolExecutor() as executor:
+        issues = match_sources(index, rows, executor)
+        pairs = {(issue.kind, issue.source_id, issue.other_source_id) for issue in issues}
+        assert pairs == {(IssueKind.ANIME_MISMATCH, 1, 3), (IssueKind.ANIME_MISMATCH, 2, 3)}
+
+        # indexed sources are not fingerprinted or reported again, removed ones leave the index
+        assert match_sources(FingerprintIndex(str(tmp_path)), rows[:3], executor) == []
+    assert 4 not in FingerprintIndex(str(tmp_path))
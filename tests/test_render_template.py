@@ -0,0 +1,72 @@
+import pytest
+
+from aoq_factory.render.template import RenderTemplate
+
+TITLES = [
+    "Re:Zero kara Hajimeru Isekai Seikatsu",
+    "Kaguya-sama: Love is War",
+    "JoJo's Bizarre Adventure",
+    "100% Pascal-sensei",
+    "Hello, World [Remix]; part\\2",
+]
+
+
+def get_token(text: str, pos: int, terminators: str) -> tuple[str, int]:
+    """Port of av_get_token, returns the unescaped token and the position after it"""
+    token = []
+    while pos < len(text) and text[pos] not in terminators:
+        char = text[pos]
+        if char == "\\" and pos + 1 < len(text):
+            token.append(text[pos + 1])
+            pos += 2
+        elif char == "'":
+            end = text.index("'", pos + 1)
+            token.append(text[pos + 1 : end])
+            pos = end + 1
+        else:
+            token.append(char)
+            pos += 1
+    return "".join(token), pos
+
+
+def drawtext_options(graph: str) -> list[dict[str, str]]:
+    """Options of every drawtext filter, unescaped like the filtergraph and option parsers do"""
+    options = []
+    pos = 0
+    while pos < len(graph):
+        name_end = graph.index("=", pos) if "=" in graph[pos:] else len(graph)
+        name = graph[pos:name_end]
+        args, pos = get_token(graph, name_end + 1, "[],;")
+        pos += 1
+        if name != "drawtext":
+            continue
+        parsed = {}
+        arg_pos = 0
+        while arg_pos < len(args):
+            key_end = args.index("=", arg_pos)
+            parsed[args[arg_pos:key_end]], arg_pos = get_token(args, key_end + 1, ":")
+            arg_pos += 1
+        options.append(parsed)
+    return options
+
+
+def expand(text: str) -> str:
+    """Text drawtext draws, a backslash makes the next character literal, % starts a sequence"""
+    drawn = []
+    chars = iter(text)
+    for char in chars:
+        assert char != "%", f"unescaped % sequence in {text}"
+        drawn.append(next(chars) if char == "\\" else char)
+    return "".join(drawn)
+
+
+@pytest.mark.parametrize("title", TITLES)
+def test_titles_survive_ffmpeg_unescaping(title):
+    template = RenderTemplate(font_file="C:\\fonts\\Noto Sans: JP.ttf")
+    graph = template.video_filter({"guess_duration": 20, "title": title, "label": f"{title} OP1"})
+
+    options = drawtext_options(graph)
+    texts = [expand(option["text"]) for option in options[1:]]
+    assert texts == [title, f"{title} OP1"]
+    assert {option["fontfile"] for option in options} == {"C:\\fonts\\Noto Sans: JP.ttf"}
+    assert options[1]["enable"] == "gte(t,20)"
@@ -0,0 +1,63 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from aoq_factory.app import cache as cache_module
+from aoq_factory.app.cache import ResponseCache, cache_middleware
+from aoq_factory.app.deps import engine as engine_module
+from aoq_factory.app.deps.engine import PRIMARY_HEADER
+from aoq_factory.config import get_settings
+
+
+@pytest.fixture
+def replica_settings(monkeypatch):
+    settings = get_settings().model_copy(update={"db_replica_host": "replica", "db_replica_pin_seconds": 5})
+    monkeypatch.setattr(engine_module, "get_settings", lambda: settings)
+    monkeypatch.setattr(cache_module, "get_settings", lambda: settings)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cached_app():
+    response_cache = ResponseCache()
+    response_cache.listening = True
+    app = FastAPI()
+    app.middleware("http")(cache_middleware(response_cache))
+    reads = []
+
+    @app.get("/api/songs")
+    def songs() -> int:
+        reads.append(1)
+        return len(reads)
+
+    return TestClient(app), response_cache, reads
+
+
+def test_replica_reads_right_after_a_change_are_not_cached(replica_settings, clock, cached_app):
+    client, response_cache, reads = cached_app
+    response_cache.bump("songs")
+
+    client.get("/api/songs")
+    client.get("/api/songs")
+    assert len(reads) == 2
+
+    # past the replica lag the replica has the change, its answer can be cached
+    clock[0] += 6
+    client.get("/api/songs")
+    client.get("/api/songs")
+    assert len(reads) == 3
+
+
+def test_primary_reads_are_cached_right_after_a_change(replica_settings, clock, cached_app):
+    client, response_cache, reads = cached_app
+    response_cache.bump("songs")
+
+    client.get("/api/songs", headers={PRIMARY_HEADER: "1"})
+    client.get("/api/songs", headers={PRIMARY_HEADER: "1"})
+    assert len(reads) == 1
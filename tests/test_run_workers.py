@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+
+from aoq_factory.automation import run_workers
+from aoq_factory.config import get_settings
+from aoq_factory.database.connection import EngineRole, _default_engine_kwargs
+
+
+class FakeWorker:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.ran = False
+
+    async def run(self):
+        self.ran = True
+
+
+def test_workers_run_on_the_worker_engine(engine, monkeypatch):
+    roles = []
+    workers = []
+
+    def get_engine(role):
+        roles.append(role)
+        return engine
+
+    def factory(name):
+        def create(engine, args):
+            workers.append(FakeWorker(name, engine))
+            return workers[-1]
+
+        return create
+
+    monkeypatch.setattr(run_workers, "get_engine", get_engine)
+    monkeypatch.setattr(run_workers, "WORKERS", {"songs": factory("songs"), "timing": factory("timing")})
+    asyncio.run(run_workers.run(["songs", "timing"], argparse.Namespace(stats_interval=0)))
+
+    assert roles == [EngineRole.WORKER]
+    assert [(worker.name, worker.engine, worker.ran) for worker in workers] == [
+        ("songs", engine, True),
+        ("timing", engine, True),
+    ]
+
+
+def test_worker_pool_settings():
+    settings = get_settings()
+    kwargs = _default_engine_kwargs(EngineRole.WORKER)
+    assert (kwargs["pool_size"], kwargs["max_overflow"]) == (
+        settings.db_worker_pool_size,
+        settings.db_worker_max_overflow,
+    )
+    assert kwargs["connect_args"]["server_settings"]["application_name"] == "aoq_factory_worker"
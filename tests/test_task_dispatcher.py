@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import literal, select
+
+from aoq_factory.automation.task_dispatcher import TaskDispatcher
+from aoq_factory.database.models import Anime, TaskAssignment, TaskQueue, TaskResult, TaskStatus, TaskType
+
+
+def add_task(engine, max_attempts: int = 5) -> int:
+    async def add() -> int:
+        async with engine.async_session() as session:
+            anime = Anime(title_ro="Kino no Tabi")
+            session.add(anime)
+            await session.flush()
+            task = TaskQueue(task_type=TaskType.FIND_SONGS, anime_id=anime.id, max_attempts=max_attempts)
+            session.add(task)
+            await session.flush()
+            task_id = task.id
+            await session.commit()
+            return task_id
+
+    return asyncio.run(add())
+
+
+def expire_leases(dispatcher: TaskDispatcher) -> None:
+    # every assignment is older than a cutoff in the future
+    dispatcher._lease_cutoff = lambda: literal(datetime.now() + timedelta(days=1))
+
+
+def task_state(engine, task_id: int):
+    async def load():
+        async with engine.async_session() as session:
+            task = await session.get(TaskQueue, task_id)
+            assignments = (await session.scalars(select(TaskAssignment.worker_instance))).all()
+            results = (await session.scalars(select(TaskResult.error_type))).all()
+            return task.status, task.attempt_count, assignments, results
+
+    return asyncio.run(load())
+
+
+def test_abandoned_task_is_claimed_again(engine):
+    task_id = add_task(engine)
+    crashed = TaskDispatcher(engine, "songs_worker@a")
+    assert [task.id for task in asyncio.run(crashed.claim([TaskType.FIND_SONGS], 10))] == [task_id]
+
+    # within the lease nobody else gets it
+    other = TaskDispatcher(engine, "songs_worker@b")
+    assert asyncio.run(other.claim([TaskType.FIND_SONGS], 10)) == []
+
+    expire_leases(other)
+    assert [task.id for task in asyncio.run(other.claim([TaskType.FIND_SONGS], 10))] == [task_id]
+    assert task_state(engine, task_id) == (TaskStatus.ASSIGNED, 2, ["songs_worker@b"], ["LeaseExpired"])
+
+
+def test_expired_task_out_of_attempts_fails(engine):
+    task_id = add_task(engine, max_attempts=1)
+    asyncio.run(TaskDispatcher(engine, "songs_worker@a").claim([TaskType.FIND_SONGS], 10))
+
+    other = TaskDispatcher(engine, "songs_worker@b")
+    expire_leases(other)
+    assert asyncio.run(other.claim([TaskType.FIND_SONGS], 10)) == []
+    assert task_state(engine, task_id) == (TaskStatus.FAILED, 1, [], ["LeaseExpired"])
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from aoq_factory.analysis.audio import SAMPLE_RATE
+from aoq_factory.analysis.timing import TimingResult, analyze_timing, refine_reveal
+
+
+def bursts(duration: float, starts: list[float], seed: int = 0) -> np.ndarray:
+    """Quiet noise with loud noise bursts of one second at starts, each an onset and a section boundary"""
+    rng = np.random.default_rng(seed)
+    signal = rng.normal(0, 0.01, int(duration * SAMPLE_RATE)).astype(np.float32)
+    for start in starts:
+        begin = int(start * SAMPLE_RATE)
+        signal[begin : begin + SAMPLE_RATE] += rng.normal(0, 0.5, SAMPLE_RATE).astype(np.float32)
+    return signal
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_reveal_keeps_the_whole_guess(seed):
+    rng = np.random.default_rng(seed)
+    signal = bursts(90, sorted(rng.uniform(0, 88, 40).tolist()), seed)
+    for guess_duration in (10.0, 15.0, 20.0):
+        timing = analyze_timing(signal, guess_duration=guess_duration)
+        assert timing.reveal_start >= timing.guess_start + guess_duration - 1e-3
+
+
+def test_scene_cut_never_shortens_the_guess():
+    timing = TimingResult(guess_start=30.0, reveal_start=45.0)
+    # a cut 1.8s early is within tolerance, but would cut the guess short
+    assert refine_reveal(timing, np.array([12.0, 43.2, 60.0]), guess_duration=15.0) == timing
+    assert refine_reveal(timing, np.array([43.2, 46.1]), guess_duration=15.0).reveal_start == 46.1
@@ -0,0 +1,77 @@
+import asyncio
+import sqlite3
+
+from aoq_factory.animeapi.zlib_memoize import PageCache, zlib_memoize
+
+
+def stored_keys(filename) -> set[str]:
+    with sqlite3.connect(filename) as conn:
+        return {key for (key,) in conn.execute("SELECT key FROM page")}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    filename = tmp_path / "pages.sqlite"
+
+    async def run():
+        cache = PageCache(str(filename), memory_maxsize=1, max_items=2, evict_every=1)
+        await cache.set("a", "A")
+        await cache.set("b", "B")
+        # a was inserted first but read since, so b is the least recently used
+        assert await cache.get("a") == "A"
+        await cache.set("c", "C")
+
+    asyncio.run(run())
+    assert stored_keys(filename) == {"a", "c"}
+
+
+def test_evicts_every_n_writes(tmp_path):
+    filename = tmp_path / "pages.sqlite"
+
+    async def run(writes: int):
+        cache = PageCache(str(filename), max_items=2, evict_every=3)
+        for i in range(writes):
+            await cache.set(f"{writes}-{i}", "value")
+
+    # the first write of every cache evicts, the next two only insert
+    asyncio.run(run(3))
+    assert len(stored_keys(filename)) == 3
+    asyncio.run(run(2))
+    assert len(stored_keys(filename)) == 3
+    asyncio.run(run(1))
+    assert len(stored_keys(filename)) == 2
+
+
+def test_adds_used_at_to_old_files(tmp_path):
+    filename = tmp_path / "pages.sqlite"
+    with sqlite3.connect(filename) as conn:
+        conn.execute(
+            "CREATE TABLE page (id INTEGER PRIMARY KEY, key VARCHAR, value BLOB, "
+            "created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        )
+        conn.execute("INSERT INTO page (key, value) VALUES ('old', NULL)")
+
+    async def run():
+        cache = PageCache(str(filename), max_items=1, evict_every=1)
+        await cache.set("new", "value")
+
+    asyncio.run(run())
+    assert stored_keys(filename) == {"new"}
+    with sqlite3.connect(filename) as conn:
+        indexes = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"ix_page_created_at", "ix_page_used_at_id"} <= indexes
+
+
+def test_prefetch_returns_batches_larger_than_memory(tmp_path):
+    calls = []
+
+    @zlib_memoize(str(tmp_path / "pages.sqlite"), key_creator=str, memory_maxsize=2)
+    async def get_page(page_id: int):
+        calls.append(page_id)
+        return f"page {page_id}"
+
+    async def run():
+        await get_page.get_many(range(5))
+        return await get_page.prefetch([*range(5), 7])
+
+    assert asyncio.run(run()) == {page_id: f"page {page_id}" for page_id in range(5)}
+    assert calls == list(range(5))